@@ -6,36 +6,44 @@ Web アプリケーションのメインモジュール。
 """
 
 import asyncio
-import csv
-import io
-import json
+import hmac
+import itertools
 import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
 from contextlib import asynccontextmanager
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import Optional
+from urllib.parse import urlencode
 
 from fastapi import FastAPI, Form, Query, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sse_starlette.sse import EventSourceResponse
 
-from app.services.analysis import (
-    get_device_os_comparison,
-    get_field_coverage_matrix,
-    get_statistics_summary,
-)
+from app.services import metrics, storage
+from app.services.analysis import METADATA_FIELDS
 from app.services.avrcp_monitor import AVRCPMonitor
-from app.services.database import (
-    delete_session,
-    generate_filename,
-    get_session_filepath,
-    list_sessions,
-    save_session,
+from app.services.cards import TrackCardRenderer
+from app.services.broadcast import Broadcaster, encode_event
+from app.services.database import COMPRESSION, generate_filename, recover_journals, sync_index
+from app.services.export import (
+    csv_filename_for,
+    iter_session_csv,
+    iter_sessions_csv,
+    iter_sessions_zip,
 )
+from app.services.ingest import MAX_CHUNK_BYTES, IngestError
+from app.services.journal import FSYNC_INTERVAL, SessionJournal
+from app.services.latency import LatencyTracer
+from app.services.session_index import FILTER_QUERY_KEYS, SessionFilter
+from app.services.uploader import DEFAULT_UPLOAD_INTERVAL, SessionUploader, UploadError
 
 # ログ設定
 LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
@@ -73,51 +81,185 @@ OS_OPTIONS: dict[str, list[str]] = {
     "Android": ["Android 15", "Android 14", "Android 13", "Android 12"],
 }
 
+# 古いセッションのアーカイブ・圧縮を実行する間隔（秒）
+STORAGE_MAINTENANCE_INTERVAL = 60 * 60
+
+# 過去セッション一覧の 1 ページの件数
+SESSION_PAGE_SIZE = 50
+
+# 動作モード（collector: Bluetooth で記録する / central: コレクターからセッションを受け取って集計する）
+ROLE = os.environ.get("BT_ROLE", "collector").lower()
+# 中央ノードの URL（コレクターで設定するとセッションを送る）
+CENTRAL_URL = os.environ.get("BT_CENTRAL_URL", "")
+# コレクターと中央ノードで共有するトークン（中央ノードでは必須。未設定なら受信リクエストをすべて拒否する）
+INGEST_TOKEN = os.environ.get("BT_INGEST_TOKEN", "")
+# ライブ表示をプレイヤーごとに最新のイベントだけにまとめる（セッションには全イベントを記録する）
+COALESCE_DISPLAY = os.environ.get("BT_COALESCE_DISPLAY", "").lower() == "true"
+
 
 @dataclass
 class SessionState:
-    """セッションの状態を管理するデータクラス。"""
-
-    active: bool = False
-    content_name: str = ""
-    platform_type: str = ""
-    device: str = ""
-    os_version: str = ""
-    bg_playback: bool = False
-    start_time: Optional[datetime] = None
-    tracks: list[dict] = field(default_factory=list)
+    """記録中セッション 1 件の状態を管理するデータクラス。"""
+
+    id: str
+    content_name: str
+    platform_type: str
+    device: str
+    os_version: str
+    bg_playback: bool
+    start_time: datetime
+    filename: str
+    # 記録対象のプレイヤー（MediaPlayer1 のオブジェクトパス）。空なら全プレイヤー
+    player: str = ""
+    # 受信したトラックはメモリに持たずジャーナルに追記する
+    journal: Optional[SessionJournal] = None
     seq: int = 0
 
 
 # グローバル状態
-session = SessionState()
-# SSE クライアントへの配信キュー
-sse_queues: list[asyncio.Queue] = []
+# 記録中のセッション（セッション ID → 状態）
+active_sessions: dict[str, SessionState] = {}
+# プレイヤーパス → そのプレイヤーを記録中のセッション（"" は全プレイヤー対象）
+_sessions_by_player: dict[str, list[SessionState]] = defaultdict(list)
+_session_ids = itertools.count(1)
+# 開始・保存の処理中で、まだ active_sessions / DATA_DIR に無いセッションのファイル名
+_reserved_filenames: set[str] = set()
+# SSE クライアントへの配信ハブ
+broadcaster = Broadcaster()
+metrics.SSE_PUBLISHED.set_function(lambda: {(): broadcaster.published})
+metrics.SSE_DROPPED.set_function(lambda: {(): broadcaster.dropped})
+metrics.SSE_SUBSCRIBERS.set_function(lambda: {(): broadcaster.subscriber_count})
+metrics.SSE_CLIENT_QUEUE_DEPTH.set_function(
+    lambda: {(str(c["id"]),): c["lag"] for c in broadcaster.stats()["clients"]}
+)
+metrics.SSE_CLIENT_DROPPED.set_function(
+    lambda: {(str(c["id"]),): c["dropped"] for c in broadcaster.stats()["clients"]}
+)
+# シグナル受信から SSE 送出までの区間ごとの所要時間
+latency_tracer = LatencyTracer()
 # asyncio イベントループ参照
 _loop: Optional[asyncio.AbstractEventLoop] = None
-# AVRCP モニター
+# 別スレッドから届き、イベントループでの処理を待っているメタデータ
+# （(metadata, received_at, called_at) の列。_drain_metadata() でまとめて処理する）
+_pending_metadata: deque = deque()
+_pending_lock = threading.Lock()
+# _drain_metadata() の呼び出しを予約済みか（予約済みならイベントループを起こさない）
+_drain_scheduled = False
+# ジャーナルの fsync が必要になったことを _journal_sync_loop() に知らせるイベント
+_journal_sync_wakeup: Optional[asyncio.Event] = None
+# AVRCP モニター（中央ノードでは None）
 _monitor: Optional[AVRCPMonitor] = None
+# 中央ノードへのアップローダー（BT_CENTRAL_URL 設定時のみ）
+_uploader: Optional[SessionUploader] = None
 # サーバー起動時刻
 _server_start_time: Optional[datetime] = None
 # 最後のメタデータ受信時刻
 _last_metadata_time: Optional[datetime] = None
 
 
-def _on_metadata(metadata: dict):
-    """AVRCP メタデータ受信コールバック（別スレッドから呼ばれる）。"""
+def _on_metadata(metadata: dict, received_at: Optional[float] = None):
+    """AVRCP メタデータ受信コールバック。
+
+    glib バックエンド・モック・再生では別スレッドから、asyncio バックエンドでは
+    イベントループ上から呼ばれる。received_at は D-Bus シグナルの受信時刻
+    （time.perf_counter()）。
+
+    別スレッドからのイベントは _pending_metadata に積み、イベントループには
+    まだ処理が予約されていないときだけ _drain_metadata() を渡す。トラックの
+    連続スキップ等でシグナルが集中しても、イベントループを起こすのは 1 回で済む。
+    """
+    global _drain_scheduled
     if _loop is None:
         return
-    _loop.call_soon_threadsafe(_handle_metadata, metadata)
+    called_at = time.perf_counter()
+    if received_at is None:
+        received_at = called_at
+    latency_tracer.record("signal", called_at - received_at)
+    if _monitor is not None and _monitor.runs_on_event_loop:
+        _handle_metadata(metadata, received_at, called_at)
+        return
+
+    with _pending_lock:
+        _pending_metadata.append((metadata, received_at, called_at))
+        if _drain_scheduled:
+            return
+        _drain_scheduled = True
+    _loop.call_soon_threadsafe(_drain_metadata)
+
+
+def _drain_metadata():
+    """別スレッドから届いたメタデータをまとめて処理する（asyncio スレッド）。
+
+    すべてのイベントをセッションに記録する。COALESCE_DISPLAY が有効なら、
+    SSE にはプレイヤーごとに最後のイベントだけを配信する。
+    1 件の処理で例外が起きても、ログに残してバッチの残りを処理する。
+    """
+    global _drain_scheduled
+    with _pending_lock:
+        batch = list(_pending_metadata)
+        _pending_metadata.clear()
+        _drain_scheduled = False
+    metrics.METADATA_BATCH_SIZE.observe(len(batch))
+
+    if not COALESCE_DISPLAY:
+        for metadata, received_at, called_at in batch:
+            try:
+                _handle_metadata(metadata, received_at, called_at)
+            except Exception:
+                logger.exception("メタデータの処理に失敗: %s", metadata.get("title", ""))
+        return
+
+    # プレイヤー → (メタデータ, 受信時刻, 記録先のセッション)。後のイベントで上書きする
+    latest: dict[str, tuple[dict, float, list[SessionState]]] = {}
+    recorded = 0
+    for metadata, received_at, called_at in batch:
+        try:
+            targets = _record_metadata(metadata, called_at)
+        except Exception:
+            logger.exception("メタデータの記録に失敗: %s", metadata.get("title", ""))
+            continue
+        recorded += 1
+        player = metadata.get("player", "")
+        latest.pop(player, None)
+        latest[player] = (metadata, received_at, targets)
+    metrics.METADATA_COALESCED.inc(recorded - len(latest))
+    for metadata, received_at, targets in latest.values():
+        try:
+            _publish_metadata(metadata, received_at, targets)
+        except Exception:
+            logger.exception("メタデータの配信に失敗: %s", metadata.get("title", ""))
+
+
+def _handle_metadata(
+    metadata: dict, received_at: Optional[float] = None, called_at: Optional[float] = None
+):
+    """メタデータを記録し、SSE キューに配信する（asyncio スレッド）。
+
+    received_at / called_at はシグナルの受信時刻とコールバックの呼び出し時刻
+    （time.perf_counter()）。区間ごとの所要時間を latency_tracer に記録する。
+    """
+    targets = _record_metadata(metadata, called_at)
+    _publish_metadata(metadata, received_at, targets)
 
 
-def _handle_metadata(metadata: dict):
-    """メタデータを処理して SSE キューに配信する（asyncio スレッド）。"""
+def _record_metadata(metadata: dict, called_at: Optional[float] = None) -> list[SessionState]:
+    """メタデータを記録中のセッションのジャーナルに追記し、追記先のセッションを返す。"""
     global _last_metadata_time
+    started_at = time.perf_counter()
+    if called_at is not None:
+        latency_tracer.record("dispatch", started_at - called_at)
+    metrics.METADATA_EVENTS.inc()
     _last_metadata_time = datetime.now()
 
-    if session.active:
+    # このプレイヤーを記録中のセッションと、全プレイヤー対象のセッションに振り分ける
+    player = metadata.get("player", "")
+    targets = _sessions_by_player.get(player, [])
+    if player:
+        targets = targets + _sessions_by_player.get("", [])
+
+    for session in targets:
         session.seq += 1
-        track_record = {
+        session.journal.append({
             "type": "track",
             "seq": session.seq,
             "timestamp": metadata.get("timestamp", datetime.now().isoformat()),
@@ -129,62 +271,214 @@ def _handle_metadata(metadata: dict):
             "number_of_tracks": metadata.get("number_of_tracks"),
             "duration_ms": metadata.get("duration_ms"),
             "status": metadata.get("status", ""),
-        }
-        session.tracks.append(track_record)
-
-    # SSE で全クライアントに配信
-    event_data = {
-        "metadata": metadata,
-        "track_count": session.seq if session.active else 0,
-        "session_active": session.active,
-    }
-    for queue in sse_queues:
-        try:
-            queue.put_nowait(event_data)
-        except asyncio.QueueFull:
-            pass
+        })
+        if session.journal.sync_due and _journal_sync_wakeup is not None:
+            _journal_sync_wakeup.set()
+    latency_tracer.record("record", time.perf_counter() - started_at)
+    return targets
+
+
+def _publish_metadata(metadata: dict, received_at: Optional[float], targets: list[SessionState]):
+    """トラックカードと記録件数を SSE で全クライアントに配信する（カードの生成とエンコードはイベントごとに 1 回）。"""
+    if broadcaster.subscriber_count == 0:
+        return
+
+    render_started = time.perf_counter()
+    card_html = _render_track_card(metadata, bool(targets))
+    latency_tracer.record("render", time.perf_counter() - render_started)
+    frame = encode_event("metadata", card_html)
+    for session in targets:
+        frame += encode_event(f"track-count-{session.id}", str(session.seq))
+    broadcaster.publish(frame, received_at)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションの起動・終了処理。"""
-    global _loop, _monitor, _server_start_time
-    _loop = asyncio.get_event_loop()
+    global _loop, _monitor, _uploader, _server_start_time, _drain_scheduled
+    _loop = asyncio.get_running_loop()
+    # 前のイベントループに予約した処理は実行されないので、受け付け待ちを空にする
+    with _pending_lock:
+        _pending_metadata.clear()
+        _drain_scheduled = False
     _server_start_time = datetime.now()
 
-    _monitor = AVRCPMonitor(callback=_on_metadata)
-    _monitor.start()
-    logger.info("アプリケーション起動完了 (mock=%s)", _monitor.is_mock)
+    # セッションインデックスを実ファイルと突き合わせ、中断されたセッションを復旧する
+    sync_index(force=True)
+    recover_journals()
+
+    # 古いセッションのアーカイブ・圧縮（BT_ARCHIVE_AFTER_DAYS / BT_COMPRESS_AFTER_DAYS 指定時のみ）
+    maintenance_task = None
+    archive_after_days = os.environ.get("BT_ARCHIVE_AFTER_DAYS", "")
+    compress_after_days = os.environ.get("BT_COMPRESS_AFTER_DAYS", "")
+    if archive_after_days or compress_after_days:
+        maintenance_task = asyncio.create_task(_storage_maintenance_loop(
+            float(archive_after_days) if archive_after_days else None,
+            float(compress_after_days) if compress_after_days else None,
+        ))
+
+    # 中央ノードは Bluetooth を使わず、コレクターから受け取ったセッションだけを扱う
+    if ROLE != "central":
+        _monitor = AVRCPMonitor(callback=_on_metadata)
+        _monitor.start()
+
+    upload_task = None
+    if CENTRAL_URL and ROLE != "central":
+        _uploader = SessionUploader(CENTRAL_URL)
+        upload_task = asyncio.create_task(_upload_loop(
+            float(os.environ.get("BT_UPLOAD_INTERVAL", "") or DEFAULT_UPLOAD_INTERVAL)
+        ))
+
+    journal_sync_task = asyncio.create_task(_journal_sync_loop())
+    if _monitor is not None:
+        logger.info("アプリケーション起動完了 (mock=%s)", _monitor.is_mock)
+    else:
+        logger.info("アプリケーション起動完了 (中央ノード)")
+        if not INGEST_TOKEN:
+            logger.warning("BT_INGEST_TOKEN が未設定のため、コレクターからのセッションを受け付けません")
 
     yield
 
-    _monitor.stop()
+    if _monitor is not None:
+        _monitor.stop()
+    journal_sync_task.cancel()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    if upload_task is not None:
+        upload_task.cancel()
+    # 記録中のセッションはジャーナルを残し、次回起動時に復旧する
+    for session in active_sessions.values():
+        session.journal.close()
     logger.info("アプリケーション終了")
 
 
+async def _storage_maintenance_loop(
+    archive_after_days: Optional[float], compress_after_days: Optional[float]
+):
+    """起動時と以後 STORAGE_MAINTENANCE_INTERVAL ごとに、古いセッションをアーカイブ・圧縮する。
+
+    アーカイブの対象は圧縮より先に処理する。
+    """
+    while True:
+        if archive_after_days is not None:
+            try:
+                await storage.archive_sessions(archive_after_days)
+            except Exception:
+                logger.exception("セッションのアーカイブに失敗")
+        if compress_after_days is not None:
+            try:
+                await storage.compress_sessions(compress_after_days, COMPRESSION or "gzip")
+            except Exception:
+                logger.exception("セッションの圧縮に失敗")
+        await asyncio.sleep(STORAGE_MAINTENANCE_INTERVAL)
+
+
+async def _upload_loop(interval: float):
+    """interval 秒ごとに未送信のセッションを中央ノードに送る。
+
+    前回の周期で 1 件以上送れて、まだ未送信のセッションが残っていれば、待たずに続けて送る
+    （読めないセッション等で送れなかった場合は interval 秒待つ）。
+    """
+    while True:
+        uploaded = 0
+        try:
+            uploaded = await storage.upload_sessions(_uploader)
+        except UploadError as e:
+            logger.warning("中央ノードへの送信に失敗: %s", e)
+        except Exception:
+            logger.exception("中央ノードへの送信に失敗")
+        if uploaded and _uploader.pending_count:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(interval)
+
+
+async def _journal_sync_loop():
+    """記録中ジャーナルの未同期レコードを fsync する（FSYNC_INTERVAL ごと、または件数がたまったとき）。
+
+    fsync はイベントループを止めないよう別スレッドで行う。
+    """
+    global _journal_sync_wakeup
+    _journal_sync_wakeup = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_journal_sync_wakeup.wait(), FSYNC_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _journal_sync_wakeup.clear()
+        for session in list(active_sessions.values()):
+            if not session.journal.sync_due:
+                continue
+            try:
+                await asyncio.to_thread(session.journal.sync)
+            except Exception:
+                logger.exception("ジャーナルの fsync に失敗: %s", session.filename)
+
+
 app = FastAPI(title="BT Metadata Collector", lifespan=lifespan)
 
 # 静的ファイルとテンプレート
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+# Now Playing カードの描画（テンプレートは起動時に 1 回だけ読み込む）
+_card_renderer = TrackCardRenderer(templates.get_template("partials/now_playing_card.html"))
 
 
 # ── ページ ──
 
 
+def _player_options() -> list[dict]:
+    """セッションフォームのプレイヤー選択肢を返す。"""
+    if _monitor is None:
+        return []
+    return [
+        {"path": p.path, "label": f"{p.address or p.path} ({p.adapter})" if p.adapter else p.path}
+        for p in _monitor.players
+    ]
+
+
+def _control_context(request: Request) -> dict:
+    """セッション制御エリアのテンプレートコンテキスト。"""
+    return {
+        "request": request,
+        "active_sessions": list(active_sessions.values()),
+        "players": _player_options(),
+        "os_options": OS_OPTIONS,
+        "content_options": CONTENT_OPTIONS,
+    }
+
+
+def _filename_in_use(filename: str) -> bool:
+    return filename in _reserved_filenames or any(
+        s.filename == filename for s in active_sessions.values()
+    )
+
+
+async def _reserve_filename(filename: str) -> str:
+    """記録中・保存中・保存済みのセッションと重ならないファイル名を予約する。
+
+    使い終わったら _reserved_filenames から取り除くこと。
+    """
+    candidate = filename
+    n = 2
+    while (
+        _filename_in_use(candidate)
+        or await storage.get_session_source(candidate) is not None
+        # 問い合わせ中に別のリクエストが同じ名前を予約していないか
+        or _filename_in_use(candidate)
+    ):
+        candidate = filename.replace(".jsonl", f"_{n}.jsonl")
+        n += 1
+    _reserved_filenames.add(candidate)
+    return candidate
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """メインページ。"""
-    sessions = list_sessions()
     return templates.TemplateResponse(
         "index.html",
-        {
-            "request": request,
-            "session": session,
-            "sessions": sessions,
-            "os_options": OS_OPTIONS,
-            "content_options": CONTENT_OPTIONS,
-        },
+        {**_control_context(request), **await _session_list_context(request, SessionFilter())},
     )
 
 
@@ -199,93 +493,115 @@ async def session_start(
     device: str = Form(...),
     os_version: str = Form(...),
     bg_playback: Optional[str] = Form(None),
+    player: str = Form(""),
 ):
-    """セッションを開始する。"""
-    session.active = True
-    session.content_name = content_name
-    session.platform_type = platform_type
-    session.device = device
-    session.os_version = os_version
-    session.bg_playback = bg_playback == "on"
-    session.start_time = datetime.now()
-    session.tracks = []
-    session.seq = 0
+    """セッションを開始する。複数のセッションを同時に記録できる。"""
+    start_time = datetime.now()
+    filename = await _reserve_filename(
+        generate_filename(content_name, platform_type, device, os_version, start_time)
+    )
+    session = SessionState(
+        id=str(next(_session_ids)),
+        content_name=content_name,
+        platform_type=platform_type,
+        device=device,
+        os_version=os_version,
+        bg_playback=bg_playback == "on",
+        start_time=start_time,
+        filename=filename,
+        player=player,
+    )
+    try:
+        session.journal = await storage.open_journal(
+            filename=filename,
+            content_name=content_name,
+            platform_type=platform_type,
+            device=device,
+            os_version=os_version,
+            session_start=start_time,
+            bg_playback=session.bg_playback,
+            player=player,
+        )
+        active_sessions[session.id] = session
+        _sessions_by_player[player].append(session)
+    finally:
+        _reserved_filenames.discard(filename)
 
     logger.info(
-        "セッション開始: %s (%s, %s, %s, BG=%s)",
-        content_name, platform_type, device, os_version, session.bg_playback,
+        "セッション開始: %s (%s, %s, %s, BG=%s, player=%s)",
+        content_name, platform_type, device, os_version, session.bg_playback, player or "all",
     )
 
     return templates.TemplateResponse(
-        "partials/session_status.html",
-        {"request": request, "session": session},
+        "partials/session_control.html", _control_context(request)
     )
 
 
 @app.post("/session/stop", response_class=HTMLResponse)
-async def session_stop(request: Request):
-    """セッションを終了してログを保存する。"""
-    if not session.active:
-        return templates.TemplateResponse(
-            "partials/session_form.html",
-            {"request": request, "session": session, "os_options": OS_OPTIONS, "content_options": CONTENT_OPTIONS},
-        )
+async def session_stop(request: Request, session_id: str = Form("")):
+    """セッションを終了してログを保存する。
 
-    session_end = datetime.now()
+    session_id を省略した場合は、記録中のセッションが 1 件だけならそれを終了する。
+    """
+    if not session_id and len(active_sessions) == 1:
+        session_id = next(iter(active_sessions))
 
-    # ログファイルに保存
-    filename = generate_filename(
-        session.content_name,
-        session.platform_type,
-        session.device,
-        session.os_version,
-        session.start_time,
-    )
+    session = active_sessions.pop(session_id, None)
+    if session is None:
+        return templates.TemplateResponse(
+            "partials/session_control.html", _control_context(request)
+        )
+    _sessions_by_player[session.player].remove(session)
+    if not _sessions_by_player[session.player]:
+        del _sessions_by_player[session.player]
 
-    save_session(
-        filename=filename,
-        content_name=session.content_name,
-        platform_type=session.platform_type,
-        device=session.device,
-        os_version=session.os_version,
-        bg_playback=session.bg_playback,
-        session_start=session.start_time,
-        session_end=session_end,
-        tracks=session.tracks,
-    )
+    # ジャーナルにヘッダーを付けてログファイルとして確定（保存が終わるまで名前を予約しておく）
+    _reserved_filenames.add(session.filename)
+    try:
+        filepath = await storage.save_session(
+            filename=session.filename,
+            content_name=session.content_name,
+            platform_type=session.platform_type,
+            device=session.device,
+            os_version=session.os_version,
+            bg_playback=session.bg_playback,
+            session_start=session.start_time,
+            session_end=datetime.now(),
+            tracks=session.journal,
+            extra_header={"player": session.player} if session.player else None,
+        )
+    finally:
+        _reserved_filenames.discard(session.filename)
 
     logger.info(
         "セッション終了: %s (%d トラック) -> %s",
-        session.content_name, len(session.tracks), filename,
+        session.content_name, session.seq, filepath.name,
     )
 
-    # セッション状態をリセット
-    session.active = False
-    session.tracks = []
-    session.seq = 0
-
-    sessions = list_sessions()
-
+    # 一覧はテンプレート側で /sessions から読み直す
     return templates.TemplateResponse(
-        "partials/session_form_and_list.html",
-        {"request": request, "session": session, "sessions": sessions, "os_options": OS_OPTIONS, "content_options": CONTENT_OPTIONS},
+        "partials/session_form_and_list.html", _control_context(request)
     )
 
 
 @app.get("/session/status", response_class=HTMLResponse)
 async def session_status(request: Request):
     """現在のセッション状態を返す。"""
-    if session.active:
-        return templates.TemplateResponse(
-            "partials/session_status.html",
-            {"request": request, "session": session},
-        )
     return templates.TemplateResponse(
-        "partials/session_form.html",
-        {"request": request, "session": session, "os_options": OS_OPTIONS, "content_options": CONTENT_OPTIONS},
+        "partials/session_control.html", _control_context(request)
     )
 
 
+@app.get("/players")
+async def players():
+    """検出済みのプレイヤー（MediaPlayer1）と、それぞれを記録中のセッションを返す。"""
+    result = []
+    for option in _player_options():
+        sessions = _sessions_by_player.get(option["path"], [])
+        result.append({**option, "session_ids": [s.id for s in sessions]})
+    return result
+
+
 # ── OS 選択肢 ──
 
 
@@ -306,8 +622,7 @@ async def os_options(device: str = Query("")):
 @app.get("/stream/metadata")
 async def stream_metadata(request: Request):
     """SSE でメタデータをリアルタイム配信する。"""
-    queue: asyncio.Queue = asyncio.Queue(maxsize=100)
-    sse_queues.append(queue)
+    subscriber = broadcaster.subscribe()
 
     async def event_generator():
         try:
@@ -315,134 +630,108 @@ async def stream_metadata(request: Request):
                 if await request.is_disconnected():
                     break
                 try:
-                    data = await asyncio.wait_for(queue.get(), timeout=30)
-                    metadata = data["metadata"]
-
-                    # トラックカード HTML を生成
-                    card_html = _render_track_card(
-                        metadata, data["session_active"], data["track_count"]
+                    frame, created_at, published_at = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=30
                     )
-                    yield {
-                        "event": "metadata",
-                        "data": card_html,
-                    }
-
-                    # トラック数更新
-                    if data["session_active"]:
-                        yield {
-                            "event": "track-count",
-                            "data": str(data["track_count"]),
-                        }
+                    subscriber.delivered += 1
+                    yield frame
+                    # 送出が終わって次のイベントを取りに戻った時点までを配信時間とする
+                    delivered_at = time.perf_counter()
+                    metrics.SSE_DELIVERY_SECONDS.observe(delivered_at - created_at)
+                    latency_tracer.record("queue", delivered_at - published_at)
+                    latency_tracer.record("total", delivered_at - created_at)
 
                 except asyncio.TimeoutError:
                     # キープアライブ
                     yield {"event": "ping", "data": ""}
 
         finally:
-            sse_queues.remove(queue)
+            broadcaster.unsubscribe(subscriber)
 
     return EventSourceResponse(event_generator())
 
 
-def _format_duration(duration_ms) -> str:
-    """ミリ秒を M:SS または H:MM:SS 形式に変換する。"""
-    if not duration_ms or duration_ms <= 0:
-        return "--:--"
-    total_seconds = duration_ms // 1000
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    if hours > 0:
-        return f"{hours}:{minutes:02d}:{seconds:02d}"
-    return f"{minutes}:{seconds:02d}"
+@app.get("/stream/stats")
+async def stream_stats():
+    """SSE 配信統計（クライアントごとの遅延・取りこぼし件数）を返す。"""
+    return broadcaster.stats()
 
 
-def _render_track_card(metadata: dict, session_active: bool, track_count: int) -> str:
-    """トラックカードの HTML を Jinja2 テンプレートで生成する。"""
-    timestamp = metadata.get("timestamp", "")
-    try:
-        dt = datetime.fromisoformat(timestamp)
-        time_str = dt.strftime("%H:%M:%S")
-    except (ValueError, TypeError):
-        time_str = timestamp
-
-    title = metadata.get("title") or None
-    artist = metadata.get("artist") or None
-    album = metadata.get("album") or None
-    genre = metadata.get("genre") or None
-    duration_ms = metadata.get("duration_ms")
-    track_number = metadata.get("track_number")
-    number_of_tracks = metadata.get("number_of_tracks")
-    status = metadata.get("status") or None
-
-    duration_str = _format_duration(duration_ms) if duration_ms else "null"
-
-    context = {
-        "session_active": session_active,
-        "time_str": time_str,
-        "title_display": title if title else "null",
-        "artist_display": artist if artist else "null",
-        "album_display": album if album else "null",
-        "genre_display": genre if genre else "null",
-        "track_num_display": str(track_number) if track_number is not None else "null",
-        "num_tracks_display": str(number_of_tracks) if number_of_tracks is not None else "null",
-        "status_display": status if status else "null",
-        "status_class": {
-            "playing": "status-playing",
-            "paused": "status-paused",
-            "stopped": "status-stopped",
-        }.get(status or "", ""),
-        "duration_str": duration_str,
-    }
-
-    template = templates.get_template("partials/now_playing_card.html")
-    return template.render(context)
+def _render_track_card(metadata: dict, session_active: bool) -> str:
+    """トラックカードの HTML を生成する（同じ内容のカードはキャッシュから返す）。"""
+    return _card_renderer.render(metadata, session_active)
 
 
 # ── 過去セッション ──
 
 
-@app.get("/sessions", response_class=HTMLResponse)
-async def get_sessions(
-    request: Request,
-    content: str = Query(""),
-    device: str = Query(""),
-    os_version: str = Query(""),
-):
-    """過去セッション一覧を返す（フィルタ対応）。"""
-    sessions = list_sessions()
+async def _session_list_context(
+    request: Request, session_filter: SessionFilter, offset: int = 0, filter_values: Optional[dict] = None
+) -> dict:
+    """過去セッション一覧（1 ページ分）のテンプレートコンテキスト。"""
+    sessions, total = await storage.query_sessions(session_filter, SESSION_PAGE_SIZE, offset)
+    return {
+        "request": request,
+        "sessions": sessions,
+        "total": total,
+        "offset": offset,
+        "page_size": SESSION_PAGE_SIZE,
+        "os_filter_options": [v for versions in OS_OPTIONS.values() for v in versions],
+        "filtered": any((filter_values or {}).values()),
+        # 一括エクスポートのリンクに付ける絞り込み条件
+        "filter_query": urlencode({key: value for key, value in (filter_values or {}).items() if value}),
+        **{f"filter_{key}": value for key, value in (filter_values or {}).items()},
+    }
+
+
+def _filter_values(request: Request) -> dict[str, str]:
+    """クエリパラメータから一覧の絞り込み条件の入力値を取り出す（テンプレートに戻す）。"""
+    return {key: request.query_params.get(key, "") for key in FILTER_QUERY_KEYS}
 
-    # フィルタリング
-    if content:
-        sessions = [s for s in sessions if content.lower() in s.get("content_name", "").lower()]
-    if device:
-        sessions = [s for s in sessions if device == s.get("device", "")]
-    if os_version:
-        sessions = [s for s in sessions if os_version == s.get("os_version", "")]
+
+@app.get("/sessions", response_class=HTMLResponse)
+async def get_sessions(request: Request, offset: int = Query(0, ge=0)):
+    """過去セッション一覧を返す（フィルタ・ページ分割対応）。
+
+    絞り込みはインデックスの SQL で行い、1 ページ（SESSION_PAGE_SIZE 件）分だけを返す。
+    絞り込み条件は SessionFilter.from_query() のクエリパラメータ（content, device, os_version,
+    platform_type, bg, date_from, date_to）。
+    """
+    filter_values = _filter_values(request)
+    try:
+        session_filter = SessionFilter.from_query(filter_values)
+    except ValueError:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": "日付は YYYY-MM-DD 形式で指定してください"},
+        )
 
     return templates.TemplateResponse(
         "partials/session_list.html",
-        {
-            "request": request,
-            "sessions": sessions,
-            "filter_content": content,
-            "filter_device": device,
-            "filter_os_version": os_version,
-        },
+        await _session_list_context(request, session_filter, offset, filter_values),
     )
 
 
 @app.get("/sessions/{filename}")
 async def download_session(filename: str):
-    """セッションログファイルをダウンロードする。"""
-    filepath = get_session_filepath(filename)
-    if filepath is None:
+    """セッションログファイルをダウンロードする。
+
+    圧縮済み・アーカイブ内のセッションは JSONL に展開しながら返す。
+    """
+    source = await storage.get_session_source(filename)
+    if source is None:
         return JSONResponse(
             status_code=404,
             content={"detail": "ファイルが見つかりません"},
         )
+    if source.archived or source.compressed:
+        return StreamingResponse(
+            source.iter_jsonl(),
+            media_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{source.plain_filename}"'},
+        )
     return FileResponse(
-        path=filepath,
+        path=source.path,
         filename=filename,
         media_type="text/plain; charset=utf-8",
     )
@@ -451,43 +740,75 @@ async def download_session(filename: str):
 @app.get("/sessions/{filename}/csv")
 async def download_session_csv(filename: str):
     """セッションログを CSV 形式でダウンロードする。"""
-    filepath = get_session_filepath(filename)
-    if filepath is None:
+    source = await storage.get_session_source(filename)
+    if source is None:
         return JSONResponse(
             status_code=404,
             content={"detail": "ファイルが見つかりません"},
         )
 
-    csv_headers = [
-        "timestamp", "title", "artist", "album", "genre",
-        "track_number", "number_of_tracks", "duration_ms", "status",
-    ]
+    return StreamingResponse(
+        iter_session_csv(source),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{csv_filename_for(filename)}"'},
+    )
 
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=csv_headers, extrasaction="ignore")
-    writer.writeheader()
 
-    with open(filepath, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            record = json.loads(line)
-            if record.get("type") == "track":
-                writer.writerow(record)
+@app.get("/export")
+async def export_sessions(
+    request: Request,
+    filenames: list[str] = Query([], alias="filename"),
+    format: str = Query("zip"),
+):
+    """複数セッションをまとめて CSV / ZIP でダウンロードする。
 
-    csv_filename = filename.replace(".jsonl", ".csv")
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv; charset=utf-8",
-        headers={"Content-Disposition": f'attachment; filename="{csv_filename}"'},
+    filename を指定しなければ、絞り込み条件（/sessions と同じパラメータ）に合う全セッションが対象。
+    """
+    if format not in ("csv", "zip"):
+        return JSONResponse(
+            status_code=400,
+            content={"detail": "format は csv または zip を指定してください"},
+        )
+
+    if not filenames:
+        try:
+            session_filter = SessionFilter.from_query(_filter_values(request))
+        except ValueError:
+            return JSONResponse(
+                status_code=400,
+                content={"detail": "日付は YYYY-MM-DD 形式で指定してください"},
+            )
+        filenames = [s["filename"] for s in await storage.list_sessions(session_filter)]
+
+    sources = []
+    for filename in filenames:
+        source = await storage.get_session_source(filename)
+        if source is None:
+            return JSONResponse(
+                status_code=404,
+                content={"detail": f"ファイルが見つかりません: {filename}"},
+            )
+        sources.append(source)
+
+    export_name = f"sessions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    if format == "csv":
+        body = iter_sessions_csv(sources)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        body = iter_sessions_zip(sources)
+        media_type = "application/zip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_name}"'},
     )
 
 
 @app.delete("/sessions/{filename}", response_class=HTMLResponse)
-async def remove_session(request: Request, filename: str):
-    """セッションログファイルを削除する。"""
-    if not delete_session(filename):
+async def remove_session(request: Request, filename: str, offset: int = Query(0, ge=0)):
+    """セッションログファイルを削除し、削除前と同じ絞り込み条件・ページの一覧を返す。"""
+    if not await storage.delete_session(filename):
         return JSONResponse(
             status_code=404,
             content={"detail": "ファイルが見つかりません"},
@@ -495,11 +816,17 @@ async def remove_session(request: Request, filename: str):
 
     logger.info("セッション削除: %s", filename)
 
-    sessions = list_sessions()
-    return templates.TemplateResponse(
-        "partials/session_list.html",
-        {"request": request, "sessions": sessions},
-    )
+    filter_values = _filter_values(request)
+    try:
+        session_filter = SessionFilter.from_query(filter_values)
+    except ValueError:
+        session_filter, filter_values = SessionFilter(), {}
+    context = await _session_list_context(request, session_filter, offset, filter_values)
+    if not context["sessions"] and offset > 0:
+        # ページの最後の 1 件を削除した場合は、残っている最後のページを表示する
+        offset = max(0, (context["total"] - 1) // SESSION_PAGE_SIZE * SESSION_PAGE_SIZE)
+        context = await _session_list_context(request, session_filter, offset, filter_values)
+    return templates.TemplateResponse("partials/session_list.html", context)
 
 
 # ── ダッシュボード ──
@@ -508,25 +835,93 @@ async def remove_session(request: Request, filename: str):
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """分析ダッシュボードページ。"""
-    from app.services.analysis import METADATA_FIELDS
-
-    summary = get_statistics_summary()
-    coverage = get_field_coverage_matrix()
-    comparisons = get_device_os_comparison()
+    result = await storage.compute_dashboard()
 
     return templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
-            "summary": summary,
-            "coverage": coverage,
-            "comparisons": comparisons,
+            "summary": result["summary"],
+            "coverage": result["coverage"],
+            "comparisons": result["comparisons"],
             "fields": METADATA_FIELDS,
         },
     )
 
 
-# ── ヘルスチェック ──
+# ── フリートの取り込み（中央ノード） ──
+
+
+def _ingest_denied(request: Request) -> Optional[JSONResponse]:
+    """中央ノードでない、またはトークンが一致しなければエラーのレスポンスを返す。"""
+    if ROLE != "central":
+        return JSONResponse(status_code=404, content={"detail": "中央ノードではありません"})
+    if not INGEST_TOKEN:
+        return JSONResponse(status_code=403, content={"detail": "BT_INGEST_TOKEN が設定されていません"})
+    authorization = request.headers.get("authorization", "").encode("utf-8")
+    if not hmac.compare_digest(authorization, f"Bearer {INGEST_TOKEN}".encode("utf-8")):
+        return JSONResponse(status_code=401, content={"detail": "トークンが一致しません"})
+    return None
+
+
+def _ingest_error_response(e: IngestError) -> JSONResponse:
+    content = {"detail": str(e)}
+    if e.offset is not None:
+        content["offset"] = e.offset
+    return JSONResponse(status_code=e.status_code, content=content)
+
+
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request):
+    """コレクターが送りたいセッションの取り込み状況を返す。
+
+    本文: {"collector": "bench-1", "sessions": [{"filename": ..., "size": ..., "sha256": ...}, ...]}
+    """
+    denied = _ingest_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": "JSON を解釈できません"})
+    if not isinstance(body, dict):
+        return JSONResponse(status_code=400, content={"detail": "JSON を解釈できません"})
+
+    try:
+        sessions = await storage.plan_ingest(body.get("collector"), body.get("sessions"))
+    except IngestError as e:
+        return _ingest_error_response(e)
+    return {"sessions": sessions}
+
+
+@app.put("/ingest/uploads/{upload_id}")
+async def ingest_upload(upload_id: str, request: Request):
+    """セッションファイルの続き（Upload-Offset バイト目から）を受け取る。"""
+    denied = _ingest_denied(request)
+    if denied is not None:
+        return denied
+    try:
+        offset = int(request.headers.get("upload-offset", ""))
+        content_length = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": "Upload-Offset ヘッダーが必要です"})
+    too_large = JSONResponse(
+        status_code=413,
+        content={"detail": f"1 回に送れるのは {MAX_CHUNK_BYTES // (1024 * 1024)}MB までです"},
+    )
+    if content_length > MAX_CHUNK_BYTES:
+        return too_large
+
+    data = await request.body()
+    if len(data) > MAX_CHUNK_BYTES:
+        return too_large
+    try:
+        return await storage.write_ingest_chunk(upload_id, offset, data)
+    except IngestError as e:
+        return _ingest_error_response(e)
+
+
+# ── ヘルスチェック・メトリクス ──
 
 
 @app.get("/health")
@@ -544,10 +939,34 @@ async def health():
 
     return {
         "status": "ok",
-        "session_active": session.active,
+        "session_active": bool(active_sessions),
+        "active_sessions": len(active_sessions),
+        "role": ROLE,
         "mock_mode": _monitor.is_mock if _monitor else None,
+        "monitor": _monitor.stats() if _monitor else None,
+        "uploader": _uploader.stats() if _uploader else None,
         "last_metadata_time": _last_metadata_time.isoformat() if _last_metadata_time else None,
         "uptime_seconds": uptime_seconds,
         "server_start_time": _server_start_time.isoformat() if _server_start_time else None,
         "log_file_size_bytes": log_file_size,
     }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """収集パイプラインのメトリクスを Prometheus のテキスト形式で返す。"""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/debug/latency")
+async def debug_latency(reset: bool = False):
+    """シグナル受信から SSE 送出までの区間ごとのパーセンタイル（ミリ秒）を返す。
+
+    reset=true で集計結果を返したあとリングバッファを空にする。
+    """
+    summary = latency_tracer.summary()
+    if reset:
+        latency_tracer.reset()
+    return summary
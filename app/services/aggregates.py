@@ -0,0 +1,65 @@
+"""
+メタデータ充実度の集計カウンターモジュール。
+
+セッションごとに「各フィールドに有意な値が入っていたトラック数」を数え、
+インデックスに保存しておく。ダッシュボードはトラックを読み直さずに
+このカウンターの合計からカバー率を計算する。
+"""
+
+from typing import Iterable
+
+# 分析対象のメタデータフィールド
+METADATA_FIELDS = [
+    "title", "artist", "album", "genre",
+    "track_number", "number_of_tracks", "duration_ms",
+]
+
+# カウンター dict のトラック総数キー
+TRACKS_KEY = "tracks"
+
+
+def has_value(value) -> bool:
+    """メタデータフィールドに有意な値があるか判定する。"""
+    if value is None:
+        return False
+    if isinstance(value, str) and not value.strip():
+        return False
+    if isinstance(value, (int, float)) and value == 0:
+        return False
+    return True
+
+
+def empty_counts() -> dict[str, int]:
+    """空のカウンターを返す。"""
+    counts = {TRACKS_KEY: 0}
+    for field_name in METADATA_FIELDS:
+        counts[field_name] = 0
+    return counts
+
+
+def add_track(counts: dict[str, int], track: dict):
+    """トラック 1 件分をカウンターに加算する。"""
+    counts[TRACKS_KEY] += 1
+    for field_name in METADATA_FIELDS:
+        if has_value(track.get(field_name)):
+            counts[field_name] += 1
+
+
+def count_tracks(tracks: Iterable[dict]) -> dict[str, int]:
+    """トラック列からカウンターを作る。"""
+    counts = empty_counts()
+    for track in tracks:
+        add_track(counts, track)
+    return counts
+
+
+def coverage_rates(counts: dict[str, int]) -> dict[str, float]:
+    """カウンターからフィールドごとの取得率（%）を計算する。"""
+    total = counts.get(TRACKS_KEY, 0)
+    rates = {}
+    for field_name in METADATA_FIELDS:
+        if total > 0:
+            rates[field_name] = round(counts.get(field_name, 0) / total * 100, 1)
+        else:
+            rates[field_name] = 0.0
+    return rates
@@ -3,94 +3,145 @@
 
 セッションデータを読み込み、メタデータ充実度マトリクスや
 端末×OS比較テーブル、統計サマリーを生成する。
+
+トラックは読み直さず、保存時にインデックスへ記録した
+セッションごとのフィールドカウンターを合計して計算する。
+3 種類の集計は compute_dashboard() で 1 回の走査からまとめて作り、
+データの版（database.data_version()）が変わるまでプロセス内にキャッシュする。
+
+中央ノードでは、コレクターから取り込んだセッションも同じインデックスに入っているので、
+同じ集計がフリート全体のダッシュボードになる。
 """
 
-import json
 import logging
+import threading
 from collections import defaultdict
-from pathlib import Path
+from typing import Optional
+
+from app.services import metrics
+from app.services.aggregates import (
+    METADATA_FIELDS,
+    TRACKS_KEY,
+    coverage_rates,
+    empty_counts,
+)
+from app.services.database import aggregate_sessions, data_version, sync_index
 
 logger = logging.getLogger(__name__)
 
-DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
-
-# 分析対象のメタデータフィールド
-METADATA_FIELDS = [
-    "title", "artist", "album", "genre",
-    "track_number", "number_of_tracks", "duration_ms",
-]
-
-
-def _load_all_sessions() -> list[dict]:
-    """全セッションデータを読み込む。ヘッダーとトラックを含む。"""
-    if not DATA_DIR.exists():
-        return []
-
-    sessions = []
-    for filepath in sorted(DATA_DIR.glob("*.jsonl")):
-        try:
-            header = None
-            tracks = []
-            with open(filepath, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    record = json.loads(line)
-                    if record.get("type") == "session_header":
-                        header = record
-                    elif record.get("type") == "track":
-                        tracks.append(record)
-
-            if header:
-                sessions.append({
-                    "header": header,
-                    "tracks": tracks,
-                    "filename": filepath.name,
-                })
-        except (json.JSONDecodeError, OSError):
-            logger.warning("セッションファイルの読み込みに失敗: %s", filepath.name)
-
-    return sessions
-
-
-def _has_value(value) -> bool:
-    """メタデータフィールドに有意な値があるか判定する。"""
-    if value is None:
-        return False
-    if isinstance(value, str) and not value.strip():
-        return False
-    if isinstance(value, (int, float)) and value == 0:
-        return False
-    return True
+# 比較テーブルのグループキー（この単位で集計すれば他の集計はすべて導出できる）
+_GROUP_KEYS = ("content_name", "device", "os_version", "platform_type", "bg_playback")
 
+# (データの版, 集計結果) のキャッシュ
+_cache: Optional[tuple[tuple, dict]] = None
+_cache_lock = threading.Lock()
 
-def get_statistics_summary() -> dict:
-    """全体統計サマリーを返す。"""
-    sessions = _load_all_sessions()
 
-    total_sessions = len(sessions)
-    total_tracks = sum(len(s["tracks"]) for s in sessions)
+def compute_dashboard() -> dict:
+    """ダッシュボードの集計をまとめて返す。
 
-    # サービス別セッション数
-    service_counts: dict[str, int] = defaultdict(int)
-    for s in sessions:
-        content = s["header"].get("content_name", "Unknown")
-        service_counts[content] += 1
+    データの版が前回と同じならキャッシュを返す。
+    返り値は呼び出し元で共有されるため変更しないこと。
 
-    # デバイス別セッション数
+    Returns:
+        {
+            "summary": get_statistics_summary() と同じ形式,
+            "coverage": get_field_coverage_matrix() と同じ形式,
+            "comparisons": get_device_os_comparison() と同じ形式,
+        }
+    """
+    global _cache
+    sync_index()
+    version = data_version()
+
+    with _cache_lock:
+        if _cache is not None and _cache[0] == version:
+            metrics.DASHBOARD_CACHE_HITS.inc()
+            return _cache[1]
+
+        with metrics.DASHBOARD_COMPUTE_SECONDS.time():
+            result = _compute_dashboard()
+        _cache = (version, result)
+        return result
+
+
+def _compute_dashboard() -> dict:
+    """グループ単位のカウンターを 1 回走査して 3 種類の集計を作る。"""
+    total_sessions = 0
+    total_tracks = 0
+    service_counts: dict[str, int] = defaultdict(int)
     device_counts: dict[str, int] = defaultdict(int)
-    for s in sessions:
-        device = s["header"].get("device", "Unknown")
-        device_counts[device] += 1
+    service_totals: dict[str, dict[str, int]] = {}
+    comparisons = []
 
-    return {
+    # グループはファイル名順で最初に現れた順に並んでいる
+    for group in aggregate_sessions(_GROUP_KEYS):
+        counts = group["counts"]
+        total_sessions += group["session_count"]
+        total_tracks += counts[TRACKS_KEY]
+
+        content = group["content_name"] or "Unknown"
+        service_counts[content] += group["session_count"]
+        device_counts[group["device"] or "Unknown"] += group["session_count"]
+
+        merged = service_totals.setdefault(content, empty_counts())
+        for key, value in counts.items():
+            merged[key] += value
+
+        comparisons.append({
+            "content_name": group["content_name"],
+            "device": group["device"],
+            "os_version": group["os_version"],
+            "platform_type": group["platform_type"],
+            "bg_playback": group["bg_playback"],
+            "session_count": group["session_count"],
+            "track_count": counts[TRACKS_KEY],
+            "field_coverage": coverage_rates(counts),
+        })
+
+    # 中央ノードでは、コレクターごとのセッション数・トラック数も出す（このノードで記録した分は除く）
+    collector_counts = {
+        group["collector"]: {
+            "sessions": group["session_count"],
+            "tracks": group["counts"][TRACKS_KEY],
+        }
+        for group in aggregate_sessions(("collector",))
+        if group["collector"]
+    }
+
+    summary = {
         "total_sessions": total_sessions,
         "total_tracks": total_tracks,
         "service_counts": dict(sorted(service_counts.items(), key=lambda x: -x[1])),
         "device_counts": dict(sorted(device_counts.items(), key=lambda x: -x[1])),
+        "collector_counts": dict(sorted(collector_counts.items())),
     }
 
+    matrix = {
+        service: coverage_rates(counts)
+        for service, counts in service_totals.items()
+        if counts[TRACKS_KEY]
+    }
+    coverage = {
+        "services": sorted(matrix.keys()),
+        "fields": METADATA_FIELDS,
+        "matrix": matrix,
+    }
+
+    # content_name, device, os_version でソート
+    comparisons.sort(key=lambda x: (x["content_name"], x["device"], x["os_version"]))
+
+    return {
+        "summary": summary,
+        "coverage": coverage,
+        "comparisons": comparisons,
+    }
+
+
+def get_statistics_summary() -> dict:
+    """全体統計サマリーを返す。"""
+    return compute_dashboard()["summary"]
+
 
 def get_field_coverage_matrix() -> dict:
     """メタデータ充実度マトリクスを返す。
@@ -105,32 +156,7 @@ def get_field_coverage_matrix() -> dict:
             }
         }
     """
-    sessions = _load_all_sessions()
-
-    # サービスごとにトラックを集計
-    service_tracks: dict[str, list[dict]] = defaultdict(list)
-    for s in sessions:
-        content = s["header"].get("content_name", "Unknown")
-        service_tracks[content].extend(s["tracks"])
-
-    matrix = {}
-    for service, tracks in service_tracks.items():
-        if not tracks:
-            continue
-        total = len(tracks)
-        field_rates = {}
-        for field_name in METADATA_FIELDS:
-            count = sum(1 for t in tracks if _has_value(t.get(field_name)))
-            field_rates[field_name] = round(count / total * 100, 1)
-        matrix[service] = field_rates
-
-    services = sorted(matrix.keys())
-
-    return {
-        "services": services,
-        "fields": METADATA_FIELDS,
-        "matrix": matrix,
-    }
+    return compute_dashboard()["coverage"]
 
 
 def get_device_os_comparison() -> list[dict]:
@@ -150,55 +176,4 @@ def get_device_os_comparison() -> list[dict]:
             ...
         ]
     """
-    sessions = _load_all_sessions()
-
-    # (content, device, os, platform) ごとに集計
-    groups: dict[tuple, dict] = {}
-    for s in sessions:
-        h = s["header"]
-        key = (
-            h.get("content_name", ""),
-            h.get("device", ""),
-            h.get("os_version", ""),
-            h.get("platform_type", ""),
-            h.get("bg_playback", False),
-        )
-        if key not in groups:
-            groups[key] = {
-                "content_name": key[0],
-                "device": key[1],
-                "os_version": key[2],
-                "platform_type": key[3],
-                "bg_playback": key[4],
-                "session_count": 0,
-                "tracks": [],
-            }
-        groups[key]["session_count"] += 1
-        groups[key]["tracks"].extend(s["tracks"])
-
-    result = []
-    for group in groups.values():
-        tracks = group["tracks"]
-        total = len(tracks) if tracks else 0
-        field_coverage = {}
-        for field_name in METADATA_FIELDS:
-            if total > 0:
-                count = sum(1 for t in tracks if _has_value(t.get(field_name)))
-                field_coverage[field_name] = round(count / total * 100, 1)
-            else:
-                field_coverage[field_name] = 0.0
-
-        result.append({
-            "content_name": group["content_name"],
-            "device": group["device"],
-            "os_version": group["os_version"],
-            "platform_type": group["platform_type"],
-            "bg_playback": group["bg_playback"],
-            "session_count": group["session_count"],
-            "track_count": total,
-            "field_coverage": field_coverage,
-        })
-
-    # content_name, device, os_version でソート
-    result.sort(key=lambda x: (x["content_name"], x["device"], x["os_version"]))
-    return result
+    return compute_dashboard()["comparisons"]
@@ -0,0 +1,255 @@
+"""
+セッションの列指向アーカイブ（Parquet）モジュール。
+
+古いセッションの JSONL を Parquet ファイルにまとめる。1 セッションを 1 行グループとし、
+トラックのフィールドは型付きの列（文字列・整数・タイムスタンプ）で持つ。
+ヘッダー属性（content_name 等）も列として持つので、分析は必要な列だけを
+メモリマップで読み込み、json.loads を介さずにベクトル演算できる。
+
+ヘッダーそのもの（player や recovered 等の任意項目を含む）は、ファイルの
+キー値メタデータに行グループ順の JSON 配列として保存する。
+トラックは CSV_HEADERS と同じ項目だけを保存する（それ以外のキーは落ちる）。
+
+pyarrow は任意依存。インストールされていなければ available() が False を返し、
+アーカイブは作らない（セッションは JSONL のまま）。
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from app.services.aggregates import METADATA_FIELDS, TRACKS_KEY, empty_counts
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "archive_"
+ARCHIVE_SUFFIX = ".parquet"
+ARCHIVE_GLOB = f"{ARCHIVE_PREFIX}*{ARCHIVE_SUFFIX}"
+
+# ヘッダーを保存するキー値メタデータのキー
+_SESSIONS_KEY = b"bt_sessions"
+
+# ヘッダー由来の列
+HEADER_COLUMNS = ["filename", "content_name", "platform_type", "device", "os_version", "bg_playback"]
+# トラックの列（timestamp 以外は JSONL のキーと同じ名前）
+_STRING_FIELDS = ["title", "artist", "album", "genre", "status"]
+_INT_FIELDS = ["seq", "track_number", "number_of_tracks", "duration_ms"]
+# JSONL に戻すときのキー順
+_TRACK_KEY_ORDER = [
+    "seq", "timestamp", "title", "artist", "album", "genre",
+    "track_number", "number_of_tracks", "duration_ms", "status",
+]
+
+
+def available() -> bool:
+    """pyarrow が使えるか。"""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _schema():
+    import pyarrow as pa
+
+    fields = [(name, pa.string()) for name in HEADER_COLUMNS[:-1]]
+    fields.append(("bg_playback", pa.bool_()))
+    fields.append(("timestamp", pa.timestamp("us")))
+    fields += [(name, pa.string()) for name in _STRING_FIELDS]
+    fields += [(name, pa.int64()) for name in _INT_FIELDS]
+    return pa.schema(fields)
+
+
+def _as_str(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _as_int(value) -> Optional[int]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_timestamp(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _session_table(schema, filename: str, header: dict, tracks: Iterable[dict]):
+    """1 セッション分のトラックを列ごとのリストにまとめて Table にする。"""
+    import pyarrow as pa
+
+    columns: dict[str, list] = {name: [] for name in schema.names}
+    for track in tracks:
+        columns["timestamp"].append(_as_timestamp(track.get("timestamp")))
+        for name in _STRING_FIELDS:
+            columns[name].append(_as_str(track.get(name)))
+        for name in _INT_FIELDS:
+            columns[name].append(_as_int(track.get(name)))
+
+    n_rows = len(columns["timestamp"])
+    columns["filename"] = [filename] * n_rows
+    for name in HEADER_COLUMNS[1:-1]:
+        columns[name] = [_as_str(header.get(name, ""))] * n_rows
+    columns["bg_playback"] = [bool(header.get("bg_playback"))] * n_rows
+    return pa.table(columns, schema=schema)
+
+
+def write_archive(path: Path, sessions: Iterable[tuple[str, dict, Iterable[dict]]]) -> int:
+    """セッション群を 1 つのアーカイブに書き出す（1 セッション = 1 行グループ）。
+
+    Args:
+        sessions: (ファイル名, ヘッダー, トラックのイテレーター) の列
+
+    Returns:
+        書き出したセッション数
+    """
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    entries = []
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for filename, header, tracks in sessions:
+                table = _session_table(schema, filename, header, tracks)
+                writer.write_table(table, row_group_size=max(table.num_rows, 1))
+                entries.append({"filename": filename, "header": header})
+            writer.add_key_value_metadata(
+                {_SESSIONS_KEY: json.dumps(entries, ensure_ascii=False).encode("utf-8")}
+            )
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return len(entries)
+
+
+def _open(path: Path):
+    import pyarrow.parquet as pq
+
+    return pq.ParquetFile(path, memory_map=True)
+
+
+def _read_entries(parquet_file) -> list[dict]:
+    metadata = parquet_file.metadata.metadata or {}
+    return json.loads(metadata.get(_SESSIONS_KEY, b"[]"))
+
+
+def read_session_summaries(path: Path) -> list[tuple[str, dict, dict[str, int]]]:
+    """アーカイブ内の全セッションのヘッダーとフィールドカウンターを返す。
+
+    カウンターは行グループごとに列単位のベクトル演算で数える。
+
+    Returns:
+        [(ファイル名, ヘッダー, カウンター), ...]（行グループ順）
+    """
+    import pyarrow.compute as pc
+
+    parquet_file = _open(path)
+    entries = _read_entries(parquet_file)
+    if len(entries) != parquet_file.num_row_groups:
+        raise ValueError(f"アーカイブのメタデータが行グループ数と一致しません: {path.name}")
+
+    summaries = []
+    for i, entry in enumerate(entries):
+        table = parquet_file.read_row_group(i, columns=METADATA_FIELDS)
+        counts = empty_counts()
+        counts[TRACKS_KEY] = table.num_rows
+        for name in METADATA_FIELDS:
+            column = table.column(name)
+            if name in _STRING_FIELDS:
+                present = pc.not_equal(pc.utf8_trim_whitespace(column), "")
+            else:
+                present = pc.not_equal(column, 0)
+            counts[name] = pc.sum(present).as_py() or 0
+        summaries.append((entry["filename"], entry["header"], counts))
+    return summaries
+
+
+def read_headers(path: Path) -> list[tuple[str, dict]]:
+    """アーカイブ内の全セッションの (ファイル名, ヘッダー) を行グループ順に返す。"""
+    return [(entry["filename"], entry["header"]) for entry in _read_entries(_open(path))]
+
+
+def iter_session_records(path: Path, row_group: int) -> Iterator[dict]:
+    """アーカイブ内の 1 セッションをヘッダー・トラックのレコードとして返す。
+
+    JSONL のセッションファイルを 1 行ずつ読むのと同じ形式になる。
+    """
+    parquet_file = _open(path)
+    entries = _read_entries(parquet_file)
+    yield entries[row_group]["header"]
+
+    table = parquet_file.read_row_group(row_group, columns=_TRACK_KEY_ORDER)
+    for row in _rows(table):
+        record = {"type": "track", **row}
+        if record["seq"] is None:
+            del record["seq"]
+        yield record
+
+
+def read_tracks(paths: Iterable[Path], columns: Optional[list[str]] = None):
+    """アーカイブ群のトラックを 1 つの Table として読み込む（メモリマップ）。
+
+    Args:
+        columns: 読み込む列（None なら全列）。例: ["content_name"] + METADATA_FIELDS
+    """
+    import pyarrow as pa
+
+    tables = [_open(path).read(columns=columns) for path in paths]
+    if not tables:
+        schema = _schema()
+        if columns is not None:
+            schema = pa.schema([schema.field(name) for name in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+
+def remove_session(path: Path, row_group: int) -> bool:
+    """アーカイブから 1 セッション（行グループ）を取り除いて書き直す。
+
+    Returns:
+        アーカイブにセッションが残っていれば True（空になったらファイルを削除して False）
+    """
+    parquet_file = _open(path)
+    entries = _read_entries(parquet_file)
+
+    remaining = [
+        (entry["filename"], entry["header"], i)
+        for i, entry in enumerate(entries)
+        if i != row_group
+    ]
+    if not remaining:
+        path.unlink()
+        return False
+
+    def sessions():
+        for filename, header, i in remaining:
+            table = parquet_file.read_row_group(i, columns=_TRACK_KEY_ORDER)
+            yield filename, header, _rows(table)
+
+    write_archive(path, sessions())
+    return True
+
+
+def _rows(table) -> Iterator[dict]:
+    for batch in table.to_batches():
+        for row in batch.to_pylist():
+            if row["timestamp"] is not None:
+                row["timestamp"] = row["timestamp"].isoformat()
+            yield row
@@ -4,49 +4,207 @@ BlueZ D-Bus AVRCP メタデータ監視モジュール。
 D-Bus 経由で BlueZ の MediaPlayer1 インターフェースを監視し、
 AVRCP メタデータの変更をコールバックで通知する。
 
+複数のアダプター・端末を同時に扱えるよう、ステータスや重複判定の状態は
+MediaPlayer1 のオブジェクトパス（プレイヤー）ごとに持ち、
+通知するメタデータには "player" キーでパスを付ける。
+
 環境変数 BT_MOCK=true でモックモードが有効になり、
 D-Bus を使わずにテストデータを定期的に生成する。
+BT_MOCK_PLAYERS=N で N 台のモックプレイヤーを模擬する。
+
+D-Bus バックエンドは BT_DBUS_BACKEND で選ぶ。
+- glib（既定）: dbus-python + GLib のメインループを専用スレッドで回す
+- asyncio: dbus-next で uvicorn のイベントループ上から直接シグナルを購読する
+  （スレッドをまたがないので遅延が小さく、停止も即座に終わる）
+- replay: BT_CAPTURE で記録したシグナルを BT_REPLAY_FILE から読み、BT_REPLAY_SPEED
+  （1・N 倍速・max、既定 1）で流し直す（signal_capture.py）。重複判定の時刻も記録上の
+  時刻を使うので、再生速度によらず同じ結果になる
+
+BT_CAPTURE=<ファイル> を設定すると、どのバックエンドでも受信した PropertiesChanged を
+受信時刻付きでファイルに記録する。
+
+同じプレイヤーから短時間に届く同一内容のシグナルは DedupFilter で間引く。
+判定の時間窓は BT_DEDUP_WINDOW（秒、既定 2.0、0 で無効）で変更できる。
 """
 
+import asyncio
 import logging
 import os
 import random
+import re
 import threading
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
 from typing import Callable, Optional
 
+from app.services import metrics
+from app.services.signal_capture import CapturedSignal, SignalRecorder, iter_capture, parse_speed, replay
+
 logger = logging.getLogger(__name__)
 
 # AVRCP メタデータのコールバック型
-# callback(metadata: dict) の形式で呼び出される
-MetadataCallback = Callable[[dict], None]
-
-
-def _dbus_to_python(value):
-    """D-Bus 型を Python ネイティブ型に変換する。"""
-    try:
-        import dbus
-    except ImportError:
-        return value
-
-    if isinstance(value, dbus.String):
-        return str(value)
-    elif isinstance(value, (dbus.Int16, dbus.Int32, dbus.Int64,
-                            dbus.UInt16, dbus.UInt32, dbus.UInt64)):
-        return int(value)
-    elif isinstance(value, dbus.Double):
-        return float(value)
-    elif isinstance(value, dbus.Boolean):
-        return bool(value)
-    elif isinstance(value, dbus.Array):
-        return [_dbus_to_python(item) for item in value]
-    elif isinstance(value, dbus.Dictionary):
-        return {_dbus_to_python(k): _dbus_to_python(v) for k, v in value.items()}
-    elif isinstance(value, dbus.Byte):
-        return int(value)
-    else:
-        return value
+# callback(metadata: dict, received_at: float) の形式で呼び出される（received_at はシグナルの受信時刻 = time.perf_counter()）
+MetadataCallback = Callable[[dict, float], None]
+
+# /org/bluez/hci0/dev_AA_BB_CC_DD_EE_FF/player0 形式のプレイヤーパス
+_PLAYER_PATH_RE = re.compile(r"^/org/bluez/(?P<adapter>[^/]+)/dev_(?P<address>[0-9A-Fa-f_]+)(/|$)")
+
+
+def parse_player_path(path: str) -> tuple[str, str]:
+    """プレイヤーのオブジェクトパスからアダプター名と端末アドレスを取り出す。
+
+    Returns:
+        ("hci0", "AA:BB:CC:DD:EE:FF")。解釈できなければ ("", "")
+    """
+    match = _PLAYER_PATH_RE.match(path or "")
+    if not match:
+        return "", ""
+    return match.group("adapter"), match.group("address").replace("_", ":")
+
+
+def _mock_player_path(index: int) -> str:
+    return f"/org/bluez/hci0/dev_00_00_00_00_00_{index:02X}/player0"
+
+
+# 重複判定の既定の時間窓（秒）
+DEFAULT_DEDUP_WINDOW = 2.0
+# 重複判定で覚えておくプレイヤー数の上限
+DEDUP_MAX_ENTRIES = 64
+
+
+@dataclass
+class PlayerState:
+    """プレイヤー（MediaPlayer1 のオブジェクトパス）ごとの状態。"""
+
+    path: str
+    adapter: str = ""
+    address: str = ""
+    status: str = ""
+
+
+class DedupFilter:
+    """プレイヤーごとの重複シグナル判定。
+
+    プレイヤーごとに直前に通知したキーと時刻だけを覚え、時間窓内に同じキーが
+    来たら間引く。エントリは最終更新順の OrderedDict に持ち、時間窓を過ぎた
+    ものと上限を超えたものは古い順に捨てる（判定・掃除とも O(1) 償却）。
+    """
+
+    def __init__(
+        self,
+        window: float = DEFAULT_DEDUP_WINDOW,
+        max_entries: int = DEDUP_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self._max_entries = max_entries
+        self._clock = clock
+        # プレイヤーパス → (キー, 通知時刻)
+        self._last: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.forwarded = 0
+        self.suppressed = 0
+
+    def should_forward(self, player: str, key: str) -> bool:
+        """通知すべきなら True、重複なら False を返す。"""
+        now = self._clock()
+        entry = self._last.get(player)
+        if entry is not None and entry[0] == key and now - entry[1] < self.window:
+            self.suppressed += 1
+            return False
+
+        self._last[player] = (key, now)
+        self._last.move_to_end(player)
+        self._evict(now)
+        self.forwarded += 1
+        return True
+
+    def _evict(self, now: float):
+        while self._last:
+            _, (_, seen) = next(iter(self._last.items()))
+            if len(self._last) <= self._max_entries and now - seen < self.window:
+                break
+            self._last.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "tracked_players": len(self._last),
+            "forwarded": self.forwarded,
+            "suppressed": self.suppressed,
+        }
+
+
+# PropertiesChanged のうち参照するプロパティ
+_USED_PROPERTIES = ("Track", "Status")
+# Track 辞書のうち _parse_track_metadata() が使うキー
+_TRACK_KEYS = ("Title", "Artist", "Album", "Genre", "TrackNumber", "NumberOfTracks", "Duration")
+
+
+class DBusConverter:
+    """D-Bus 型を Python ネイティブ型に変換する。
+
+    dbus の型表は生成時に 1 回だけ引いておき、値の型そのもの（isinstance ではない）
+    で変換関数を辞書から引く。PropertiesChanged の変更内容は使うキーだけを変換する。
+    dbus-python が無い環境（モック・asyncio バックエンド）では値をそのまま返す。
+    """
+
+    def __init__(self):
+        self._converters: dict[type, Callable] = {}
+        try:
+            import dbus
+        except ImportError:
+            return
+
+        for name in ("String", "ObjectPath"):
+            self._converters[getattr(dbus, name)] = str
+        for name in ("Int16", "Int32", "Int64", "UInt16", "UInt32", "UInt64", "Byte"):
+            self._converters[getattr(dbus, name)] = int
+        self._converters[dbus.Double] = float
+        self._converters[dbus.Boolean] = bool
+        self._converters[dbus.Array] = self._convert_array
+        self._converters[dbus.Dictionary] = self._convert_dict
+
+    def convert(self, value):
+        """値を再帰的に変換する。"""
+        converter = self._converters.get(type(value))
+        if converter is None:
+            return value
+        return converter(value)
+
+    def _convert_array(self, value) -> list:
+        return [self.convert(item) for item in value]
+
+    def _convert_dict(self, value) -> dict:
+        return {self.convert(k): self.convert(v) for k, v in value.items()}
+
+    def convert_changed(self, changed) -> dict:
+        """MediaPlayer1 の PropertiesChanged から Track と Status だけを取り出して変換する。
+
+        Track は _parse_track_metadata() が読むキーだけを変換する
+        （Item や Position 等、使わない値は変換しない）。
+        """
+        result = {}
+        track = changed.get("Track")
+        if track is not None:
+            result["Track"] = {key: self.convert(track[key]) for key in _TRACK_KEYS if key in track}
+        status = changed.get("Status")
+        if status is not None:
+            result["Status"] = self.convert(status)
+        return result
+
+
+def _variant_to_python(value, variant_type: type):
+    """dbus-next の Variant を Python ネイティブ型に変換する。"""
+    if isinstance(value, variant_type):
+        value = value.value
+    if isinstance(value, dict):
+        return {k: _variant_to_python(v, variant_type) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_variant_to_python(item, variant_type) for item in value]
+    return value
 
 
 def _parse_track_metadata(track_dict: dict) -> dict:
@@ -65,25 +223,113 @@ def _parse_track_metadata(track_dict: dict) -> dict:
 class AVRCPMonitor:
     """BlueZ D-Bus AVRCP メタデータモニター。"""
 
-    def __init__(self, callback: MetadataCallback):
+    def __init__(self, callback: MetadataCallback, dedup_window: Optional[float] = None):
         self._callback = callback
         self._running = False
+        self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
+        self._glib_context = None
+        self._task: Optional[asyncio.Task] = None
+        self._bus = None
         self._mock_mode = os.environ.get("BT_MOCK", "").lower() == "true"
-        self._current_status = ""
-        self._last_track_key = ""
-        self._last_track_time = 0.0
+        self._backend = os.environ.get("BT_DBUS_BACKEND", "glib").lower()
+        self._mock_players = max(1, int(os.environ.get("BT_MOCK_PLAYERS", "1")))
+        # プレイヤーパス → 状態（D-Bus スレッドからのみ更新する）。
+        # イベントループ側から一覧を読むので、追加と読み出しは _lock の下で行う
+        self._players: dict[str, PlayerState] = {}
+        self._lock = threading.Lock()
+        if dedup_window is None:
+            dedup_window = float(os.environ.get("BT_DEDUP_WINDOW", DEFAULT_DEDUP_WINDOW))
+        # 受信したシグナルの記録（BT_CAPTURE 設定時のみ）
+        self._capture_path = os.environ.get("BT_CAPTURE", "")
+        self._recorder: Optional[SignalRecorder] = None
+        # 記録したシグナルの再生（replay バックエンド）
+        self._replay_file = os.environ.get("BT_REPLAY_FILE", "")
+        self._replay_speed = parse_speed(os.environ.get("BT_REPLAY_SPEED", "1"))
+        self._replay_stats: Optional[dict] = None
+        # 再生中のシグナルの記録上の時刻（重複判定の時計に使う）
+        self._replay_now = 0.0
+        if self._backend == "replay":
+            self._dedup = DedupFilter(window=dedup_window, clock=lambda: self._replay_now)
+        else:
+            self._dedup = DedupFilter(window=dedup_window)
+        # D-Bus 型の変換表（dbus の import と型表の構築はここで 1 回だけ）
+        self._converter = DBusConverter()
 
     @property
     def is_mock(self) -> bool:
         return self._mock_mode
 
+    @property
+    def runs_on_event_loop(self) -> bool:
+        """コールバックが asyncio のイベントループ上で呼ばれるか。"""
+        return self._task is not None
+
+    @property
+    def players(self) -> list[PlayerState]:
+        """これまでに検出したプレイヤーの一覧。"""
+        with self._lock:
+            players = list(self._players.values())
+        return sorted(players, key=lambda p: p.path)
+
+    def stats(self) -> dict:
+        """シグナルの通知・重複間引き（・記録・再生）の統計を返す。"""
+        stats = {"players": len(self._players), "dedup": self._dedup.stats()}
+        if self._recorder is not None:
+            stats["capture"] = {"file": str(self._recorder.path), "signals": self._recorder.count}
+        if self._backend == "replay":
+            stats["replay"] = {
+                "file": self._replay_file,
+                "speed": self._replay_speed or "max",
+                "finished": self._replay_stats is not None,
+                **(self._replay_stats or {}),
+            }
+        return stats
+
+    def _player(self, path: str) -> PlayerState:
+        player = self._players.get(path)
+        if player is None:
+            adapter, address = parse_player_path(path)
+            player = PlayerState(path=path, adapter=adapter, address=address)
+            with self._lock:
+                self._players[path] = player
+        return player
+
     def start(self):
-        """モニターを開始する。別スレッドで実行。"""
+        """モニターを開始する。
+
+        asyncio バックエンドは実行中のイベントループ上のタスクとして、
+        それ以外は別スレッドで実行する。
+        """
         if self._running:
             return
 
         self._running = True
+        self._stop_event.clear()
+
+        if self._capture_path:
+            self._recorder = SignalRecorder(Path(self._capture_path))
+            logger.info("受信したシグナルを記録: %s", self._capture_path)
+
+        if self._backend == "replay":
+            logger.info(
+                "記録したシグナルを再生 (%s, 速度 %s)", self._replay_file, self._replay_speed or "max"
+            )
+            self._thread = threading.Thread(
+                target=self._replay_loop, daemon=True, name="avrcp-replay"
+            )
+            self._thread.start()
+            return
+
+        if not self._mock_mode and self._backend == "asyncio":
+            try:
+                import dbus_next  # noqa: F401
+            except ImportError:
+                logger.error("dbus-next が見つかりません。glib バックエンドで起動します。")
+            else:
+                logger.info("D-Bus モード (asyncio) で AVRCP モニターを開始")
+                self._task = asyncio.get_running_loop().create_task(self._dbus_async_main())
+                return
 
         if self._mock_mode:
             logger.info("モックモードで AVRCP モニターを開始")
@@ -101,11 +347,99 @@ class AVRCPMonitor:
     def stop(self):
         """モニターを停止する。"""
         self._running = False
+        self._stop_event.set()
+
+        if self._task is not None:
+            self._task.cancel()
+            if self._bus is not None:
+                self._bus.disconnect()
+                self._bus = None
+            self._task = None
+            logger.info("AVRCP モニターを停止")
+
         if self._thread:
+            # ブロック中の GLib イテレーションを起こす
+            if self._glib_context is not None:
+                self._glib_context.wakeup()
             self._thread.join(timeout=5)
             self._thread = None
             logger.info("AVRCP モニターを停止")
 
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    async def _dbus_async_main(self):
+        """dbus-next でイベントループ上から D-Bus シグナルを購読する。
+
+        接続・購読に失敗したり、停止する前にバスが切断されたりした場合は、
+        glib バックエンド（別スレッド）に切り替えて監視を続ける。
+        """
+        from dbus_next import BusType, Message, MessageType, Variant
+        from dbus_next.aio import MessageBus
+
+        try:
+            self._bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+
+            for rule in (
+                "type='signal',sender='org.bluez',"
+                "interface='org.freedesktop.DBus.Properties',member='PropertiesChanged'",
+                "type='signal',sender='org.bluez',"
+                "interface='org.freedesktop.DBus.ObjectManager',member='InterfacesAdded'",
+            ):
+                await self._bus.call(Message(
+                    destination="org.freedesktop.DBus",
+                    path="/org/freedesktop/DBus",
+                    interface="org.freedesktop.DBus",
+                    member="AddMatch",
+                    signature="s",
+                    body=[rule],
+                ))
+
+            def on_message(message):
+                if message.message_type != MessageType.SIGNAL:
+                    return
+                if message.member == "PropertiesChanged":
+                    interface, changed, invalidated = message.body
+                    # 使うキーの Variant だけを剥がす
+                    changed = {
+                        k: _variant_to_python(changed[k], Variant)
+                        for k in _USED_PROPERTIES if k in changed
+                    }
+                    self._on_properties_changed(interface, changed, invalidated, path=message.path)
+                elif message.member == "InterfacesAdded":
+                    path, interfaces = message.body
+                    self._on_interfaces_added(path, interfaces)
+
+            self._bus.add_message_handler(on_message)
+            logger.info("D-Bus シグナル監視を開始 (asyncio)")
+            await self._bus.wait_for_disconnect()
+
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("D-Bus (asyncio) でエラーが発生")
+
+        self._fall_back_to_glib()
+
+    def _fall_back_to_glib(self):
+        """asyncio バックエンドのタスクを片付け、停止中でなければ glib バックエンドのスレッドを開始する。"""
+        self._task = None
+        if self._bus is not None:
+            try:
+                self._bus.disconnect()
+            except Exception:
+                pass
+            self._bus = None
+        if not self._running:
+            return
+
+        logger.warning("D-Bus (asyncio) を使えないため、glib バックエンドに切り替えます")
+        self._thread = threading.Thread(
+            target=self._dbus_loop, daemon=True, name="avrcp-dbus"
+        )
+        self._thread.start()
+
     def _dbus_loop(self):
         """D-Bus メインループを実行する（別スレッド）。"""
         try:
@@ -133,10 +467,10 @@ class AVRCPMonitor:
 
             logger.info("D-Bus シグナル監視を開始")
             loop = GLib.MainLoop()
+            self._glib_context = loop.get_context()
 
             while self._running:
-                context = loop.get_context()
-                context.iteration(True)
+                self._glib_context.iteration(True)
 
         except ImportError:
             logger.error(
@@ -150,10 +484,15 @@ class AVRCPMonitor:
 
     def _on_properties_changed(self, interface, changed, invalidated, path=""):
         """D-Bus PropertiesChanged シグナルのハンドラー。"""
+        received_at = time.perf_counter()
         if interface != "org.bluez.MediaPlayer1":
             return
+        metrics.DBUS_SIGNALS.inc()
 
-        changed = _dbus_to_python(changed)
+        changed = self._converter.convert_changed(changed)
+        if self._recorder is not None:
+            self._recorder.record(received_at, str(path), changed, invalidated)
+        player = self._player(str(path))
 
         metadata = {}
 
@@ -161,35 +500,32 @@ class AVRCPMonitor:
             metadata = _parse_track_metadata(changed["Track"])
 
         if "Status" in changed:
-            self._current_status = changed["Status"]
+            player.status = changed["Status"]
 
         if metadata:
-            # 同一トラックの重複シグナルを除外（2秒以内の同じ Title+Artist）
+            # 同一トラックの重複シグナルを除外（同じプレイヤーで時間窓内の同じ Title+Artist）
             track_key = f"{metadata.get('title', '')}|{metadata.get('artist', '')}"
-            now = time.time()
-            if track_key == self._last_track_key and (now - self._last_track_time) < 2.0:
+            if not self._dedup.should_forward(player.path, track_key):
+                metrics.DEDUP_SUPPRESSED.inc(kind="track")
                 logger.debug("重複シグナルをスキップ: %s", metadata.get("title", ""))
                 return
-            self._last_track_key = track_key
-            self._last_track_time = now
 
-            metadata["status"] = self._current_status
+            metadata["status"] = player.status
             metadata["timestamp"] = datetime.now().isoformat()
-            logger.debug("AVRCP メタデータ受信: %s", metadata.get("title", ""))
-            self._callback(metadata)
+            metadata["player"] = player.path
+            logger.debug("AVRCP メタデータ受信: %s (%s)", metadata.get("title", ""), player.path)
+            self._callback(metadata, received_at)
         elif "Status" in changed:
             # Status のみの変更もカードを生成する（YouTube アプリ等、Track を送らないアプリ対応）
-            status_key = f"status|{self._current_status}"
-            now = time.time()
-            if status_key == self._last_track_key and (now - self._last_track_time) < 2.0:
-                logger.debug("重複ステータスをスキップ: %s", self._current_status)
+            status_key = f"status|{player.status}"
+            if not self._dedup.should_forward(player.path, status_key):
+                metrics.DEDUP_SUPPRESSED.inc(kind="status")
+                logger.debug("重複ステータスをスキップ: %s", player.status)
                 return
-            self._last_track_key = status_key
-            self._last_track_time = now
 
-            logger.debug("AVRCP ステータス変更: %s", self._current_status)
+            logger.debug("AVRCP ステータス変更: %s (%s)", player.status, player.path)
             self._callback({
-                "status": self._current_status,
+                "status": player.status,
                 "timestamp": datetime.now().isoformat(),
                 "title": "",
                 "artist": "",
@@ -198,13 +534,37 @@ class AVRCPMonitor:
                 "track_number": None,
                 "number_of_tracks": None,
                 "duration_ms": None,
-            })
+                "player": player.path,
+            }, received_at)
 
     def _on_interfaces_added(self, path, interfaces):
         """新しい Bluetooth インターフェース追加の検出。"""
-        interfaces = _dbus_to_python(interfaces)
         if "org.bluez.MediaPlayer1" in interfaces:
             logger.info("新しい MediaPlayer1 インターフェース検出: %s", path)
+            self._player(str(path))
+
+    # ── 記録したシグナルの再生 ──
+
+    def _replay_loop(self):
+        """記録したシグナルを _on_properties_changed() に流し直す（別スレッド）。"""
+        def handle(signal: CapturedSignal):
+            self._replay_now = signal.offset
+            self._on_properties_changed(
+                "org.bluez.MediaPlayer1", signal.changed, signal.invalidated, path=signal.path
+            )
+
+        try:
+            stats = replay(
+                iter_capture(Path(self._replay_file)), handle, self._replay_speed, self._stop_event
+            )
+        except (OSError, ValueError, EOFError):
+            logger.exception("シグナルの再生に失敗: %s", self._replay_file)
+            stats = {"signals": 0, "elapsed": 0.0, "captured": 0.0, "lag_max": 0.0, "error": True}
+        self._replay_stats = stats
+        logger.info(
+            "シグナルの再生を終了: %d 件, %.2f 秒（記録上 %.2f 秒）",
+            stats["signals"], stats["elapsed"], stats["captured"],
+        )
 
     # ── モックモード ──
 
@@ -317,14 +677,14 @@ class AVRCPMonitor:
 
     def _mock_loop(self):
         """モックデータを定期的に生成するループ。"""
-        logger.info("モックデータ生成ループを開始")
+        logger.info("モックデータ生成ループを開始 (%d プレイヤー)", self._mock_players)
+        for i in range(self._mock_players):
+            self._player(_mock_player_path(i))
 
         while self._running:
             # 5〜15 秒のランダム間隔
             interval = random.uniform(5, 15)
-            time.sleep(interval)
-
-            if not self._running:
+            if self._stop_event.wait(interval):
                 break
 
             track = random.choice(self._MOCK_TRACKS).copy()
@@ -332,6 +692,7 @@ class AVRCPMonitor:
             if random.random() < 0.15:
                 track["status"] = "paused"
             track["timestamp"] = datetime.now().isoformat()
+            track["player"] = _mock_player_path(random.randrange(self._mock_players))
 
             logger.debug("モックデータ生成: %s", track.get("title", ""))
-            self._callback(track)
+            self._callback(track, time.perf_counter())
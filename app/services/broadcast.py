@@ -0,0 +1,115 @@
+"""
+SSE 配信ハブモジュール。
+
+1 つのイベントを全 SSE クライアントに配る。フレームはイベントごとに 1 回だけ
+エンコードし、同じ bytes オブジェクトを各クライアントのキューに入れる。
+キューが溢れたクライアントはイベントを取りこぼすが、その件数は数えておき
+統計として参照できるようにする。
+
+キューには (フレーム, イベントの発生時刻, キューへの投入時刻) を入れる。時刻は
+time.perf_counter() の値で、送出までの遅延の計測に使う。
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sse_starlette.sse import ServerSentEvent
+
+logger = logging.getLogger(__name__)
+
+# クライアントごとのキューの上限
+QUEUE_MAXSIZE = 100
+
+
+def encode_event(event: str, data: str) -> bytes:
+    """SSE フレームをエンコードする。"""
+    return ServerSentEvent(data=data, event=event).encode()
+
+
+@dataclass
+class Subscriber:
+    """SSE クライアント 1 つ分の配信状態。"""
+
+    id: int
+    queue: asyncio.Queue = field(repr=False)
+    delivered: int = 0
+    dropped: int = 0
+    max_lag: int = 0
+
+    @property
+    def lag(self) -> int:
+        """未送信のイベント数。"""
+        return self.queue.qsize()
+
+
+class Broadcaster:
+    """SSE フレームを全クライアントに配る（asyncio スレッドからのみ呼ぶこと）。"""
+
+    def __init__(self, queue_maxsize: int = QUEUE_MAXSIZE):
+        self._queue_maxsize = queue_maxsize
+        self._subscribers: dict[int, Subscriber] = {}
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        """クライアントを登録する。"""
+        subscriber = Subscriber(
+            id=next(self._ids), queue=asyncio.Queue(maxsize=self._queue_maxsize)
+        )
+        self._subscribers[subscriber.id] = subscriber
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """クライアントの登録を解除する。"""
+        self._subscribers.pop(subscriber.id, None)
+        if subscriber.dropped:
+            logger.info(
+                "SSE クライアント %d 切断: %d 件配信, %d 件取りこぼし",
+                subscriber.id, subscriber.delivered, subscriber.dropped,
+            )
+
+    def publish(self, frame: bytes, created_at: Optional[float] = None):
+        """エンコード済みフレームを全クライアントのキューに入れる。
+
+        created_at はイベントの発生時刻（time.perf_counter()、省略時は現在）。
+        """
+        published_at = time.perf_counter()
+        if created_at is None:
+            created_at = published_at
+        item = (frame, created_at, published_at)
+        self.published += 1
+        for subscriber in self._subscribers.values():
+            try:
+                subscriber.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                self.dropped += 1
+                continue
+            subscriber.max_lag = max(subscriber.max_lag, subscriber.queue.qsize())
+
+    def stats(self) -> dict:
+        """配信統計を返す。"""
+        return {
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "dropped": self.dropped,
+            "clients": [
+                {
+                    "id": s.id,
+                    "lag": s.lag,
+                    "max_lag": s.max_lag,
+                    "delivered": s.delivered,
+                    "dropped": s.dropped,
+                }
+                for s in self._subscribers.values()
+            ],
+        }
@@ -0,0 +1,116 @@
+"""
+Now Playing カード（SSE で配信するトラックカードの HTML）の生成モジュール。
+
+テンプレートは起動時に 1 回だけ取得し、表示用の値に正規化したメタデータの
+タプルをキーに、描画結果を LRU キャッシュに持つ。ラジオアプリ等で同じ内容の
+カード（再生状態だけが行き来する等）が繰り返し届いても、2 回目以降は描画しない。
+
+受信時刻はイベントごとに変わるためキャッシュキーに含めず、描画済みの HTML に
+後から差し込む。
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from jinja2 import Template
+from markupsafe import escape
+
+from app.services.avrcp_monitor import parse_player_path
+
+# キャッシュするカードの種類数
+CARD_CACHE_SIZE = 256
+
+# 再生状態 → CSS クラス
+_STATUS_CLASSES = {
+    "playing": "status-playing",
+    "paused": "status-paused",
+    "stopped": "status-stopped",
+}
+
+# 描画時に受信時刻の代わりに入れておく文字列（テンプレートのエスケープで変化しない）
+_TIME_PLACEHOLDER = "\x00time\x00"
+
+
+def format_duration(duration_ms) -> str:
+    """ミリ秒を M:SS または H:MM:SS 形式に変換する。"""
+    if not duration_ms or duration_ms <= 0:
+        return "--:--"
+    total_seconds = duration_ms // 1000
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_time(timestamp) -> str:
+    """ISO 形式の受信時刻を HH:MM:SS にする（解釈できなければそのまま返す）。"""
+    # datetime.isoformat() の形式（YYYY-MM-DDTHH:MM:SS[.ffffff]）はパースせずに切り出す
+    if isinstance(timestamp, str) and len(timestamp) >= 19 and timestamp[10] == "T" and timestamp[13] == ":":
+        return timestamp[11:19]
+    try:
+        return datetime.fromisoformat(timestamp).strftime("%H:%M:%S")
+    except (ValueError, TypeError):
+        return timestamp
+
+
+def _display(value) -> str:
+    return str(value) if value is not None else "null"
+
+
+class TrackCardRenderer:
+    """トラックカードの HTML を生成する（イベントループのスレッドから呼ぶ）。"""
+
+    def __init__(self, template: Template, cache_size: int = CARD_CACHE_SIZE):
+        self._template = template
+        self._render_cached = lru_cache(maxsize=cache_size)(self._render)
+
+    def render(self, metadata: dict, session_active: bool) -> str:
+        key = (
+            session_active,
+            metadata.get("title") or None,
+            metadata.get("artist") or None,
+            metadata.get("album") or None,
+            metadata.get("genre") or None,
+            metadata.get("track_number"),
+            metadata.get("number_of_tracks"),
+            metadata.get("duration_ms"),
+            metadata.get("status") or None,
+            metadata.get("player", ""),
+        )
+        html = self._render_cached(*key)
+        return html.replace(_TIME_PLACEHOLDER, str(escape(format_time(metadata.get("timestamp", "")))))
+
+    def cache_info(self):
+        return self._render_cached.cache_info()
+
+    def _render(
+        self,
+        session_active: bool,
+        title: Optional[str],
+        artist: Optional[str],
+        album: Optional[str],
+        genre: Optional[str],
+        track_number,
+        number_of_tracks,
+        duration_ms,
+        status: Optional[str],
+        player: str,
+    ) -> str:
+        adapter, address = parse_player_path(player)
+        return self._template.render({
+            "session_active": session_active,
+            "time_str": _TIME_PLACEHOLDER,
+            "title_display": title or "null",
+            "artist_display": artist or "null",
+            "album_display": album or "null",
+            "genre_display": genre or "null",
+            "track_num_display": _display(track_number),
+            "num_tracks_display": _display(number_of_tracks),
+            "status_display": status or "null",
+            "status_class": _STATUS_CLASSES.get(status or "", ""),
+            "duration_str": format_duration(duration_ms) if duration_ms else "null",
+            "player_display": f"{address} ({adapter})" if address else "",
+        })
@@ -0,0 +1,136 @@
+"""
+セッションファイルの圧縮モジュール。
+
+セッションログは非圧縮の .jsonl のほか、gzip（.jsonl.gz）と zstd（.jsonl.zst）で保存できる。
+ヘッダー行とトラック行は別々の gzip メンバー / zstd フレームとして書くので、
+ヘッダーだけを読むときは先頭のメンバー（数十バイト）を展開するだけで済む。
+連結したメンバー / フレームは通常の gzip / zstd ツールでもそのまま 1 つの JSONL として読める。
+
+gzip は標準ライブラリ、zstd は zstandard パッケージ（任意依存）を使う。
+セッションファイルの拡張子とファイル一覧の取得はこのモジュールに集約する。
+"""
+
+import gzip
+import io
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 任意依存
+    zstandard = None
+
+PLAIN_SUFFIX = ".jsonl"
+
+# 圧縮方式 → 拡張子（.jsonl の後ろに付ける）
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# セッションファイルとして扱う拡張子
+SESSION_SUFFIXES = (PLAIN_SUFFIX,) + tuple(PLAIN_SUFFIX + s for s in CODEC_SUFFIXES.values())
+
+# zstd の圧縮レベル（SD カード上の容量と Pi の CPU のバランス）
+_ZSTD_LEVEL = 6
+_COPY_CHUNK_SIZE = 64 * 1024
+
+# 壊れた・途中で切れた圧縮ファイルを読んだときに起こりうる例外
+READ_ERRORS = (OSError, EOFError, ValueError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def available(codec: str) -> bool:
+    """圧縮方式が使えるか。"""
+    if codec == "gzip":
+        return True
+    if codec == "zstd":
+        return zstandard is not None
+    return False
+
+
+def codec_for(path: Path) -> Optional[str]:
+    """ファイル名から圧縮方式を返す（非圧縮なら None）。"""
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if path.name.endswith(PLAIN_SUFFIX + suffix):
+            return codec
+    return None
+
+
+def is_session_file(filename: str) -> bool:
+    return filename.endswith(SESSION_SUFFIXES)
+
+
+def session_files(data_dir: Path) -> list[Path]:
+    """DATA_DIR のセッションファイル（圧縮済みを含む）をファイル名順に返す。"""
+    return sorted(
+        (path for suffix in SESSION_SUFFIXES for path in data_dir.glob("*" + suffix)),
+        key=lambda path: path.name,
+    )
+
+
+def plain_name(filename: str) -> str:
+    """圧縮の拡張子を取り除いたファイル名（x.jsonl.gz → x.jsonl）を返す。"""
+    for suffix in CODEC_SUFFIXES.values():
+        if filename.endswith(PLAIN_SUFFIX + suffix):
+            return filename[: -len(suffix)]
+    return filename
+
+
+def compressed_name(filename: str, codec: Optional[str]) -> str:
+    """codec で圧縮したときのファイル名を返す（codec が None なら非圧縮の名前）。"""
+    filename = plain_name(filename)
+    if codec is None:
+        return filename
+    return filename + CODEC_SUFFIXES[codec]
+
+
+def open_read(path: Path) -> BinaryIO:
+    """セッションファイルを展開しながら読むバイナリストリームを開く。"""
+    codec = codec_for(path)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+
+@contextmanager
+def member_writer(f: BinaryIO, codec: Optional[str]) -> Iterator[BinaryIO]:
+    """f に 1 つの gzip メンバー / zstd フレームを書き込むストリームを返す。
+
+    ブロックを抜けるとメンバーを閉じる（f は閉じない）。codec が None なら f をそのまま返す。
+    """
+    if codec is None:
+        yield f
+        return
+
+    if codec == "gzip":
+        writer = gzip.GzipFile(fileobj=f, mode="wb", mtime=0)
+    else:
+        writer = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).stream_writer(f, closefd=False)
+    try:
+        yield writer
+    finally:
+        writer.close()
+
+
+def compress_file(src: Path, dst: Path, codec: str):
+    """非圧縮のセッションファイルを圧縮して dst に書き出す（ヘッダー行を別メンバーにする）。
+
+    一時ファイルに書いて fsync してからリネームする。
+    """
+    tmp_path = dst.with_name(f".{dst.name}.tmp")
+    try:
+        with open(src, "rb") as fin, open(tmp_path, "wb") as fout:
+            with member_writer(fout, codec) as writer:
+                writer.write(fin.readline())
+            with member_writer(fout, codec) as writer:
+                while chunk := fin.read(_COPY_CHUNK_SIZE):
+                    writer.write(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp_path, dst)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -0,0 +1,192 @@
+"""
+メタデータ充実度のベクトル演算モジュール（pandas / NumPy）。
+
+トラックの DataFrame から METADATA_FIELDS の「有意な値あり」マスクを列ごとに
+まとめて作り（1 回の読み込みにつき 1 つの真偽値行列）、groupby の sum / mean で
+カウンターや取得率を求める。判定は aggregates.has_value() と同じ
+（None・欠損、空白だけの文字列、数値の 0 は値なし）。
+
+アプリでは大きなセッションファイルのカウンター計算（インデックス再構築時）に、
+分析ノートブックでは読み込みと集計に使う。JSONL は pyarrow があれば
+JSON から直接列に読み込む（1 行ずつの json.loads より速い）。
+pandas は任意依存。無い環境では available() が False を返し、呼び出し側は
+aggregates.py の 1 件ずつの集計を使う。
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Optional, Sequence
+
+from app.services import compression
+from app.services.aggregates import METADATA_FIELDS, TRACKS_KEY, has_value
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pragma: no cover - 任意依存
+    np = None
+    pd = None
+
+logger = logging.getLogger(__name__)
+
+# トラックの DataFrame に付けるヘッダー由来の列
+SESSION_COLUMNS = ["filename", "content_name", "platform_type", "device", "os_version", "bg_playback"]
+
+# 数値として扱える infer_dtype の結果
+_NUMERIC_KINDS = {"integer", "floating", "mixed-integer-float", "boolean", "decimal"}
+
+
+def available() -> bool:
+    """pandas / NumPy が使えるか。"""
+    return pd is not None
+
+
+def _present(column: "pd.Series") -> "np.ndarray":
+    """1 列分の「有意な値あり」マスクを返す。"""
+    if column.dtype == object:
+        kind = pd.api.types.infer_dtype(column, skipna=True)
+        if kind in _NUMERIC_KINDS:
+            column = pd.to_numeric(column, errors="coerce")
+        elif kind not in ("string", "empty"):
+            # 文字列と数値が混ざった列だけは 1 件ずつ判定する（欠損は NaN になっている）
+            return (column.notna() & column.map(has_value)).to_numpy(dtype=bool)
+
+    if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+        values = column.to_numpy(dtype="float64", na_value=np.nan)
+        return ~np.isnan(values) & (values != 0)
+
+    stripped = column.str.strip()
+    return (stripped.notna() & stripped.ne("")).fillna(False).to_numpy(dtype=bool)
+
+
+def presence_frame(tracks: "pd.DataFrame") -> "pd.DataFrame":
+    """METADATA_FIELDS ごとの「有意な値あり」マスク（真偽値の DataFrame）を返す。
+
+    列が無いフィールドはすべて False になる。
+    """
+    matrix = np.zeros((len(tracks), len(METADATA_FIELDS)), dtype=bool)
+    for i, field_name in enumerate(METADATA_FIELDS):
+        if field_name in tracks.columns:
+            matrix[:, i] = _present(tracks[field_name])
+    return pd.DataFrame(matrix, columns=METADATA_FIELDS, index=tracks.index)
+
+
+def _group_keys(tracks: "pd.DataFrame", by: Sequence[str]) -> list:
+    return [tracks[col].fillna("") if col in tracks.columns else pd.Series("", index=tracks.index) for col in by]
+
+
+def field_counts(tracks: "pd.DataFrame", by: Sequence[str] = ()) -> "pd.DataFrame":
+    """フィールドごとの値あり件数（aggregates.py のカウンターと同じ項目）を返す。
+
+    by を指定するとその列ごとに集計する（指定しなければ 1 行）。
+    """
+    presence = presence_frame(tracks).astype("int64")
+    presence.insert(0, TRACKS_KEY, 1)
+    if not by:
+        return presence.sum().to_frame().T
+    return presence.groupby(_group_keys(tracks, by), dropna=False, sort=False).sum()
+
+
+def coverage_table(tracks: "pd.DataFrame", by: Sequence[str]) -> "pd.DataFrame":
+    """by の列ごとのトラック数とフィールドごとの取得率（%、小数第 1 位）を返す。"""
+    presence = presence_frame(tracks)
+    grouped = presence.groupby(_group_keys(tracks, by), dropna=False)
+    table = (grouped.mean() * 100).round(1)
+    table.insert(0, TRACKS_KEY, grouped.size())
+    table.index.names = list(by)
+    return table
+
+
+# トラックの列と型（pyarrow の JSON リーダーに渡す）
+_TRACK_STRING_COLUMNS = ["type", "timestamp", "title", "artist", "album", "genre", "status"]
+_TRACK_INT_COLUMNS = ["seq", "track_number", "number_of_tracks", "duration_ms"]
+
+
+def _read_records(f) -> "pd.DataFrame":
+    """ファイルの現在位置から後ろの JSONL を DataFrame として読み込む。
+
+    pyarrow があれば JSON を直接列に読み込む（型が合わない値があれば ValueError）。
+    無ければ 1 行ずつ json で読む。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pa_json
+    except ImportError:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+    schema = pa.schema(
+        [(name, pa.string()) for name in _TRACK_STRING_COLUMNS]
+        + [(name, pa.int64()) for name in _TRACK_INT_COLUMNS]
+    )
+    options = pa_json.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore")
+    return pa_json.read_json(f, parse_options=options).to_pandas()
+
+
+def _read_session(f) -> Optional[tuple[dict, "pd.DataFrame"]]:
+    """セッションファイルを (ヘッダー, トラックの DataFrame) として読み込む。"""
+    header = json.loads(f.readline() or b"null")
+    if not isinstance(header, dict) or header.get("type") != "session_header":
+        return None
+    if not f.peek(1):
+        return header, pd.DataFrame(columns=["type"])
+    records = _read_records(f)
+    if "type" not in records.columns:
+        return header, pd.DataFrame(columns=["type"])
+    return header, records[records["type"] == "track"]
+
+
+def count_file(filepath: Path) -> Optional[tuple[dict, dict[str, int]]]:
+    """JSONL のセッションファイル（圧縮済みを含む）からヘッダーとフィールドカウンターを作る。
+
+    database._read_session_summary() と同じ結果を返す。ヘッダーが無ければ None、
+    読み込めない行や型の合わない値があれば ValueError（呼び出し側で 1 件ずつの集計に戻す）。
+    """
+    with compression.open_read(filepath) as f:
+        session = _read_session(f)
+    if session is None:
+        return None
+
+    header, tracks = session
+    totals = field_counts(tracks).iloc[0]
+    return header, {key: int(value) for key, value in totals.items()}
+
+
+def load_tracks(data_dir: Path) -> tuple["pd.DataFrame", "pd.DataFrame"]:
+    """DATA_DIR のセッションを読み込み、(セッション, トラック) の DataFrame を返す。
+
+    圧縮済みのセッションファイル（.jsonl.gz / .jsonl.zst）は展開して読む。
+    トラックにはヘッダー由来の列（SESSION_COLUMNS）を付ける。
+    アーカイブ（archive_*.parquet）は pyarrow があれば必要な列だけを読み込む。
+    """
+    from app.services import archive
+
+    sessions = []
+    frames = []
+    for filepath in compression.session_files(data_dir):
+        with compression.open_read(filepath) as f:
+            try:
+                session = _read_session(f)
+            except compression.READ_ERRORS:
+                logger.warning("セッションファイルの読み込みに失敗: %s", filepath.name)
+                continue
+        if session is None:
+            continue
+        header, tracks = session
+        sessions.append({**header, "filename": filepath.name})
+        frames.append(tracks.drop(columns="type").assign(filename=filepath.name))
+
+    archive_paths = sorted(data_dir.glob(archive.ARCHIVE_GLOB))
+    if archive_paths and archive.available():
+        for filepath in archive_paths:
+            sessions += [{**header, "filename": name} for name, header in archive.read_headers(filepath)]
+        columns = ["filename", *METADATA_FIELDS, "status"]
+        frames.append(archive.read_tracks(archive_paths, columns).to_pandas())
+
+    df_sessions = pd.DataFrame(sessions)
+    frames = [frame for frame in frames if not frame.empty]
+    df_tracks = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["filename"])
+    if not df_sessions.empty:
+        meta = df_sessions[[c for c in SESSION_COLUMNS if c in df_sessions.columns]]
+        df_tracks = df_tracks.merge(meta, on="filename", how="left")
+    return df_sessions, df_tracks
@@ -3,19 +3,134 @@
 
 セッションデータを JSONL 形式でファイルに書き出し、
 過去セッション一覧の取得やファイルダウンロードを提供する。
+
+記録中のセッションはジャーナル（journal.py）に追記しておき、
+終了時に save_session() でヘッダーを付けてセッションファイルとして確定する。
+
+古いセッションは archive_sessions() で Parquet アーカイブ（archive.py）にまとめられる。
+アーカイブ内のセッションも get_session_source() で JSONL と同じように読み出せる。
+
+環境変数 BT_COMPRESSION（gzip / zstd）を設定すると、セッションファイルを圧縮して保存する
+（x.jsonl.gz / x.jsonl.zst）。既存の非圧縮ファイルは compress_sessions() で後から圧縮できる。
+圧縮済みのファイルも iter_session_records() 等で透過的に展開して読む。
+
+中央ノードでは、コレクターから受け取ったセッションを ingest_session() で取り込む。
+ファイル名の末尾にコレクター ID を付け（x__<collector>.jsonl）、ヘッダーに送り元を記録する。
+
+環境変数 BT_DATA_DIR でセッションの保存先を変更できる（既定はリポジトリ直下の data/）。
 """
 
+import io
 import json
 import logging
 import os
 import re
-from datetime import datetime
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, Iterator, Optional, Union
+
+from app.services import archive, compression, coverage, loader, metrics
+from app.services.aggregates import TRACKS_KEY, add_track, count_tracks, empty_counts
+from app.services.journal import JOURNAL_DIRNAME, SessionJournal
+from app.services.session_index import SessionFilter, SessionIndex
 
 logger = logging.getLogger(__name__)
 
-DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+DATA_DIR = Path(
+    os.environ.get("BT_DATA_DIR", "") or Path(__file__).resolve().parent.parent.parent / "data"
+).resolve()
+
+# 保存時の圧縮方式（gzip / zstd、未設定なら非圧縮）
+COMPRESSION = os.environ.get("BT_COMPRESSION", "").lower() or None
+
+# この大きさ以上のセッションファイルはカウンターをベクトル演算で数える
+_VECTORIZE_MIN_BYTES = 256 * 1024
+
+# セッションヘッダーのインデックス（DATA_DIR ごとに生成）
+_index: Optional[SessionIndex] = None
+# インデックスと同期済みの DATA_DIR の mtime
+_synced_dir_mtime_ns: Optional[int] = None
+# セッションの保存・削除・再同期のたびに増えるカウンター（集計キャッシュの無効化用）
+_data_generation = 0
+# 再同期を 1 スレッドずつ行うためのロック（storage.py 経由で複数スレッドから呼ばれる）
+_sync_lock = threading.Lock()
+
+
+def _get_index() -> SessionIndex:
+    """現在の DATA_DIR に対応するインデックスを返す。"""
+    global _index, _synced_dir_mtime_ns
+    if _index is None or _index.data_dir != DATA_DIR:
+        _index = SessionIndex(DATA_DIR)
+        _synced_dir_mtime_ns = None
+    return _index
+
+
+def _dir_mtime_ns() -> Optional[int]:
+    try:
+        return DATA_DIR.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def data_version() -> tuple:
+    """セッションデータの版を返す。
+
+    保存・削除・外部変更の再同期で値が変わるので、集計結果のキャッシュキーに使う。
+    """
+    return (str(DATA_DIR), _dir_mtime_ns(), _data_generation)
+
+
+def _bump_generation():
+    global _data_generation
+    _data_generation += 1
+
+
+def sync_index(force: bool = False):
+    """インデックスを実ファイルと突き合わせる。
+
+    DATA_DIR の mtime が前回の同期から変わっていなければ何もしない
+    （SCP 等で外部からファイルが追加・削除された場合のみ再スキャンする）。
+    """
+    global _synced_dir_mtime_ns
+    if not DATA_DIR.exists():
+        return
+
+    with _sync_lock:
+        index = _get_index()
+        dir_mtime = _dir_mtime_ns()
+        if not force and dir_mtime == _synced_dir_mtime_ns:
+            return
+
+        with metrics.INDEX_SYNC_SECONDS.time():
+            updated, removed = index.reconcile(
+                compression.session_files(DATA_DIR), _read_session_summaries
+            )
+            metrics.INDEX_SESSIONS_SCANNED.inc(updated, source="file")
+            archive_paths = sorted(DATA_DIR.glob(archive.ARCHIVE_GLOB))
+            if archive_paths and archive.available():
+                archived_updated, archived_removed = index.reconcile_archives(
+                    archive_paths, archive.read_session_summaries
+                )
+                metrics.INDEX_SESSIONS_SCANNED.inc(archived_updated, source="archive")
+                updated += archived_updated
+                removed += archived_removed
+        if updated or removed:
+            _bump_generation()
+        _synced_dir_mtime_ns = dir_mtime
+
+
+def _mark_dir_synced(dir_mtime_before: Optional[int]):
+    """自プロセスによる書き込みの後、同期済み mtime を進める。
+
+    書き込み前にインデックスが同期済みだった場合だけ進めるので、
+    外部からの変更を取りこぼさない。
+    """
+    global _synced_dir_mtime_ns
+    if _synced_dir_mtime_ns is not None and _synced_dir_mtime_ns == dir_mtime_before:
+        _synced_dir_mtime_ns = _dir_mtime_ns()
 
 
 def _sanitize_filename(name: str) -> str:
@@ -52,64 +167,508 @@ def save_session(
     os_version: str,
     session_start: datetime,
     session_end: datetime,
-    tracks: list[dict],
+    tracks: Union[list[dict], SessionJournal],
     bg_playback: bool = False,
+    extra_header: Optional[dict] = None,
+) -> Path:
+    """セッションデータを JSONL ファイルに保存する。
+
+    COMPRESSION が設定されていれば圧縮して保存し、ファイル名に拡張子（.gz / .zst）を付ける。
+    ヘッダー行は本文と別の gzip メンバー / zstd フレームにする（ヘッダーだけを安く読めるように）。
+    tracks にジャーナルを渡した場合は、ジャーナルの本文をそのままコピーして
+    ヘッダーを付けるだけなので、トラック数によらずメモリ使用量は一定。
+    保存に成功したジャーナルは削除する。
+    extra_header はヘッダーに追加する項目（記録したプレイヤー、復旧フラグ等）。
+
+    一時ファイルに書き出してからリネームし、インデックスの更新と同じ
+    トランザクション内で確定させる。
+    """
+    save_started = time.perf_counter()
+    if isinstance(tracks, SessionJournal):
+        track_count = tracks.track_count
+        counts = tracks.counts
+    else:
+        track_count = len(tracks)
+        counts = count_tracks(tracks)
+
+    # 1行目: セッションヘッダー
+    header = {
+        "type": "session_header",
+        "content_name": content_name,
+        "platform_type": platform_type,
+        "device": device,
+        "os_version": os_version,
+        "bg_playback": bg_playback,
+        "session_start": session_start.isoformat(),
+        "session_end": session_end.isoformat(),
+        "track_count": track_count,
+    }
+    if extra_header:
+        header.update(extra_header)
+
+    # 2行目以降: トラックデータ
+    def write_body(writer: BinaryIO):
+        if isinstance(tracks, SessionJournal):
+            tracks.copy_body_to(writer)
+        else:
+            for track in tracks:
+                writer.write((json.dumps(track, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    filepath = _write_session_file(filename, header, counts, write_body)
+
+    if isinstance(tracks, SessionJournal):
+        tracks.discard()
+
+    metrics.SAVE_SESSION_SECONDS.observe(time.perf_counter() - save_started)
+    metrics.SAVE_SESSION_BYTES.observe(filepath.stat().st_size)
+    logger.info("セッションログを保存: %s (%d トラック)", filepath.name, track_count)
+    return filepath
+
+
+def _write_session_file(
+    filename: str,
+    header: dict,
+    counts: dict[str, int],
+    write_body: Callable[[BinaryIO], None],
+    replaces: tuple[str, ...] = (),
 ) -> Path:
-    """セッションデータを JSONL ファイルに保存する。"""
+    """ヘッダーと本文をセッションファイルに書き出し、インデックスに登録する。
+
+    write_body は本文（トラックの JSONL）を書き込む関数。counts は write_body の
+    実行後に登録するので、write_body の中で数えてもよい。
+    replaces は同じトランザクションで削除する既存のファイル名（圧縮方式が変わった再取り込み等）。
+    """
     DATA_DIR.mkdir(parents=True, exist_ok=True)
+    codec = COMPRESSION
+    if codec is not None and not compression.available(codec):
+        logger.error("圧縮方式 %s が使えないため、非圧縮で保存します", codec)
+        codec = None
+    filename = compression.compressed_name(filename, codec)
     filepath = DATA_DIR / filename
+    tmp_path = DATA_DIR / f".{filename}.tmp"
+    dir_mtime_before = _dir_mtime_ns()
+
+    try:
+        with open(tmp_path, "wb") as f:
+            with compression.member_writer(f, codec) as writer:
+                writer.write((json.dumps(header, ensure_ascii=False) + "\n").encode("utf-8"))
+            with compression.member_writer(f, codec) as writer:
+                write_body(writer)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with _get_index().transaction() as conn:
+            for old_filename in replaces:
+                if old_filename != filename:
+                    SessionIndex.remove(conn, old_filename)
+                    (DATA_DIR / old_filename).unlink(missing_ok=True)
+            SessionIndex.upsert(conn, filename, header, counts, tmp_path.stat())
+            os.replace(tmp_path, filepath)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    _bump_generation()
+    _mark_dir_synced(dir_mtime_before)
+    return filepath
 
-    with open(filepath, "w", encoding="utf-8") as f:
-        # 1行目: セッションヘッダー
+
+# ── 中央ノードでの取り込み ──
+
+
+def ingested_filename(collector: str, source_filename: str) -> str:
+    """コレクターから受け取ったセッションの保存名（x.jsonl → x__<collector>.jsonl）を返す。
+
+    日時で始まる元のファイル名の順序を保つため、コレクター ID は末尾に付ける。
+    """
+    stem = compression.plain_name(source_filename)[: -len(compression.PLAIN_SUFFIX)]
+    return f"{stem}__{_sanitize_filename(collector)}{compression.PLAIN_SUFFIX}"
+
+
+def _ingested_variants(collector: str, source_filename: str) -> list[str]:
+    """取り込み済みのセッションが取りうるファイル名（非圧縮・各圧縮方式）を返す。"""
+    filename = ingested_filename(collector, source_filename)
+    return [filename] + [compression.compressed_name(filename, codec) for codec in compression.CODEC_SUFFIXES]
+
+
+def find_ingested(collector: str, source_filename: str) -> Optional[dict]:
+    """取り込み済みのセッションのヘッダーを返す（未取り込みなら None）。"""
+    if not DATA_DIR.exists():
+        return None
+    sync_index()
+    index = _get_index()
+    for filename in _ingested_variants(collector, source_filename):
+        header = index.get_header(filename)
+        if header is not None:
+            return header
+    return None
+
+
+def ingest_session(collector: str, source_filename: str, upload_path: Path, sha256: str) -> Path:
+    """コレクターから受け取ったセッションファイルを取り込む（中央ノード）。
+
+    upload_path は受信したファイル（コレクター側の圧縮方式のまま）。ヘッダーに
+    collector / source_filename / source_sha256 を加え、このノードの圧縮方式で書き直して
+    インデックスに登録する。同じコレクター・ファイル名のセッションは置き換える。
+
+    Raises:
+        ValueError: 先頭行がセッションヘッダーでない、または JSONL として読めない
+    """
+    records = iter_session_records(upload_path)
+    try:
+        header = next(records, None)
+        if header is None or header.get("type") != "session_header":
+            raise ValueError(f"セッションヘッダーがありません: {source_filename}")
         header = {
-            "type": "session_header",
-            "content_name": content_name,
-            "platform_type": platform_type,
-            "device": device,
-            "os_version": os_version,
-            "bg_playback": bg_playback,
-            "session_start": session_start.isoformat(),
-            "session_end": session_end.isoformat(),
-            "track_count": len(tracks),
+            **header,
+            "collector": collector,
+            "source_filename": compression.plain_name(source_filename),
+            "source_sha256": sha256,
         }
-        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        counts = empty_counts()
 
-        # 2行目以降: トラックデータ
-        for track in tracks:
-            f.write(json.dumps(track, ensure_ascii=False) + "\n")
+        def write_body(writer: BinaryIO):
+            for record in records:
+                if record.get("type") != "track":
+                    continue
+                add_track(counts, record)
+                writer.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
 
-    logger.info("セッションログを保存: %s (%d トラック)", filename, len(tracks))
+        filepath = _write_session_file(
+            ingested_filename(collector, source_filename), header, counts, write_body,
+            replaces=tuple(_ingested_variants(collector, source_filename)),
+        )
+    except compression.READ_ERRORS as e:
+        raise ValueError(f"セッションファイルを読み込めません: {source_filename}") from e
+    finally:
+        records.close()
+
+    logger.info("セッションを取り込み: %s (%s, %d トラック)", filepath.name, collector, counts[TRACKS_KEY])
     return filepath
 
 
-def list_sessions() -> list[dict]:
-    """過去セッション一覧を取得する。"""
+def open_journal(
+    filename: str,
+    content_name: str,
+    platform_type: str,
+    device: str,
+    os_version: str,
+    session_start: datetime,
+    bg_playback: bool = False,
+    player: str = "",
+) -> SessionJournal:
+    """記録を始めるセッションのジャーナルを作成する。"""
+    meta = {
+        "filename": filename,
+        "content_name": content_name,
+        "platform_type": platform_type,
+        "device": device,
+        "os_version": os_version,
+        "bg_playback": bg_playback,
+        "session_start": session_start.isoformat(),
+        "player": player,
+    }
+    return SessionJournal.create(DATA_DIR / JOURNAL_DIRNAME, filename, meta)
+
+
+def recover_journals() -> list[Path]:
+    """前回のプロセスが残したジャーナルをセッションファイルとして確定する。
+
+    終了時刻は最後のトラックの時刻（トラックが無ければ開始時刻）とし、
+    ヘッダーに "recovered": true を付ける。
+    """
+    recovered = []
+    for journal in SessionJournal.recover_all(DATA_DIR / JOURNAL_DIRNAME):
+        meta = journal.meta
+        try:
+            session_start = datetime.fromisoformat(meta["session_start"])
+            try:
+                session_end = datetime.fromisoformat(journal.last_timestamp or "")
+            except ValueError:
+                session_end = session_start
+
+            extra_header = {"recovered": True}
+            if meta.get("player"):
+                extra_header["player"] = meta["player"]
+
+            filepath = save_session(
+                filename=meta.get("filename", journal.filename),
+                content_name=meta.get("content_name", ""),
+                platform_type=meta.get("platform_type", ""),
+                device=meta.get("device", ""),
+                os_version=meta.get("os_version", ""),
+                bg_playback=meta.get("bg_playback", False),
+                session_start=session_start,
+                session_end=session_end,
+                tracks=journal,
+                extra_header=extra_header,
+            )
+        except (KeyError, ValueError, OSError):
+            logger.exception("ジャーナルの復旧に失敗: %s", journal.filename)
+            continue
+
+        logger.warning("中断されたセッションを復旧: %s (%d トラック)", filepath.name, journal.track_count)
+        recovered.append(filepath)
+    return recovered
+
+
+def archive_sessions(older_than_days: float) -> Optional[Path]:
+    """終了から older_than_days 日以上たった JSONL セッションを 1 つのアーカイブにまとめる。
+
+    アーカイブを書き出してインデックスの格納場所を切り替えた後で JSONL を削除する。
+    pyarrow が無い環境や対象が無い場合は何もせず None を返す。
+    """
+    if not archive.available():
+        logger.error("pyarrow が見つからないため、セッションをアーカイブできません")
+        return None
     if not DATA_DIR.exists():
+        return None
+
+    sync_index()
+    index = _get_index()
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    candidates = index.list_archivable(cutoff)
+    if not candidates:
+        return None
+
+    stem = f"{archive.ARCHIVE_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    archive_path = DATA_DIR / f"{stem}{archive.ARCHIVE_SUFFIX}"
+    n = 2
+    while archive_path.exists():
+        archive_path = DATA_DIR / f"{stem}_{n}{archive.ARCHIVE_SUFFIX}"
+        n += 1
+
+    def sessions():
+        for candidate in candidates:
+            records = iter_session_records(DATA_DIR / candidate["filename"])
+            tracks = (r for r in records if r.get("type") == "track")
+            yield candidate["filename"], candidate["header"], tracks
+
+    dir_mtime_before = _dir_mtime_ns()
+    archive.write_archive(archive_path, sessions())
+    filenames = [c["filename"] for c in candidates]
+    with index.transaction() as conn:
+        SessionIndex.move_to_archive(conn, filenames, archive_path.name, archive_path.stat())
+    for filename in filenames:
+        (DATA_DIR / filename).unlink(missing_ok=True)
+
+    _bump_generation()
+    _mark_dir_synced(dir_mtime_before)
+    logger.info("%d セッションをアーカイブ: %s", len(filenames), archive_path.name)
+    return archive_path
+
+
+def compress_sessions(older_than_days: float, codec: str) -> list[Path]:
+    """終了から older_than_days 日以上たった非圧縮のセッションファイルを codec で圧縮する。
+
+    圧縮したファイルを書き出してインデックスのファイル名を切り替えた後で、元のファイルを削除する。
+
+    Returns:
+        圧縮したセッションファイルのパス
+    """
+    if not compression.available(codec):
+        logger.error("圧縮方式 %s が使えないため、セッションを圧縮できません", codec)
         return []
+    if not DATA_DIR.exists():
+        return []
+
+    sync_index()
+    index = _get_index()
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    candidates = [
+        c["filename"] for c in index.list_archivable(cutoff)
+        if compression.codec_for(Path(c["filename"])) is None
+    ]
+
+    compressed = []
+    for filename in candidates:
+        src = DATA_DIR / filename
+        dst = DATA_DIR / compression.compressed_name(filename, codec)
+        dir_mtime_before = _dir_mtime_ns()
+        try:
+            compression.compress_file(src, dst, codec)
+            with index.transaction() as conn:
+                SessionIndex.remove(conn, dst.name)
+                SessionIndex.rename(conn, filename, dst.name, dst.stat())
+            src.unlink()
+        except OSError:
+            logger.exception("セッションファイルの圧縮に失敗: %s", filename)
+            continue
+        _bump_generation()
+        _mark_dir_synced(dir_mtime_before)
+        compressed.append(dst)
+
+    if compressed:
+        logger.info("%d セッションを圧縮 (%s)", len(compressed), codec)
+    return compressed
+
+
+def list_sessions(session_filter: Optional[SessionFilter] = None) -> list[dict]:
+    """過去セッション一覧を取得する（インデックスから読む）。session_filter で絞り込める。"""
+    if not DATA_DIR.exists():
+        return []
+
+    sync_index()
+    return _get_index().list_headers(session_filter)
+
+
+def query_sessions(
+    session_filter: SessionFilter, limit: int, offset: int = 0
+) -> tuple[list[dict], int]:
+    """条件に合うセッションのうち 1 ページ分のヘッダーと、条件に合う件数を返す。"""
+    if not DATA_DIR.exists():
+        return [], 0
+
+    sync_index()
+    index = _get_index()
+    return index.list_headers(session_filter, limit, offset), index.count(session_filter)
+
+
+def list_pending_uploads(limit: int, offset: int = 0) -> tuple[list[str], int]:
+    """中央ノードに未送信のセッションのうち 1 ページ分のファイル名（古い順）と、未送信の件数を返す。"""
+    if not DATA_DIR.exists():
+        return [], 0
+
+    sync_index()
+    index = _get_index()
+    return index.list_not_uploaded(limit, offset), index.count_not_uploaded()
 
-    sessions = []
-    for filepath in sorted(DATA_DIR.glob("*.jsonl"), reverse=True):
-        session_info = _read_session_header(filepath)
-        if session_info:
-            session_info["filename"] = filepath.name
-            sessions.append(session_info)
 
-    return sessions
+def mark_uploaded(entries: dict[str, str], replace: bool = False):
+    """中央ノードに送り終えたセッション（圧縮前のファイル名 → SHA-256）をインデックスに記録する。
 
+    replace=True なら記録済みの内容を entries で置き換える（送信済みリストとそろえる）。
+    """
+    if entries or replace:
+        _get_index().mark_uploaded(entries, replace)
 
-def _read_session_header(filepath: Path) -> Optional[dict]:
-    """JSONL ファイルの先頭行（セッションヘッダー）を読み取る。"""
+
+def aggregate_sessions(group_by: tuple[str, ...] = ()) -> list[dict]:
+    """インデックスのカウンターを group_by の列ごとに合計して返す。"""
+    if not DATA_DIR.exists():
+        return []
+
+    sync_index()
+    return _get_index().aggregate(group_by)
+
+
+def iter_session_records(filepath: Path) -> Iterator[dict]:
+    """セッションファイルのレコード（ヘッダー・トラック）を 1 行ずつ返す（圧縮済みは展開する）。"""
+    with io.TextIOWrapper(compression.open_read(filepath), encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)
+
+
+def _read_session_summaries(filepaths: list[Path]) -> list[Optional[tuple[dict, dict[str, int]]]]:
+    """複数のセッションファイルを読む（ファイル数が多ければプロセスプールで並列に読む）。"""
+    return loader.read_all(filepaths, _read_session_summary)
+
+
+def _read_session_summary(filepath: Path) -> Optional[tuple[dict, dict[str, int]]]:
+    """JSONL ファイルを 1 回読み、ヘッダーとフィールドカウンターを返す。
+
+    大きなファイルは pandas が使えればベクトル演算（coverage.py）で数える。
+    """
+    if coverage.available():
+        try:
+            if filepath.stat().st_size >= _VECTORIZE_MIN_BYTES:
+                return coverage.count_file(filepath)
+        except compression.READ_ERRORS:
+            pass
+
+    header = None
+    counts = empty_counts()
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            first_line = f.readline().strip()
-            if not first_line:
-                return None
-            data = json.loads(first_line)
-            if data.get("type") == "session_header":
-                return data
-    except (json.JSONDecodeError, OSError):
-        logger.warning("セッションヘッダーの読み取りに失敗: %s", filepath.name)
-    return None
+        for record in iter_session_records(filepath):
+            if record.get("type") == "session_header":
+                header = record
+            elif record.get("type") == "track":
+                add_track(counts, record)
+    except compression.READ_ERRORS:
+        logger.warning("セッションファイルの読み込みに失敗: %s", filepath.name)
+        return None
+
+    if header is None:
+        return None
+    return header, counts
+
+
+@dataclass
+class SessionSource:
+    """セッションの格納場所（JSONL ファイル（圧縮済みを含む）、またはアーカイブ内の行グループ）。"""
+
+    filename: str
+    path: Path
+    row_group: Optional[int] = None
+
+    @property
+    def archived(self) -> bool:
+        return self.row_group is not None
+
+    @property
+    def compressed(self) -> bool:
+        return self.row_group is None and compression.codec_for(self.path) is not None
+
+    @property
+    def plain_filename(self) -> str:
+        """圧縮の拡張子を除いたファイル名（ダウンロード時の名前）。"""
+        return compression.plain_name(self.filename)
+
+    def records(self) -> Iterator[dict]:
+        """ヘッダー・トラックのレコードを 1 件ずつ返す。"""
+        if self.row_group is None:
+            return iter_session_records(self.path)
+        return archive.iter_session_records(self.path, self.row_group)
+
+    def iter_jsonl(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """JSONL のバイト列をチャンク単位で返す（圧縮済み・アーカイブ内のセッションはその場で展開する）。"""
+        if self.row_group is None:
+            with compression.open_read(self.path) as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+            return
+
+        lines = []
+        size = 0
+        for record in self.records():
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield b"".join(lines)
+                lines.clear()
+                size = 0
+        if lines:
+            yield b"".join(lines)
+
+
+def get_session_source(filename: str) -> Optional[SessionSource]:
+    """ファイル名からセッションの格納場所を取得する（アーカイブ内のセッションも含む）。
+
+    圧縮前のファイル名（x.jsonl）で圧縮済みのセッション（x.jsonl.gz 等）も見つかる。
+    """
+    filepath = get_session_filepath(filename)
+    if filepath is not None:
+        return SessionSource(filename, filepath)
+    if "/" in filename or "\\" in filename or ".." in filename or not DATA_DIR.exists():
+        return None
+    for codec in compression.CODEC_SUFFIXES:
+        compressed_name = compression.compressed_name(filename, codec)
+        filepath = get_session_filepath(compressed_name)
+        if filepath is not None:
+            return SessionSource(compressed_name, filepath)
+
+    sync_index()
+    location = _get_index().locate(filename)
+    if location is None or not location[0]:
+        return None
+    archive_path = DATA_DIR / location[0]
+    if not archive_path.exists() or not archive.available():
+        return None
+    return SessionSource(filename, archive_path, location[1])
 
 
 def get_session_filepath(filename: str) -> Optional[Path]:
@@ -119,17 +678,34 @@ def get_session_filepath(filename: str) -> Optional[Path]:
         return None
 
     filepath = DATA_DIR / filename
-    if filepath.exists() and filepath.suffix == ".jsonl":
+    if filepath.exists() and compression.is_session_file(filename):
         return filepath
     return None
 
 
 def delete_session(filename: str) -> bool:
-    """セッションログファイルを削除する。"""
-    filepath = get_session_filepath(filename)
-    if filepath is None:
+    """セッションログファイルを削除する。
+
+    アーカイブ内のセッションは、その行グループを除いてアーカイブを書き直す。
+    """
+    source = get_session_source(filename)
+    if source is None:
         return False
 
-    filepath.unlink()
-    logger.info("セッションログを削除: %s", filename)
+    dir_mtime_before = _dir_mtime_ns()
+    if source.archived:
+        kept = archive.remove_session(source.path, source.row_group)
+        with _get_index().transaction() as conn:
+            SessionIndex.remove_from_archive(
+                conn, source.filename, source.path.name, source.row_group,
+                source.path.stat() if kept else None,
+            )
+    else:
+        with _get_index().transaction() as conn:
+            SessionIndex.remove(conn, source.filename)
+            source.path.unlink()
+
+    _bump_generation()
+    _mark_dir_synced(dir_mtime_before)
+    logger.info("セッションログを削除: %s", source.filename)
     return True
@@ -0,0 +1,124 @@
+"""
+セッションログのエクスポートモジュール。
+
+セッションログ（JSONL またはアーカイブ内のセッション）を CSV / ZIP に変換する
+ジェネレーターを提供する。
+1 行ずつ変換して一定サイズごとにバイト列を返すため、ファイル全体を
+メモリに載せずに StreamingResponse でそのまま返せる。
+同期ジェネレーターなので、Starlette がスレッドプールで回してくれる
+（イベントループをブロックしない）。
+"""
+
+import csv
+import io
+import zipfile
+from typing import Iterable, Iterator
+
+from app.services import compression
+from app.services.database import SessionSource
+
+# 1 セッション CSV の列
+CSV_HEADERS = [
+    "timestamp", "title", "artist", "album", "genre",
+    "track_number", "number_of_tracks", "duration_ms", "status",
+]
+
+# 複数セッションをまとめた CSV の先頭に付ける列（ヘッダー由来）
+SESSION_COLUMNS = [
+    "filename", "content_name", "platform_type", "device", "os_version", "bg_playback",
+]
+
+# この大きさまで溜まったら 1 チャンクとして返す
+CHUNK_SIZE = 64 * 1024
+
+
+def csv_filename_for(filename: str) -> str:
+    """セッションログのファイル名から CSV のファイル名を作る。"""
+    return compression.plain_name(filename).replace(".jsonl", ".csv")
+
+
+def _iter_csv_chunks(
+    sources: Iterable[SessionSource],
+    fieldnames: list[str],
+    with_session_columns: bool,
+) -> Iterator[bytes]:
+    """セッションファイル群のトラックを CSV に変換してチャンク単位で返す。"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+
+    for source in sources:
+        session_values = {"filename": source.plain_filename}
+        for record in source.records():
+            record_type = record.get("type")
+            if record_type == "session_header":
+                if with_session_columns:
+                    for col in SESSION_COLUMNS[1:]:
+                        session_values[col] = record.get(col, "")
+                continue
+            if record_type != "track":
+                continue
+
+            if with_session_columns:
+                record = {**record, **session_values}
+            writer.writerow(record)
+
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_session_csv(source: SessionSource) -> Iterator[bytes]:
+    """1 セッションを CSV に変換して返す。"""
+    return _iter_csv_chunks([source], CSV_HEADERS, with_session_columns=False)
+
+
+def iter_sessions_csv(sources: list[SessionSource]) -> Iterator[bytes]:
+    """複数セッションを 1 つの CSV にまとめて返す（セッション情報の列付き）。"""
+    return _iter_csv_chunks(sources, SESSION_COLUMNS + CSV_HEADERS, with_session_columns=True)
+
+
+class _ChunkSink:
+    """ZipFile の書き込み先。書かれたバイト列を溜めておき、drain() で取り出す。
+
+    seek できないストリームとして扱われるので、ZipFile はデータディスクリプタ付きで
+    先頭から順に書き出す。
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_sessions_zip(sources: list[SessionSource]) -> Iterator[bytes]:
+    """複数セッションをセッションごとの CSV にして ZIP で返す。"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for source in sources:
+            with zf.open(csv_filename_for(source.filename), "w") as entry:
+                for chunk in iter_session_csv(source):
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+
+    # セントラルディレクトリ
+    yield sink.drain()
@@ -0,0 +1,248 @@
+"""
+中央ノードでのセッション受信モジュール（BT_ROLE=central）。
+
+各コレクター（uploader.py）からセッションファイルを分割して受け取り、
+そろったら database.ingest_session() で DATA_DIR とインデックスに取り込む。
+取り込んだセッションは通常のセッションと同じく一覧・ダッシュボードの集計に含まれる。
+
+コレクターはセッションを展開済みの JSONL（圧縮・アーカイブの有無によらない同じバイト列）で送る。
+SHA-256 もその JSONL に対して計算する。
+
+受信の手順:
+1. plan_batch()  : コレクターが送りたいセッション（ファイル名・サイズ・SHA-256）の一覧を受け取り、
+                   取り込み済みなら done、未完了なら upload_id と受信済みのバイト数を返す
+2. write_chunk() : upload_id のファイルに offset から続きのバイト列を追記する。
+                   サイズに達したら SHA-256 を照合して取り込む
+
+最後のバイト列を受け取った後、取り込む前に中央ノードが落ちた（または接続が切れた）場合は、
+受信済みのファイルがサイズに達したまま残る。plan_batch() はそのファイルをその場で照合して
+取り込み（一致しなければ削除して最初から受け直し）、コレクターには結果だけを返す。
+
+同じセッション（コレクター・ファイル名・SHA-256 が同じ）は何度送られても 1 回だけ取り込む。
+受信途中のファイルは DATA_DIR/.uploads/ に残るので、接続が切れても続きから再開できる。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from app.services import compression, database
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIRNAME = ".uploads"
+
+# 1 回のリクエストで受け付ける最大のバイト数・セッション数
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+MAX_BATCH_SESSIONS = 100
+
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+_UPLOAD_ID_RE = re.compile(r"[0-9a-f]{40}")
+
+# upload_id → [追記を 1 リクエストずつ行うためのロック, 使用中のリクエスト数]
+# （使用中のリクエストが無くなったら取り除く）
+_upload_locks: dict[str, list] = {}
+_upload_locks_lock = threading.Lock()
+
+
+class IngestError(Exception):
+    """受信リクエストのエラー（status_code は HTTP のステータス）。
+
+    offset は受信済みのバイト数（コレクターが送り直す位置。分かる場合のみ）。
+    """
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def _upload_dir() -> Path:
+    return database.DATA_DIR / UPLOAD_DIRNAME
+
+
+def _upload_id(collector: str, filename: str, sha256: str) -> str:
+    key = f"{collector}\0{filename}\0{sha256}".encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:40]
+
+
+def _part_path(upload_id: str) -> Path:
+    return _upload_dir() / f"{upload_id}.part"
+
+
+def _state_path(upload_id: str) -> Path:
+    return _upload_dir() / f"{upload_id}.json"
+
+
+@contextmanager
+def _locked(upload_id: str):
+    """upload_id のロックを取る。成功・失敗によらず、使い終えたロックは取り除く。"""
+    with _upload_locks_lock:
+        entry = _upload_locks.setdefault(upload_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _upload_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _upload_locks.pop(upload_id, None)
+
+
+def _received_bytes(upload_id: str) -> int:
+    try:
+        return _part_path(upload_id).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _discard(upload_id: str):
+    for path in (_part_path(upload_id), _state_path(upload_id)):
+        path.unlink(missing_ok=True)
+
+
+def _validate_session(entry: dict) -> tuple[str, int, str]:
+    filename = entry.get("filename")
+    size = entry.get("size")
+    sha256 = entry.get("sha256")
+    if (
+        not isinstance(filename, str)
+        or "/" in filename or "\\" in filename or ".." in filename
+        or not compression.is_session_file(filename)
+    ):
+        raise IngestError(400, f"セッションファイル名が不正です: {filename!r}")
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise IngestError(400, f"サイズが不正です: {filename}")
+    if not isinstance(sha256, str) or not _SHA256_RE.fullmatch(sha256):
+        raise IngestError(400, f"SHA-256 が不正です: {filename}")
+    return compression.plain_name(filename), size, sha256
+
+
+def plan_batch(collector: str, sessions: list[dict]) -> list[dict]:
+    """コレクターが送りたいセッションごとに取り込み状況を返す。
+
+    Returns:
+        [{"filename": ..., "status": "done"}
+         または {"filename": ..., "status": "pending", "upload_id": ..., "offset": 受信済みバイト数}, ...]
+    """
+    if not isinstance(collector, str) or not collector or database._sanitize_filename(collector) != collector:
+        raise IngestError(400, f"コレクター ID が不正です: {collector!r}")
+    if not isinstance(sessions, list) or len(sessions) > MAX_BATCH_SESSIONS:
+        raise IngestError(400, f"セッションは 1 回に {MAX_BATCH_SESSIONS} 件までです")
+
+    _upload_dir().mkdir(parents=True, exist_ok=True)
+    results = []
+    for entry in sessions:
+        if not isinstance(entry, dict):
+            raise IngestError(400, "セッションの指定が不正です")
+        filename, size, sha256 = _validate_session(entry)
+
+        header = database.find_ingested(collector, filename)
+        if header is not None and header.get("source_sha256") == sha256:
+            results.append({"filename": filename, "status": "done"})
+            continue
+
+        upload_id = _upload_id(collector, filename, sha256)
+        with _locked(upload_id):
+            state_path = _state_path(upload_id)
+            if state_path.exists():
+                state = json.loads(state_path.read_text(encoding="utf-8"))
+            else:
+                state = _write_state(upload_id, collector, filename, size, sha256)
+            offset = _received_bytes(upload_id)
+            if offset >= state["size"]:
+                # 全バイトを受信済みで、まだ取り込んでいない（取り込みの前に中断された）
+                try:
+                    _finalize(upload_id, state)
+                except IngestError:
+                    _write_state(upload_id, collector, filename, size, sha256)
+                    offset = 0
+                else:
+                    results.append({"filename": filename, "status": "done"})
+                    continue
+        results.append({
+            "filename": filename,
+            "status": "pending",
+            "upload_id": upload_id,
+            "offset": offset,
+        })
+    return results
+
+
+def write_chunk(upload_id: str, offset: int, data: bytes) -> dict:
+    """受信途中のファイルに offset から data を追記する。
+
+    offset が受信済みのバイト数と違えば 409（IngestError.offset に受信済みのバイト数）。
+    サイズに達したら SHA-256 を照合して取り込み、受信途中のファイルを削除する。
+
+    Returns:
+        {"status": "pending" | "done", "offset": 受信済みのバイト数}
+    """
+    if not _UPLOAD_ID_RE.fullmatch(upload_id):
+        raise IngestError(404, "アップロードが見つかりません")
+
+    with _locked(upload_id):
+        try:
+            state = json.loads(_state_path(upload_id).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise IngestError(404, "アップロードが見つかりません") from None
+
+        received = _received_bytes(upload_id)
+        if offset != received:
+            raise IngestError(409, "受信済みのバイト数と offset が一致しません", offset=received)
+        if received + len(data) > state["size"]:
+            raise IngestError(400, "申告されたサイズを超えています", offset=received)
+
+        part_path = _part_path(upload_id)
+        if data:
+            with open(part_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        received += len(data)
+        if received < state["size"]:
+            return {"status": "pending", "offset": received}
+
+        _finalize(upload_id, state)
+
+    return {"status": "done", "offset": received}
+
+
+def _write_state(upload_id: str, collector: str, filename: str, size: int, sha256: str) -> dict:
+    state = {"collector": collector, "filename": filename, "size": size, "sha256": sha256}
+    state_path = _state_path(upload_id)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, state_path)
+    return state
+
+
+def _finalize(upload_id: str, state: dict):
+    """受信し終えたファイルの SHA-256 を照合して取り込み、受信途中のファイルを削除する（ロック内で呼ぶ）。
+
+    照合・取り込みに失敗した場合も受信途中のファイルは削除し、422 の IngestError を送出する。
+    """
+    part_path = _part_path(upload_id)
+    digest = hashlib.sha256()
+    with open(part_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    if digest.hexdigest() != state["sha256"]:
+        _discard(upload_id)
+        logger.warning("受信したセッションの SHA-256 が一致しません: %s (%s)", state["filename"], state["collector"])
+        raise IngestError(422, "SHA-256 が一致しません。最初から送り直してください", offset=0)
+
+    try:
+        database.ingest_session(state["collector"], state["filename"], part_path, state["sha256"])
+    except ValueError as e:
+        logger.warning("受信したセッションを取り込めません: %s", e)
+        raise IngestError(422, str(e), offset=0) from None
+    finally:
+        _discard(upload_id)
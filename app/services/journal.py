@@ -0,0 +1,204 @@
+"""
+アクティブセッションの追記専用ジャーナルモジュール。
+
+記録中のトラックをメモリに溜めず、1 件ずつジャーナルファイルに追記する。
+fsync は一定件数・一定時間ごとにまとめて行い、SD カードへの書き込み回数を抑える。
+追記はイベントループから呼ばれるので fsync はせず、同期が必要になったことだけを
+sync_due で示す。fsync は main._journal_sync_loop() が別スレッドで行う。
+プロセスが落ちてもジャーナルは残るので、次回起動時にセッションファイルとして確定できる。
+
+ジャーナルは DATA_DIR/.journal/ に以下の 2 ファイルで保存する。
+- <filename>            : トラックレコードの JSONL（セッションファイルの 2 行目以降と同じ）
+- <filename>.meta.json  : セッション開始時の情報（ヘッダーの元）
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from app.services.aggregates import add_track, empty_counts
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIRNAME = ".journal"
+_META_SUFFIX = ".meta.json"
+
+# この件数たまったら fsync する
+FSYNC_EVERY = 32
+# 未同期のレコードがこの秒数より古くなったら fsync する
+FSYNC_INTERVAL = 1.0
+
+# 本文コピー時の読み込みサイズ
+_COPY_CHUNK_SIZE = 64 * 1024
+
+
+class SessionJournal:
+    """1 セッション分の追記専用ジャーナル。"""
+
+    def __init__(self, body_path: Path, meta: dict):
+        self.body_path = body_path
+        self.meta_path = body_path.with_name(body_path.name + _META_SUFFIX)
+        self.meta = meta
+        self.track_count = 0
+        self.counts = empty_counts()
+        self.last_timestamp: Optional[str] = None
+        self._file: Optional[BinaryIO] = None
+        self._pending = 0
+        self._oldest_pending = 0.0
+        # _file と _pending を保護する（追記はイベントループ、fsync・クローズは別スレッドから呼ばれる）
+        self._lock = threading.Lock()
+
+    @property
+    def filename(self) -> str:
+        return self.body_path.name
+
+    # ── 作成・復旧 ──
+
+    @classmethod
+    def create(cls, journal_dir: Path, filename: str, meta: dict) -> "SessionJournal":
+        """新しいジャーナルを作成する。"""
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        journal = cls(journal_dir / filename, meta)
+
+        tmp_path = journal.meta_path.with_name(journal.meta_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, journal.meta_path)
+
+        journal._file = open(journal.body_path, "ab")
+        return journal
+
+    @classmethod
+    def recover_all(cls, journal_dir: Path) -> list["SessionJournal"]:
+        """前回のプロセスが残したジャーナルを読み込む。
+
+        末尾の書きかけの行は切り捨てる。
+        """
+        if not journal_dir.exists():
+            return []
+
+        journals = []
+        for meta_path in sorted(journal_dir.glob("*" + _META_SUFFIX)):
+            body_path = meta_path.with_name(meta_path.name[: -len(_META_SUFFIX)])
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                journal = cls(body_path, meta)
+                journal._scan_body()
+            except (json.JSONDecodeError, OSError):
+                logger.warning("ジャーナルの読み込みに失敗: %s", meta_path.name)
+                continue
+            journals.append(journal)
+        return journals
+
+    def _scan_body(self):
+        """本文を走査してカウンターを復元し、壊れた末尾を切り捨てる。"""
+        if not self.body_path.exists():
+            self.body_path.touch()
+            return
+
+        good_offset = 0
+        with open(self.body_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._count(record)
+                good_offset += len(line)
+
+        if good_offset != self.body_path.stat().st_size:
+            logger.warning("ジャーナル末尾の壊れた行を切り捨て: %s", self.filename)
+            os.truncate(self.body_path, good_offset)
+
+    # ── 追記 ──
+
+    def _count(self, record: dict):
+        self.track_count += 1
+        add_track(self.counts, record)
+        self.last_timestamp = record.get("timestamp") or self.last_timestamp
+
+    def append(self, record: dict):
+        """トラックレコードを追記する（fsync はしない。件数がたまると sync_due が真になる）。"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"ジャーナルは閉じられています: {self.filename}")
+            self._file.write(line)
+            if self._pending == 0:
+                self._oldest_pending = time.monotonic()
+            self._pending += 1
+        self._count(record)
+
+    @property
+    def sync_due(self) -> bool:
+        """未同期のレコードが FSYNC_EVERY 件以上あるか、FSYNC_INTERVAL より古いか。"""
+        pending = self._pending
+        return pending >= FSYNC_EVERY or (
+            pending > 0 and time.monotonic() - self._oldest_pending >= FSYNC_INTERVAL
+        )
+
+    def sync(self):
+        """バッファを書き出して fsync する。
+
+        fsync の間はロックを持たない（その間もイベントループからの追記を止めない）。
+        """
+        with self._lock:
+            if self._file is None or self._pending == 0:
+                return
+            self._file.flush()
+            # クローズされても fsync できるように、ファイル記述子を複製しておく
+            fd = os.dup(self._file.fileno())
+            synced = self._pending
+            self._pending = 0
+        try:
+            os.fsync(fd)
+        except OSError:
+            with self._lock:
+                if self._pending == 0:
+                    self._oldest_pending = time.monotonic()
+                self._pending += synced
+            raise
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """ジャーナルを閉じる（ファイルは残す）。"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            if self._pending:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+            self._file.close()
+            self._file = None
+
+    # ── 確定 ──
+
+    def copy_body_to(self, f: BinaryIO):
+        """本文（トラックレコード）を f にコピーする。"""
+        self.sync()
+        with open(self.body_path, "rb") as src:
+            while True:
+                chunk = src.read(_COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+    def discard(self):
+        """ジャーナルを閉じてファイルを削除する。"""
+        self.close()
+        for path in (self.body_path, self.meta_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,69 @@
+"""
+メタデータイベントの区間ごとのレイテンシ記録モジュール。
+
+D-Bus シグナルの受信からブラウザへの SSE 送出までを以下の区間に分けて計る。
+時刻はすべて time.perf_counter() の値。
+
+- signal   : シグナル受信 → コールバック呼び出し（D-Bus 型の変換・重複判定）
+- dispatch : コールバック → イベントループでの処理開始（スレッド間の受け渡し）
+- record   : 処理開始 → 記録中セッションのジャーナルへの追記完了
+- render   : Now Playing カードの生成
+- queue    : SSE キューへの投入 → クライアントへの送出（クライアントごと）
+- total    : シグナル受信 → クライアントへの送出（クライアントごと）
+
+区間ごとに直近 N 件をリングバッファに持ち、/debug/latency でパーセンタイルを返す。
+スレッド間の受け渡しやカード生成の劣化を見つけるためのもので、永続化はしない。
+"""
+
+import threading
+from collections import deque
+
+STAGES = ("signal", "dispatch", "record", "render", "queue", "total")
+
+# 区間ごとに保持するサンプル数
+DEFAULT_WINDOW = 1024
+
+# 集計するパーセンタイル
+PERCENTILES = (50, 90, 99)
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    """nearest-rank 法のパーセンタイル。"""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class LatencyTracer:
+    """区間ごとの所要時間（秒）のリングバッファ。
+
+    D-Bus のスレッドとイベントループの両方から記録されるため、ロックで保護する。
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            for samples in self._samples.values():
+                samples.clear()
+
+    def summary(self) -> dict:
+        """区間ごとの件数・パーセンタイル・最大値（ミリ秒）を返す。"""
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+
+        stages = {}
+        for stage, values in snapshot.items():
+            entry = {"count": len(values)}
+            if values:
+                for p in PERCENTILES:
+                    entry[f"p{p}_ms"] = round(_percentile(values, p) * 1000, 3)
+                entry["max_ms"] = round(values[-1] * 1000, 3)
+            stages[stage] = entry
+        return {"window": self.window, "stages": stages}
@@ -0,0 +1,87 @@
+"""
+セッションファイルの並列読み込みモジュール。
+
+インデックスの再構築で多数のセッションファイルを読み直すとき、ファイル一覧を
+シャードに分けてプロセスプールで並列に読む。各ワーカーはトラックを返さず、
+セッションごとのヘッダーとカウンター（小さな dict）だけを返す。
+
+ワーカー数は環境変数 BT_LOADER_WORKERS（既定は CPU 数、1 で並列化しない）で変更できる。
+合計サイズが小さいときはプロセス起動のほうが高くつくため、直列に読む。
+
+ワーカーは forkserver から起動する。アプリのプロセスはスレッド（D-Bus・ジャーナル同期等）を
+持つため直接 fork せず、モジュールを読み込み済みのサーバープロセスから fork する
+（ワーカーごとに pandas 等を import し直さずに済む）。
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# 読み込むファイルの合計がこれより小さければ直列に読む
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+# ワーカーあたりのシャード数（処理時間のばらつきを均す）
+_SHARDS_PER_WORKER = 4
+
+T = TypeVar("T")
+
+
+def worker_count() -> int:
+    """並列読み込みのワーカー数。"""
+    configured = os.environ.get("BT_LOADER_WORKERS", "")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def _total_size(paths: list[Path]) -> int:
+    total = 0
+    for path in paths:
+        try:
+            total += path.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+def _mp_context():
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["app.services.database"])
+    return context
+
+
+def _read_shard(reader: Callable[[Path], T], paths: list[Path]) -> list[T]:
+    return [reader(path) for path in paths]
+
+
+def read_all(
+    paths: list[Path],
+    reader: Callable[[Path], T],
+    workers: Optional[int] = None,
+) -> list[T]:
+    """paths の各ファイルを reader で読み、結果を paths と同じ順に返す。
+
+    reader はプロセスをまたいで渡すため、モジュールのトップレベル関数であること。
+    """
+    if workers is None:
+        workers = worker_count()
+    workers = min(workers, len(paths))
+    if workers <= 1 or _total_size(paths) < PARALLEL_MIN_BYTES:
+        return _read_shard(reader, paths)
+
+    shard_size = math.ceil(len(paths) / (workers * _SHARDS_PER_WORKER))
+    shards = [paths[i:i + shard_size] for i in range(0, len(paths), shard_size)]
+    logger.info("セッションファイルを並列に読み込み: %d ファイル, %d プロセス", len(paths), workers)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as executor:
+        for shard_results in executor.map(_read_shard, [reader] * len(shards), shards):
+            results.extend(shard_results)
+    return results
@@ -0,0 +1,250 @@
+"""
+収集パイプラインのメトリクス（Prometheus のテキスト形式）モジュール。
+
+D-Bus の受信から SSE の配信、セッションの保存、インデックスの同期、
+ダッシュボードの集計までのカウンターとヒストグラムをここにまとめて定義する。
+/metrics は render() の結果をそのまま返す。
+
+prometheus_client には依存せず、必要な分（カウンター・ヒストグラム・
+参照時に値を取り出すコールバック）だけを実装する。D-Bus のスレッドや
+スレッドプールからも更新されるため、各メトリクスはロックで保護する。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence
+
+# レイテンシ用のバケット（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# ファイルサイズ用のバケット（バイト）
+SIZE_BUCKETS = tuple(float(4 ** i * 1024) for i in range(8))
+# 件数用のバケット（1〜256）
+COUNT_BUCKETS = tuple(float(2 ** i) for i in range(9))
+
+# 登録済みのメトリクス（定義順に出力する）
+_registry: list = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+    def lines(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加のカウンター。"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """値の分布（累積バケット・合計・件数）。"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル → [バケットごとの件数..., 最大のバケットを超えた件数, 合計, 件数]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        """記録した値の件数を返す。"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(state[-1]) if state else 0
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """ブロックの実行時間（秒）を記録する。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def lines(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        lines = self._header()
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-2]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class Callback(_Metric):
+    """参照時に関数を呼んで値を取り出すメトリクス（SSE クライアントごとの状態等）。
+
+    func は {ラベル値のタプル: 値} を返す（ラベルが無ければキーは ()）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        type_name: str,
+        labelnames: Sequence[str] = (),
+        func: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.type_name = type_name
+        self.func = func
+
+    def set_function(self, func: Callable[[], dict[tuple, float]]):
+        self.func = func
+
+    def lines(self) -> list[str]:
+        if self.func is None:
+            return []
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self.func().items())
+        ]
+
+
+def render() -> str:
+    """登録済みの全メトリクスを Prometheus のテキスト形式で返す。"""
+    lines = []
+    for metric in _registry:
+        lines += metric.lines()
+    return "\n".join(lines) + "\n"
+
+
+# ── D-Bus 受信（avrcp_monitor.py） ──
+
+DBUS_SIGNALS = Counter(
+    "bt_dbus_signals_total", "MediaPlayer1 の PropertiesChanged シグナルの受信数"
+)
+DEDUP_SUPPRESSED = Counter(
+    "bt_dedup_suppressed_total", "重複として捨てたシグナル数", ["kind"]
+)
+
+# ── イベント処理と SSE 配信（main.py / broadcast.py） ──
+
+METADATA_EVENTS = Counter(
+    "bt_metadata_events_total", "イベントループで処理したメタデータイベント数"
+)
+METADATA_BATCH_SIZE = Histogram(
+    "bt_metadata_batch_size",
+    "別スレッドから届いたメタデータを 1 回のイベントループの呼び出しでまとめて処理した件数",
+    buckets=COUNT_BUCKETS,
+)
+METADATA_COALESCED = Counter(
+    "bt_metadata_coalesced_total", "ライブ表示をまとめたため SSE で配信しなかったメタデータイベント数"
+)
+SSE_DELIVERY_SECONDS = Histogram(
+    "bt_sse_delivery_seconds", "D-Bus シグナルの受信から SSE クライアントへの送出までの時間"
+)
+SSE_PUBLISHED = Callback("bt_sse_published_total", "SSE で配信したイベント数", "counter")
+SSE_DROPPED = Callback("bt_sse_dropped_total", "キューあふれで取りこぼしたイベント数（全クライアント）", "counter")
+SSE_SUBSCRIBERS = Callback("bt_sse_subscribers", "接続中の SSE クライアント数", "gauge")
+SSE_CLIENT_QUEUE_DEPTH = Callback(
+    "bt_sse_client_queue_depth", "SSE クライアントごとの未送信イベント数", "gauge", ["client"]
+)
+SSE_CLIENT_DROPPED = Callback(
+    "bt_sse_client_dropped", "SSE クライアントごとの取りこぼしイベント数（接続中のみ）", "gauge", ["client"]
+)
+
+# ── ストレージ（database.py / analysis.py） ──
+
+SAVE_SESSION_SECONDS = Histogram("bt_save_session_seconds", "save_session() の所要時間")
+SAVE_SESSION_BYTES = Histogram(
+    "bt_save_session_bytes", "保存したセッションファイルのサイズ", buckets=SIZE_BUCKETS
+)
+INDEX_SYNC_SECONDS = Histogram("bt_index_sync_seconds", "インデックスと実ファイルの突き合わせの所要時間")
+INDEX_SESSIONS_SCANNED = Counter(
+    "bt_index_sessions_scanned_total",
+    "インデックスの同期で読み直したセッション数（source=file: セッションファイル, archive: アーカイブ内）",
+    ["source"],
+)
+DASHBOARD_COMPUTE_SECONDS = Histogram(
+    "bt_dashboard_compute_seconds", "ダッシュボード集計の所要時間（キャッシュに無かったとき）"
+)
+DASHBOARD_CACHE_HITS = Counter("bt_dashboard_cache_hits_total", "ダッシュボード集計のキャッシュヒット数")
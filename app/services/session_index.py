@@ -0,0 +1,575 @@
+"""
+セッションヘッダーの永続インデックスモジュール。
+
+DATA_DIR 内のセッションファイルのヘッダーを SQLite に保持し、
+一覧取得のたびに全ファイルを開いて先頭行をパースしなくて済むようにする。
+インデックスは DATA_DIR の隣（例: data.index.sqlite3）に置き、
+起動時にファイルの mtime / サイズと突き合わせて再構築する。
+
+各行にはフィールドごとの値あり件数（aggregates.py のカウンター）も保存し、
+ダッシュボードの集計は SQL の GROUP BY で済ませる。
+
+一覧の絞り込み（SessionFilter）とページ分割も SQL で行う。端末・OS・開始日時等には
+索引を張ってあるので、セッションが増えても 1 ページ分の行だけを読む。コンテンツ名の
+部分一致は、登録時に casefold() した content_name_fold 列と比べる（SQLite の lower() は
+ASCII しか変換しないため）。
+
+Parquet アーカイブ（archive.py）に移したセッションは archive 列にアーカイブの
+ファイル名、row_group 列に行グループ番号を持つ（JSONL のセッションは archive = ''）。
+mtime / サイズはアーカイブファイルのものを記録する。
+
+中央ノード（ingest.py）がコレクターから受け取ったセッションは、collector 列に
+送り元のコレクター ID を持つ（このノードで記録したセッションは collector = ''）。
+
+コレクター（uploader.py）が中央ノードに送り終えたセッションは uploaded テーブルに
+圧縮前のファイル名と SHA-256 を持つ。sessions と違い、スキーマの更新では消さない。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Iterator, Mapping, Optional
+
+from app.services.aggregates import METADATA_FIELDS, TRACKS_KEY
+from app.services.compression import CODEC_SUFFIXES, PLAIN_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+# セッション読み取り関数の型（ファイルパスの列 → 各ファイルの (ヘッダー, カウンター) or None）
+SessionReader = Callable[[list[Path]], list[Optional[tuple[dict, dict[str, int]]]]]
+# アーカイブ読み取り関数の型（ファイルパス → [(ファイル名, ヘッダー, カウンター), ...]）
+ArchiveReader = Callable[[Path], list[tuple[str, dict, dict[str, int]]]]
+
+# スキーマを変更したら上げる（不一致なら作り直して実ファイルから再構築する）
+_SCHEMA_VERSION = 6
+# この版からは作り直さずに列を足す（v5 → v6: content_name_fold。値は reconcile() で埋める）
+_MIGRATIONS = {
+    5: "ALTER TABLE sessions ADD COLUMN content_name_fold TEXT",
+}
+
+# カウンター列（tracks + METADATA_FIELDS）。列名は n_<key>
+_COUNT_KEYS = [TRACKS_KEY] + METADATA_FIELDS
+_COUNT_COLUMNS = [f"n_{key}" for key in _COUNT_KEYS]
+
+# GROUP BY に指定できる列
+GROUP_COLUMNS = ("content_name", "platform_type", "device", "os_version", "bg_playback", "collector")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sessions (
+    filename      TEXT PRIMARY KEY,
+    mtime_ns      INTEGER NOT NULL,
+    size          INTEGER NOT NULL,
+    content_name  TEXT NOT NULL DEFAULT '',
+    content_name_fold TEXT,
+    platform_type TEXT NOT NULL DEFAULT '',
+    device        TEXT NOT NULL DEFAULT '',
+    os_version    TEXT NOT NULL DEFAULT '',
+    bg_playback   INTEGER NOT NULL DEFAULT 0,
+    session_start TEXT NOT NULL DEFAULT '',
+    session_end   TEXT NOT NULL DEFAULT '',
+    track_count   INTEGER NOT NULL DEFAULT 0,
+    collector     TEXT NOT NULL DEFAULT '',
+    header        TEXT NOT NULL,
+    archive       TEXT NOT NULL DEFAULT '',
+    row_group     INTEGER NOT NULL DEFAULT 0,
+    {", ".join(f"{col} INTEGER NOT NULL DEFAULT 0" for col in _COUNT_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS sessions_device ON sessions (device, os_version);
+CREATE INDEX IF NOT EXISTS sessions_platform ON sessions (platform_type, bg_playback);
+CREATE INDEX IF NOT EXISTS sessions_start ON sessions (session_start);
+CREATE INDEX IF NOT EXISTS sessions_archive ON sessions (archive, session_end);
+CREATE INDEX IF NOT EXISTS sessions_collector ON sessions (collector);
+"""
+
+_UPLOADED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploaded (
+    filename TEXT PRIMARY KEY,
+    sha256   TEXT NOT NULL
+);
+"""
+
+# sessions.filename から圧縮の拡張子を除いた名前（compression.plain_name() と同じ）
+_PLAIN_FILENAME_SQL = (
+    "CASE "
+    + " ".join(
+        f"WHEN filename LIKE '%{PLAIN_SUFFIX}{suffix}' THEN substr(filename, 1, length(filename) - {len(suffix)})"
+        for suffix in CODEC_SUFFIXES.values()
+    )
+    + " ELSE filename END"
+)
+
+
+# 一覧の絞り込み条件のクエリパラメータ（/sessions・/export・削除後の再表示で共通）
+FILTER_QUERY_KEYS = ("content", "device", "os_version", "platform_type", "bg", "date_from", "date_to")
+
+
+@dataclass
+class SessionFilter:
+    """セッション一覧の絞り込み条件（空文字列・None の項目は条件にしない）。"""
+
+    # コンテンツ名の部分一致（大文字・小文字を区別しない）
+    content: str = ""
+    device: str = ""
+    os_version: str = ""
+    platform_type: str = ""
+    bg_playback: Optional[bool] = None
+    # 開始日時の範囲（ISO 形式の文字列で比較する。started_before は含まない）
+    started_after: str = ""
+    started_before: str = ""
+    # 送り元のコレクター ID（中央ノードのみ）
+    collector: str = ""
+
+    @classmethod
+    def from_query(cls, query: Mapping[str, str]) -> "SessionFilter":
+        """クエリパラメータ（FILTER_QUERY_KEYS）から絞り込み条件を作る。
+
+        date_from / date_to は開始日（YYYY-MM-DD、両端を含む）。bg は "on" / "off"。
+        日付の形式が不正なら ValueError。
+        """
+        date_from = query.get("date_from", "")
+        date_to = query.get("date_to", "")
+        start_date = date.fromisoformat(date_from) if date_from else None
+        end_date = date.fromisoformat(date_to) if date_to else None
+        return cls(
+            content=query.get("content", ""),
+            device=query.get("device", ""),
+            os_version=query.get("os_version", ""),
+            platform_type=query.get("platform_type", ""),
+            bg_playback={"on": True, "off": False}.get(query.get("bg", "")),
+            started_after=start_date.isoformat() if start_date else "",
+            started_before=(end_date + timedelta(days=1)).isoformat() if end_date else "",
+        )
+
+    def where(self) -> tuple[str, list]:
+        """WHERE 句（条件が無ければ空文字列）とパラメーターを返す。"""
+        clauses = []
+        params: list = []
+        if self.content:
+            clauses.append("instr(content_name_fold, ?) > 0")
+            params.append(_fold(self.content))
+        for col in ("device", "os_version", "platform_type", "collector"):
+            value = getattr(self, col)
+            if value:
+                clauses.append(f"{col} = ?")
+                params.append(value)
+        if self.bg_playback is not None:
+            clauses.append("bg_playback = ?")
+            params.append(int(self.bg_playback))
+        if self.started_after:
+            clauses.append("session_start >= ?")
+            params.append(self.started_after)
+        if self.started_before:
+            clauses.append("session_start < ?")
+            params.append(self.started_before)
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+
+
+def _fold(value: str) -> str:
+    """大文字・小文字を区別しない比較用に変換する（content_name_fold 列と検索語）。"""
+    return value.casefold()
+
+
+def index_path_for(data_dir: Path) -> Path:
+    """DATA_DIR に対応するインデックスファイルのパスを返す。
+
+    DATA_DIR の中に置くと SQLite の -wal / -shm ファイルの生成・削除で
+    ディレクトリの mtime が変わってしまうため、隣に置く。
+    """
+    return data_dir.with_name(data_dir.name + ".index.sqlite3")
+
+
+class SessionIndex:
+    """セッションヘッダーの SQLite インデックス。
+
+    接続は呼び出しごとに開くため、複数スレッドから安全に利用できる。
+    """
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.path = index_path_for(data_dir)
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version in _MIGRATIONS and version + 1 == _SCHEMA_VERSION:
+                logger.info("インデックスのスキーマを更新: v%d -> v%d", version, _SCHEMA_VERSION)
+                conn.execute(_MIGRATIONS[version])
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+                conn.commit()
+            elif version != _SCHEMA_VERSION:
+                if version:
+                    logger.info("インデックスのスキーマが古いため再構築: v%d -> v%d", version, _SCHEMA_VERSION)
+                conn.execute("DROP TABLE IF EXISTS sessions")
+                conn.executescript(_SCHEMA)
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+                conn.commit()
+            conn.executescript(_UPLOADED_SCHEMA)
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """トランザクションを開始する。ブロック内で例外が出ればロールバックする。"""
+        with closing(self._connect()) as conn:
+            with conn:
+                yield conn
+
+    # ── 更新 ──
+
+    @staticmethod
+    def upsert(
+        conn: sqlite3.Connection,
+        filename: str,
+        header: dict,
+        counts: dict[str, int],
+        stat: os.stat_result,
+        archive: str = "",
+        row_group: int = 0,
+    ):
+        """ヘッダーとカウンターを登録（既存なら上書き）する。
+
+        archive を指定するとアーカイブ内のセッションとして登録する。
+        """
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO sessions (
+                filename, mtime_ns, size, content_name, content_name_fold, platform_type, device,
+                os_version, bg_playback, session_start, session_end, track_count, collector,
+                header, archive, row_group, {", ".join(_COUNT_COLUMNS)}
+            ) VALUES ({", ".join("?" * (16 + len(_COUNT_COLUMNS)))})
+            """,
+            (
+                filename,
+                stat.st_mtime_ns,
+                stat.st_size,
+                header.get("content_name", ""),
+                _fold(header.get("content_name", "")),
+                header.get("platform_type", ""),
+                header.get("device", ""),
+                header.get("os_version", ""),
+                1 if header.get("bg_playback") else 0,
+                header.get("session_start", ""),
+                header.get("session_end", ""),
+                header.get("track_count", 0),
+                header.get("collector", ""),
+                json.dumps(header, ensure_ascii=False),
+                archive,
+                row_group,
+                *(counts.get(key, 0) for key in _COUNT_KEYS),
+            ),
+        )
+
+    @staticmethod
+    def remove(conn: sqlite3.Connection, filename: str):
+        """ヘッダーを削除する。"""
+        conn.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+
+    @staticmethod
+    def rename(conn: sqlite3.Connection, filename: str, new_filename: str, stat: os.stat_result):
+        """セッションファイルの名前の変更（圧縮等）を記録する。stat は変更後のファイルのもの。"""
+        conn.execute(
+            "UPDATE sessions SET filename = ?, mtime_ns = ?, size = ? WHERE filename = ?",
+            (new_filename, stat.st_mtime_ns, stat.st_size, filename),
+        )
+
+    @staticmethod
+    def move_to_archive(
+        conn: sqlite3.Connection, filenames: list[str], archive: str, stat: os.stat_result
+    ):
+        """セッションをアーカイブに移したことを記録する（filenames は行グループ順）。"""
+        conn.executemany(
+            "UPDATE sessions SET archive = ?, row_group = ?, mtime_ns = ?, size = ? WHERE filename = ?",
+            [
+                (archive, i, stat.st_mtime_ns, stat.st_size, filename)
+                for i, filename in enumerate(filenames)
+            ],
+        )
+
+    @staticmethod
+    def remove_from_archive(
+        conn: sqlite3.Connection,
+        filename: str,
+        archive: str,
+        row_group: int,
+        stat: Optional[os.stat_result],
+    ):
+        """アーカイブから取り除いたセッションを削除し、後ろの行グループ番号を詰める。
+
+        stat は書き直したアーカイブのもの（アーカイブごと削除した場合は None）。
+        """
+        SessionIndex.remove(conn, filename)
+        conn.execute(
+            "UPDATE sessions SET row_group = row_group - 1 WHERE archive = ? AND row_group > ?",
+            (archive, row_group),
+        )
+        if stat is not None:
+            conn.execute(
+                "UPDATE sessions SET mtime_ns = ?, size = ? WHERE archive = ?",
+                (stat.st_mtime_ns, stat.st_size, archive),
+            )
+
+    # ── 参照 ──
+
+    def list_headers(
+        self,
+        session_filter: Optional[SessionFilter] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> list[dict]:
+        """セッションのヘッダーをファイル名の降順で返す。
+
+        session_filter で絞り込み、limit / offset で 1 ページ分だけを返す。
+        """
+        where, params = (session_filter or SessionFilter()).where()
+        sql = f"SELECT filename, header FROM sessions{where} ORDER BY filename DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        sessions = []
+        for row in rows:
+            session_info = json.loads(row["header"])
+            session_info["filename"] = row["filename"]
+            sessions.append(session_info)
+        return sessions
+
+    def count(self, session_filter: Optional[SessionFilter] = None) -> int:
+        """条件に合うセッションの件数を返す。"""
+        where, params = (session_filter or SessionFilter()).where()
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM sessions{where}", params).fetchone()[0]
+
+    def get_header(self, filename: str) -> Optional[dict]:
+        """セッションのヘッダーを返す（未登録なら None）。"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT header FROM sessions WHERE filename = ?", (filename,)
+            ).fetchone()
+        return json.loads(row["header"]) if row is not None else None
+
+    def locate(self, filename: str) -> Optional[tuple[str, int]]:
+        """セッションの格納場所を返す。
+
+        Returns:
+            (アーカイブのファイル名, 行グループ番号)。JSONL なら ("", 0)、未登録なら None
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT archive, row_group FROM sessions WHERE filename = ?", (filename,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row["archive"], row["row_group"]
+
+    def list_not_uploaded(self, limit: int, offset: int = 0) -> list[str]:
+        """中央ノードに未送信の、このノードで記録したセッションのファイル名を古い順に返す。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT filename FROM sessions WHERE collector = ''"
+                f" AND ({_PLAIN_FILENAME_SQL}) NOT IN (SELECT filename FROM uploaded)"
+                " ORDER BY filename LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [row["filename"] for row in rows]
+
+    def count_not_uploaded(self) -> int:
+        """中央ノードに未送信の、このノードで記録したセッションの件数を返す。"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM sessions WHERE collector = ''"
+                f" AND ({_PLAIN_FILENAME_SQL}) NOT IN (SELECT filename FROM uploaded)"
+            ).fetchone()[0]
+
+    def mark_uploaded(self, entries: dict[str, str], replace: bool = False):
+        """送信済みのセッション（圧縮前のファイル名 → SHA-256）を登録する。
+
+        replace=True なら登録済みの内容を entries で置き換える。
+        """
+        with self.transaction() as conn:
+            if replace:
+                conn.execute("DELETE FROM uploaded")
+            conn.executemany(
+                "INSERT OR REPLACE INTO uploaded (filename, sha256) VALUES (?, ?)", entries.items()
+            )
+
+    def list_archivable(self, ended_before: str) -> list[dict]:
+        """session_end が ended_before より前の JSONL セッションをファイル名順に返す。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT filename, header FROM sessions"
+                " WHERE archive = '' AND session_end < ? ORDER BY filename",
+                (ended_before,),
+            ).fetchall()
+        return [{"filename": row["filename"], "header": json.loads(row["header"])} for row in rows]
+
+    def aggregate(self, group_by: tuple[str, ...] = ()) -> list[dict]:
+        """カウンターを group_by の列ごとに合計して返す。
+
+        Returns:
+            [
+                {
+                    "content_name": "Spotify", ...（group_by の列）,
+                    "session_count": 3,
+                    "counts": {"tracks": 45, "title": 45, ...},
+                },
+                ...
+            ]
+        """
+        for col in group_by:
+            if col not in GROUP_COLUMNS:
+                raise ValueError(f"集計できない列です: {col}")
+
+        select = [*group_by, "COUNT(*) AS session_count"]
+        select += [f"SUM({col}) AS {col}" for col in _COUNT_COLUMNS]
+        sql = f"SELECT {', '.join(select)} FROM sessions"
+        if group_by:
+            # ファイル名順で最初に現れたグループから並べる
+            sql += f" GROUP BY {', '.join(group_by)} ORDER BY MIN(filename)"
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql).fetchall()
+
+        result = []
+        for row in rows:
+            if not row["session_count"]:
+                continue
+            item = {col: row[col] for col in group_by}
+            if "bg_playback" in item:
+                item["bg_playback"] = bool(item["bg_playback"])
+            item["session_count"] = row["session_count"]
+            item["counts"] = {
+                key: row[col] or 0 for key, col in zip(_COUNT_KEYS, _COUNT_COLUMNS)
+            }
+            result.append(item)
+        return result
+
+    # ── 再構築 ──
+
+    def reconcile(self, paths: list[Path], read_sessions: SessionReader) -> tuple[int, int]:
+        """実ファイルとインデックスを突き合わせる。
+
+        mtime / サイズが変わったファイルと未登録のファイルだけ読み直し、
+        実ファイルが無くなった行は削除する（JSONL のセッションのみ対象）。
+        読み直すファイルはまとめて read_sessions に渡す（並列に読めるように）。
+        読み込み中はトランザクションを開かない。
+
+        Returns:
+            (更新件数, 削除件数)
+        """
+        with closing(self._connect()) as conn:
+            known = {
+                row["filename"]: (row["mtime_ns"], row["size"])
+                for row in conn.execute(
+                    "SELECT filename, mtime_ns, size FROM sessions WHERE archive = ''"
+                )
+            }
+
+        stale = []
+        seen = set()
+        for filepath in paths:
+            seen.add(filepath.name)
+            try:
+                stat = filepath.stat()
+            except OSError:
+                continue
+            if known.get(filepath.name) != (stat.st_mtime_ns, stat.st_size):
+                stale.append((filepath, stat))
+
+        summaries = read_sessions([filepath for filepath, _ in stale]) if stale else []
+
+        with self.transaction() as conn:
+            updated = 0
+            for (filepath, stat), summary in zip(stale, summaries):
+                if summary is None:
+                    self.remove(conn, filepath.name)
+                    continue
+                header, counts = summary
+                self.upsert(conn, filepath.name, header, counts, stat)
+                updated += 1
+
+            removed = 0
+            for filename in known.keys() - seen:
+                self.remove(conn, filename)
+                removed += 1
+
+            # スキーマの更新で足した content_name_fold を埋める（ファイルは読み直さない）
+            unfolded = conn.execute(
+                "SELECT DISTINCT content_name FROM sessions WHERE content_name_fold IS NULL"
+            ).fetchall()
+            conn.executemany(
+                "UPDATE sessions SET content_name_fold = ? WHERE content_name = ? AND content_name_fold IS NULL",
+                [(_fold(row["content_name"]), row["content_name"]) for row in unfolded],
+            )
+
+        if updated or removed:
+            logger.info("セッションインデックスを更新: %d 件更新, %d 件削除", updated, removed)
+        return updated, removed
+
+    def reconcile_archives(self, paths: list[Path], read_archive: ArchiveReader) -> tuple[int, int]:
+        """アーカイブファイルとインデックスを突き合わせる。
+
+        mtime / サイズが変わったアーカイブは中のセッションをすべて登録し直す。
+        同名の JSONL セッションが登録済みならそちらを優先する
+        （アーカイブへの移動が途中で中断された場合）。
+
+        Returns:
+            (更新件数, 削除件数)
+        """
+        with self.transaction() as conn:
+            known: dict[str, set] = {}
+            for row in conn.execute(
+                "SELECT archive, mtime_ns, size FROM sessions WHERE archive != ''"
+            ):
+                known.setdefault(row["archive"], set()).add((row["mtime_ns"], row["size"]))
+
+            updated = removed = 0
+            seen = set()
+            for archive_path in paths:
+                seen.add(archive_path.name)
+                try:
+                    stat = archive_path.stat()
+                except OSError:
+                    continue
+                if known.get(archive_path.name) == {(stat.st_mtime_ns, stat.st_size)}:
+                    continue
+                try:
+                    summaries = read_archive(archive_path)
+                except Exception:
+                    logger.exception("アーカイブの読み込みに失敗: %s", archive_path.name)
+                    continue
+
+                removed += conn.execute(
+                    "DELETE FROM sessions WHERE archive = ?", (archive_path.name,)
+                ).rowcount
+                jsonl = {
+                    row["filename"]
+                    for row in conn.execute("SELECT filename FROM sessions WHERE archive = ''")
+                }
+                for row_group, (filename, header, counts) in enumerate(summaries):
+                    if filename in jsonl:
+                        continue
+                    self.upsert(conn, filename, header, counts, stat, archive_path.name, row_group)
+                    updated += 1
+
+            for archive in known.keys() - seen:
+                removed += conn.execute(
+                    "DELETE FROM sessions WHERE archive = ?", (archive,)
+                ).rowcount
+
+        if updated or removed:
+            logger.info("アーカイブのインデックスを更新: %d 件更新, %d 件削除", updated, removed)
+        return updated, removed
@@ -0,0 +1,152 @@
+"""
+AVRCP シグナルの記録・再生モジュール。
+
+実機で受信した MediaPlayer1 の PropertiesChanged を、受信時刻（単調時計）付きで
+ファイルに記録し、後から同じ間隔（または N 倍速・最大速度）で
+AVRCPMonitor._on_properties_changed() に流し直す。本番で起きたシグナルの集中を
+再現したり、パイプラインのスループットを毎回同じ入力で測ったりするためのもの。
+
+記録ファイルは gzip 圧縮した JSONL。
+- 1 行目: {"type": "signal_capture", "version": 1, "started": 記録開始時刻（ISO 形式）}
+- 2 行目以降: [前のシグナルからの経過時間（マイクロ秒）, プレイヤーパス, changed, invalidated]
+
+changed はパイプラインが読む Track / Status だけを Python の型に変換して記録する
+（Position 等、使わないプロパティは記録しない）。
+"""
+
+import gzip
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_TYPE = "signal_capture"
+CAPTURE_VERSION = 1
+
+# この件数ごとに gzip のバッファを書き出す（異常終了しても大半が残るように）
+_FLUSH_EVERY = 64
+
+
+@dataclass
+class CapturedSignal:
+    """記録した 1 シグナル。offset は記録開始（最初のシグナル）からの秒数。"""
+
+    offset: float
+    path: str
+    changed: dict
+    invalidated: list
+
+
+class SignalRecorder:
+    """PropertiesChanged をファイルに記録する（D-Bus のスレッド・イベントループのどちらから呼んでもよい）。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._last_us: Optional[int] = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._write({"type": CAPTURE_TYPE, "version": CAPTURE_VERSION, "started": datetime.now().isoformat()})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, received_at: float, path: str, changed: dict, invalidated):
+        """シグナルを記録する。received_at は受信時刻（単調時計の秒）。"""
+        received_us = int(received_at * 1_000_000)
+        with self._lock:
+            if self._file is None:
+                return
+            delta_us = 0 if self._last_us is None else max(0, received_us - self._last_us)
+            self._last_us = received_us
+            self._write([delta_us, path, changed, list(invalidated or [])])
+            self.count += 1
+            if self.count % _FLUSH_EVERY == 0:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+        logger.info("シグナルの記録を終了: %s (%d 件)", self.path, self.count)
+
+
+def iter_capture(path: Path) -> Iterator[CapturedSignal]:
+    """記録ファイルのシグナルを順に返す。
+
+    Raises:
+        ValueError: 記録ファイルの形式でない
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "null")
+        if not isinstance(header, dict) or header.get("type") != CAPTURE_TYPE:
+            raise ValueError(f"シグナルの記録ファイルではありません: {path}")
+        offset_us = 0
+        for line in f:
+            if not line.strip():
+                continue
+            delta_us, player_path, changed, invalidated = json.loads(line)
+            offset_us += delta_us
+            yield CapturedSignal(offset_us / 1_000_000, player_path, changed, invalidated)
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """再生速度の指定（"1"、"4"、"0.5"、"max"）を倍率に変換する。最大速度は None。"""
+    value = (value or "1").strip().lower()
+    if value in ("max", "0", "inf"):
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError(f"再生速度が不正です: {value}")
+    return speed
+
+
+def replay(
+    signals: Iterator[CapturedSignal],
+    handler: Callable[[CapturedSignal], None],
+    speed: Optional[float] = 1.0,
+    stop_event: Optional[threading.Event] = None,
+) -> dict:
+    """記録したシグナルを handler に渡す（呼び出したスレッドで実行する）。
+
+    speed は記録時の間隔に対する倍率（None なら待たずに流す）。待ち時間は
+    再生開始からの目標時刻で決めるので、handler の処理時間で遅れが積み重ならない。
+
+    Returns:
+        {"signals": 件数, "elapsed": 再生にかかった秒数, "captured": 記録上の長さ（秒）, "lag_max": 最大の遅れ（秒）}
+    """
+    started = time.monotonic()
+    count = 0
+    offset = 0.0
+    lag_max = 0.0
+    for signal in signals:
+        if stop_event is not None and stop_event.is_set():
+            break
+        offset = signal.offset
+        if speed is not None:
+            wait = started + offset / speed - time.monotonic()
+            if wait > 0:
+                if stop_event is not None:
+                    if stop_event.wait(wait):
+                        break
+                else:
+                    time.sleep(wait)
+            else:
+                lag_max = max(lag_max, -wait)
+        handler(signal)
+        count += 1
+    return {
+        "signals": count,
+        "elapsed": time.monotonic() - started,
+        "captured": offset,
+        "lag_max": lag_max,
+    }
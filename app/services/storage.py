@@ -0,0 +1,98 @@
+"""
+ストレージ層の非同期 API。
+
+database.py / analysis.py の関数はセッションファイルや SQLite インデックスを同期的に読み書きする。
+リクエストハンドラー（イベントループ上）から直接呼ぶと、ディスクの走査中は
+イベントループが止まり、SSE の配信も止まる。ハンドラーはこのモジュールの関数を await する。
+
+処理はスレッドプールで実行する。同時に実行するディスク処理の数は
+環境変数 BT_IO_CONCURRENCY（既定 4）で制限する（SD カードへの同時アクセスを抑え、
+スレッドプールを他の処理のために空けておく）。
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+from app.services import analysis, database, ingest
+from app.services.database import SessionSource
+from app.services.journal import SessionJournal
+from app.services.session_index import SessionFilter
+from app.services.uploader import SessionUploader
+
+T = TypeVar("T")
+
+# 同時に実行するディスク処理の上限
+IO_CONCURRENCY = max(1, int(os.environ.get("BT_IO_CONCURRENCY", "") or 4))
+
+# イベントループごとに作り直す（asyncio.Semaphore は最初に使ったループに束縛される）
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(IO_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+async def run(func: Callable[..., T], *args, **kwargs) -> T:
+    """同期関数をスレッドプールで実行する（同時実行数は IO_CONCURRENCY まで）。"""
+    async with _get_semaphore():
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def list_sessions(session_filter: Optional[SessionFilter] = None) -> list[dict]:
+    return await run(database.list_sessions, session_filter)
+
+
+async def query_sessions(
+    session_filter: SessionFilter, limit: int, offset: int = 0
+) -> tuple[list[dict], int]:
+    return await run(database.query_sessions, session_filter, limit, offset)
+
+
+async def get_session_source(filename: str) -> Optional[SessionSource]:
+    return await run(database.get_session_source, filename)
+
+
+async def delete_session(filename: str) -> bool:
+    return await run(database.delete_session, filename)
+
+
+async def open_journal(**kwargs) -> SessionJournal:
+    """database.open_journal() と同じ引数（キーワード引数）を取る。"""
+    return await run(database.open_journal, **kwargs)
+
+
+async def save_session(**kwargs) -> Path:
+    """database.save_session() と同じ引数（キーワード引数）を取る。"""
+    return await run(database.save_session, **kwargs)
+
+
+async def archive_sessions(older_than_days: float) -> Optional[Path]:
+    return await run(database.archive_sessions, older_than_days)
+
+
+async def compress_sessions(older_than_days: float, codec: str) -> list[Path]:
+    return await run(database.compress_sessions, older_than_days, codec)
+
+
+async def compute_dashboard() -> dict:
+    return await run(analysis.compute_dashboard)
+
+
+async def plan_ingest(collector: str, sessions: list[dict]) -> list[dict]:
+    return await run(ingest.plan_batch, collector, sessions)
+
+
+async def write_ingest_chunk(upload_id: str, offset: int, data: bytes) -> dict:
+    return await run(ingest.write_chunk, upload_id, offset, data)
+
+
+async def upload_sessions(uploader: SessionUploader) -> int:
+    return await run(uploader.upload_once)
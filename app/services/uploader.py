@@ -0,0 +1,293 @@
+"""
+コレクターから中央ノードへのセッションのアップロードモジュール。
+
+環境変数 BT_CENTRAL_URL（中央ノードの URL）を設定したコレクターは、保存済みのセッションを
+バックグラウンドで中央ノード（ingest.py）に送る。BT_UPLOAD_BATCH 件ずつまとめて
+取り込み状況を問い合わせ、未完了のセッションだけを CHUNK_SIZE ごとに分割して送る。
+接続が切れても、次の周期で中央ノードが受信済みのバイト数から再開する。
+
+セッションは展開済みの JSONL（SessionSource.iter_jsonl()）として送るので、送った後で
+圧縮・アーカイブしても同じ内容として扱われる。送り終えたセッションはデータディレクトリの隣の
+送信済みリスト（例: data.uploaded.json）に圧縮前のファイル名と SHA-256 を記録する。
+送信済みリストはインデックスの uploaded テーブルにも写し、未送信のセッションは
+インデックスへの問い合わせで 1 ページずつ取り出す（周期ごとに全セッションを並べ直さない）。
+
+HTTP は標準ライブラリ（urllib）で送る。処理は同期的なので、storage.run() 経由で呼ぶ。
+
+環境変数:
+- BT_CENTRAL_URL      : 中央ノードの URL（例: http://central.local:8000）
+- BT_COLLECTOR_ID     : このコレクターの ID（既定はホスト名）
+- BT_UPLOAD_INTERVAL  : 送信の周期（秒、既定 60）
+- BT_UPLOAD_BATCH     : 1 回に問い合わせるセッション数（既定 20）
+- BT_INGEST_TOKEN     : 中央ノードと共有するトークン（設定時は Authorization ヘッダーで送る）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.services import compression, database
+from app.services.database import SessionSource
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_INTERVAL = 60.0
+DEFAULT_UPLOAD_BATCH = 20
+
+# 1 リクエストで送るバイト数
+CHUNK_SIZE = 256 * 1024
+# HTTP リクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 30.0
+# 1 セッションの送信で offset の食い違い（409）から再開する回数の上限
+_MAX_RESUMES = 3
+
+
+class UploadError(Exception):
+    """中央ノードへの送信の失敗。"""
+
+
+def ledger_path_for(data_dir: Path) -> Path:
+    """データディレクトリに対応する送信済みリストのパスを返す。"""
+    return data_dir.with_name(data_dir.name + ".uploaded.json")
+
+
+def _iter_chunks(source: SessionSource, offset: int = 0) -> Iterator[bytes]:
+    """セッションの JSONL を offset バイト目から CHUNK_SIZE ごとに返す。
+
+    offset が末尾（中央ノードが全バイトを受信済み）なら空のチャンクを 1 つ返す。
+    中央ノードは空のチャンクを受け取ると、受信済みのファイルを照合して取り込む。
+    """
+    buffer = bytearray()
+    yielded = False
+    skip = offset
+    for data in source.iter_jsonl():
+        if skip:
+            if len(data) <= skip:
+                skip -= len(data)
+                continue
+            data = data[skip:]
+            skip = 0
+        buffer += data
+        while len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer[:CHUNK_SIZE])
+            yielded = True
+            del buffer[:CHUNK_SIZE]
+    if buffer or not yielded:
+        yield bytes(buffer)
+
+
+class SessionUploader:
+    """保存済みのセッションを中央ノードに送る（コレクター側）。"""
+
+    def __init__(
+        self,
+        central_url: str,
+        collector_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        token: Optional[str] = None,
+    ):
+        self.central_url = central_url.rstrip("/")
+        self.collector_id = database._sanitize_filename(
+            collector_id or os.environ.get("BT_COLLECTOR_ID", "") or socket.gethostname()
+        )
+        if batch_size is None:
+            batch_size = int(os.environ.get("BT_UPLOAD_BATCH", "") or DEFAULT_UPLOAD_BATCH)
+        self.batch_size = max(1, batch_size)
+        self.token = token if token is not None else os.environ.get("BT_INGEST_TOKEN", "")
+        # 1 周期ずつ実行する（バックグラウンドの周期と手動の実行が重ならないように）
+        self._lock = threading.Lock()
+        # 圧縮前のファイル名 → SHA-256（送信済み）
+        self._uploaded: Optional[dict[str, str]] = None
+        # 送信済みリストをインデックスに写したか
+        self._ledger_indexed = False
+        # 格納場所（ファイル名・mtime・サイズ・行グループ）→ (サイズ, SHA-256)
+        self._digests: dict[tuple, tuple[int, str]] = {}
+        self.uploaded_count = 0
+        self.pending_count = 0
+        self.last_error: Optional[str] = None
+        self.last_upload_time: Optional[datetime] = None
+
+    # ── 送信済みリスト ──
+
+    @property
+    def _ledger_path(self) -> Path:
+        return ledger_path_for(database.DATA_DIR)
+
+    def _load_ledger(self) -> dict[str, str]:
+        if self._uploaded is None:
+            try:
+                self._uploaded = json.loads(self._ledger_path.read_text(encoding="utf-8"))
+            except FileNotFoundError:
+                self._uploaded = {}
+            except (OSError, json.JSONDecodeError):
+                logger.warning("送信済みリストを読み込めないため、全セッションを問い合わせ直します")
+                self._uploaded = {}
+        return self._uploaded
+
+    def _mark_uploaded(self, filename: str, sha256: str):
+        ledger = self._load_ledger()
+        ledger[filename] = sha256
+        tmp_path = self._ledger_path.with_name(self._ledger_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(ledger, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self._ledger_path)
+        database.mark_uploaded({filename: sha256})
+
+    def _index_ledger(self):
+        """送信済みリストをインデックスに写す（起動後の最初の 1 回だけ。送信済みリストを正とする）。"""
+        if not self._ledger_indexed:
+            database.mark_uploaded(self._load_ledger(), replace=True)
+            self._ledger_indexed = True
+
+    # ── HTTP ──
+
+    def _request(self, method: str, path: str, body: bytes, content_type: str, headers: Optional[dict] = None):
+        """中央ノードにリクエストを送り、(ステータス, JSON) を返す（4xx も返す）。"""
+        request = urllib.request.Request(
+            self.central_url + path, data=body, method=method,
+            headers={"Content-Type": content_type, **(headers or {})},
+        )
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise UploadError(f"中央ノードのエラー: HTTP {e.code}") from e
+            try:
+                payload = json.loads(e.read() or b"{}")
+            except json.JSONDecodeError:
+                payload = {}
+            return e.code, payload
+        except (urllib.error.URLError, OSError, json.JSONDecodeError) as e:
+            raise UploadError(f"中央ノードに接続できません: {e}") from e
+
+    # ── 送信 ──
+
+    def _digest(self, source: SessionSource) -> tuple[int, str]:
+        """セッションの JSONL のサイズと SHA-256 を返す（格納場所が変わらなければ計算し直さない）。"""
+        stat = source.path.stat()
+        key = (source.filename, stat.st_mtime_ns, stat.st_size, source.row_group)
+        cached = self._digests.get(key)
+        if cached is None:
+            digest = hashlib.sha256()
+            size = 0
+            for data in source.iter_jsonl():
+                digest.update(data)
+                size += len(data)
+            cached = self._digests[key] = (size, digest.hexdigest())
+        return cached
+
+    def _iter_pending(self) -> Iterator[str]:
+        """送信済みリストに無いセッションのファイル名（インデックス上の名前）を古い順に返す。
+
+        インデックスから batch_size 件ずつ取り出す。pending_count も更新する。
+        """
+        self._index_ledger()
+        offset = 0
+        while True:
+            filenames, self.pending_count = database.list_pending_uploads(self.batch_size, offset)
+            yield from filenames
+            if len(filenames) < self.batch_size:
+                return
+            offset += len(filenames)
+
+    def _send(self, upload_id: str, source: SessionSource, offset: int) -> bool:
+        """セッションを offset から送る。取り込みまで終われば True。"""
+        for _ in range(_MAX_RESUMES):
+            resumed = False
+            for chunk in _iter_chunks(source, offset):
+                status, payload = self._request(
+                    "PUT", f"/ingest/uploads/{upload_id}", chunk, "application/octet-stream",
+                    {"Upload-Offset": str(offset)},
+                )
+                if status == 409 and payload.get("offset") is not None:
+                    # 前回の送信の一部が届いていた等。中央ノードの受信済みバイト数から送り直す
+                    offset = payload["offset"]
+                    resumed = True
+                    break
+                if status != 200:
+                    raise UploadError(f"送信に失敗: {source.filename} (HTTP {status}: {payload.get('detail', '')})")
+                offset = payload["offset"]
+                if payload.get("status") == "done":
+                    return True
+            if not resumed:
+                return False
+        return False
+
+    def upload_once(self) -> int:
+        """未送信のセッションを最大 batch_size 件送る。送り終えた件数を返す。"""
+        with self._lock:
+            try:
+                return self._upload_batch()
+            except UploadError as e:
+                self.last_error = str(e)
+                raise
+
+    def _upload_batch(self) -> int:
+        batch = []
+        for stored_filename in self._iter_pending():
+            if len(batch) >= self.batch_size:
+                break
+            source = database.get_session_source(stored_filename)
+            if source is None:
+                continue
+            filename = compression.plain_name(stored_filename)
+            try:
+                size, sha256 = self._digest(source)
+            except compression.READ_ERRORS:
+                logger.warning("セッションを読み込めないため送信を見送ります: %s", source.filename)
+                continue
+            if size:
+                batch.append((filename, source, size, sha256))
+        # 送信済みになったセッションの SHA-256 は覚えておかない
+        batch_filenames = {source.filename for _, source, _, _ in batch}
+        self._digests = {key: value for key, value in self._digests.items() if key[0] in batch_filenames}
+        if not batch:
+            return 0
+
+        body = json.dumps({
+            "collector": self.collector_id,
+            "sessions": [
+                {"filename": filename, "size": size, "sha256": sha256}
+                for filename, _, size, sha256 in batch
+            ],
+        }).encode("utf-8")
+        status, payload = self._request("POST", "/ingest/batch", body, "application/json")
+        if status != 200:
+            raise UploadError(f"取り込み状況の問い合わせに失敗 (HTTP {status}: {payload.get('detail', '')})")
+
+        uploaded = 0
+        for (filename, source, _, sha256), result in zip(batch, payload["sessions"]):
+            if result["status"] != "done":
+                if not self._send(result["upload_id"], source, result["offset"]):
+                    logger.warning("セッションの送信を完了できませんでした: %s", filename)
+                    continue
+            self._mark_uploaded(filename, sha256)
+            uploaded += 1
+
+        self.uploaded_count += uploaded
+        self.pending_count -= uploaded
+        self.last_error = None
+        self.last_upload_time = datetime.now()
+        if uploaded:
+            logger.info("%d セッションを中央ノードに送信 (残り %d)", uploaded, self.pending_count)
+        return uploaded
+
+    def stats(self) -> dict:
+        return {
+            "central_url": self.central_url,
+            "collector_id": self.collector_id,
+            "uploaded": self.uploaded_count,
+            "pending": self.pending_count,
+            "last_upload_time": self.last_upload_time.isoformat() if self.last_upload_time else None,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,123 @@
+"""
+メタデータ充実度計算のベンチマーク（合成 100 万トラック）。
+
+以下の 3 通りでサービス別の取得率を計算して比べる。
+- apply : 旧ノートブック（groupby → フィールドごとに .apply(has_value).mean()）
+- python: 旧アプリ（トラックごと・フィールドごとに has_value() を呼んで数える）
+- vector: coverage.coverage_table()（値ありマスクを 1 回作って groupby の平均）
+
+使い方:
+    python benchmarks/bench_coverage.py [--tracks 1000000] [--skip-apply]
+"""
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.aggregates import METADATA_FIELDS, has_value  # noqa: E402
+from app.services.coverage import coverage_table  # noqa: E402
+
+CONTENTS = ["Spotify", "YouTube", "Apple Music", "Amazon Music", "radiko", "Podcast"]
+
+
+def make_corpus(n: int, seed: int = 0) -> pd.DataFrame:
+    """JSONL を pd.DataFrame にしたときと同じ型のトラックを n 件作る。"""
+    rng = np.random.default_rng(seed)
+
+    def strings(prefix: str, empty: float, missing: float):
+        values = np.array([f"{prefix}{i}" for i in rng.integers(0, 5000, n)], dtype=object)
+        roll = rng.random(n)
+        values[roll < empty] = ""
+        values[roll > 1 - missing] = None
+        return values
+
+    def numbers(high: int, zero: float, missing: float):
+        values = rng.integers(1, high, n).astype("float64")
+        roll = rng.random(n)
+        values[roll < zero] = 0
+        values[roll > 1 - missing] = np.nan
+        return values
+
+    return pd.DataFrame({
+        "content_name": rng.choice(CONTENTS, n),
+        "title": strings("title ", 0.05, 0.02),
+        "artist": strings("artist ", 0.10, 0.05),
+        "album": strings("album ", 0.40, 0.10),
+        "genre": strings("genre ", 0.30, 0.30),
+        "track_number": numbers(30, 0.10, 0.40),
+        "number_of_tracks": numbers(30, 0.05, 0.50),
+        "duration_ms": numbers(600_000, 0.20, 0.20),
+    })
+
+
+def _has_value(value) -> bool:
+    # JSON 由来の欠損は DataFrame 上では NaN になるので、旧ノートブックと同じく欠損扱いにする
+    return not pd.isna(value) and has_value(value)
+
+
+def by_apply(df: pd.DataFrame) -> dict:
+    result = {}
+    for service, group in df.groupby("content_name"):
+        result[service] = {
+            field: round(group[field].apply(_has_value).mean() * 100, 1) for field in METADATA_FIELDS
+        }
+    return result
+
+
+def by_python(df: pd.DataFrame) -> dict:
+    totals: dict[str, int] = defaultdict(int)
+    counts: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    columns = [df[field].tolist() for field in METADATA_FIELDS]
+    for service, *values in zip(df["content_name"].tolist(), *columns):
+        totals[service] += 1
+        service_counts = counts[service]
+        for field, value in zip(METADATA_FIELDS, values):
+            if _has_value(value):
+                service_counts[field] += 1
+    return {
+        service: {field: round(counts[service][field] / totals[service] * 100, 1) for field in METADATA_FIELDS}
+        for service in sorted(totals)
+    }
+
+
+def by_vector(df: pd.DataFrame) -> dict:
+    return coverage_table(df, ["content_name"])[METADATA_FIELDS].to_dict("index")
+
+
+def bench(name: str, func, df: pd.DataFrame) -> tuple[float, dict]:
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<7} {elapsed:8.3f} s  {len(df) / elapsed:14,.0f} tracks/s")
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=1_000_000)
+    parser.add_argument("--skip-apply", action="store_true", help="最も遅い apply 版を省く")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = make_corpus(args.tracks)
+    print(f"corpus  {len(df):,} tracks ({time.perf_counter() - start:.1f} s)")
+
+    vector_time, expected = bench("vector", by_vector, df)
+    python_time, result = bench("python", by_python, df)
+    assert result == expected, "python 版と結果が一致しません"
+    if not args.skip_apply:
+        apply_time, result = bench("apply", by_apply, df)
+        assert result == expected, "apply 版と結果が一致しません"
+        print(f"speedup vs apply  x{apply_time / vector_time:.1f}")
+    print(f"speedup vs python x{python_time / vector_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
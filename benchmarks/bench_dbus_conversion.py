@@ -0,0 +1,131 @@
+"""
+D-Bus 型変換のマイクロベンチマーク。
+
+旧実装（呼び出しごとに import dbus して isinstance を順に試し、
+PropertiesChanged の中身を丸ごと再帰変換する）と DBusConverter を比べる。
+dbus-python が無い環境では、同じ継承関係を持つダミーの dbus モジュールで測る。
+
+使い方:
+    python benchmarks/bench_dbus_conversion.py [--signals 100000]
+"""
+
+import argparse
+import sys
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _install_fake_dbus():
+    """dbus-python の型だけを模したモジュールを sys.modules に登録する。"""
+    fake = types.ModuleType("dbus")
+
+    class _Int(int):
+        def __new__(cls, value=0, variant_level=0):
+            return super().__new__(cls, value)
+
+    for name in ("Int16", "Int32", "Int64", "UInt16", "UInt32", "UInt64", "Byte"):
+        setattr(fake, name, type(name, (_Int,), {}))
+    fake.Boolean = type("Boolean", (_Int,), {})
+    fake.Double = type("Double", (float,), {})
+    fake.String = type("String", (str,), {})
+    fake.ObjectPath = type("ObjectPath", (str,), {})
+    fake.Array = type("Array", (list,), {})
+    fake.Dictionary = type("Dictionary", (dict,), {})
+    sys.modules["dbus"] = fake
+
+
+try:
+    import dbus
+except ImportError:
+    _install_fake_dbus()
+    import dbus
+
+from app.services.avrcp_monitor import DBusConverter, _parse_track_metadata  # noqa: E402
+
+
+def legacy_dbus_to_python(value):
+    """変更前の _dbus_to_python()。"""
+    try:
+        import dbus
+    except ImportError:
+        return value
+
+    if isinstance(value, dbus.String):
+        return str(value)
+    elif isinstance(value, (dbus.Int16, dbus.Int32, dbus.Int64,
+                            dbus.UInt16, dbus.UInt32, dbus.UInt64)):
+        return int(value)
+    elif isinstance(value, dbus.Double):
+        return float(value)
+    elif isinstance(value, dbus.Boolean):
+        return bool(value)
+    elif isinstance(value, dbus.Array):
+        return [legacy_dbus_to_python(item) for item in value]
+    elif isinstance(value, dbus.Dictionary):
+        return {legacy_dbus_to_python(k): legacy_dbus_to_python(v) for k, v in value.items()}
+    elif isinstance(value, dbus.Byte):
+        return int(value)
+    else:
+        return value
+
+
+def make_changed(i: int):
+    """BlueZ が送る PropertiesChanged の changed 引数に近いデータを作る。"""
+    track = dbus.Dictionary({
+        dbus.String("Title"): dbus.String(f"Track {i}"),
+        dbus.String("Artist"): dbus.String("Artist"),
+        dbus.String("Album"): dbus.String("Album"),
+        dbus.String("Genre"): dbus.String("Pop"),
+        dbus.String("TrackNumber"): dbus.UInt32(i % 20 + 1),
+        dbus.String("NumberOfTracks"): dbus.UInt32(20),
+        dbus.String("Duration"): dbus.UInt32(200000 + i),
+        # 使わないが実機で付いてくる値
+        dbus.String("Item"): dbus.ObjectPath(f"/org/bluez/hci0/dev_00_00_00_00_00_01/player0/item{i}"),
+        dbus.String("Images"): dbus.Array([dbus.Byte(b) for b in range(32)]),
+    })
+    return dbus.Dictionary({
+        dbus.String("Track"): track,
+        dbus.String("Status"): dbus.String("playing"),
+        dbus.String("Position"): dbus.UInt32(i * 1000),
+        dbus.String("Shuffle"): dbus.String("off"),
+        dbus.String("Repeat"): dbus.String("off"),
+    })
+
+
+def bench(name: str, func, signals: list) -> float:
+    start = time.perf_counter()
+    for changed in signals:
+        converted = func(changed)
+        _parse_track_metadata(converted["Track"])
+    elapsed = time.perf_counter() - start
+    rate = len(signals) / elapsed
+    print(f"{name:<8} {elapsed:8.3f} s  {rate:12,.0f} signals/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--signals", type=int, default=100_000)
+    args = parser.parse_args()
+
+    signals = [make_changed(i) for i in range(args.signals)]
+    converter = DBusConverter()
+
+    # 変換結果が旧実装と一致することを確認
+    for changed in signals[:100]:
+        assert (
+            _parse_track_metadata(legacy_dbus_to_python(changed)["Track"])
+            == _parse_track_metadata(converter.convert_changed(changed)["Track"])
+        )
+
+    print(f"dbus: {dbus.__name__} ({'fake' if not hasattr(dbus, '__file__') else dbus.__file__})")
+    old = bench("legacy", legacy_dbus_to_python, signals)
+    new = bench("new", converter.convert_changed, signals)
+    print(f"speedup  x{new / old:.1f}")
+
+
+if __name__ == "__main__":
+    main()
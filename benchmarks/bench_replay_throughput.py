@@ -0,0 +1,159 @@
+"""
+記録したシグナルを再生したときのパイプラインのスループットのベンチマーク。
+
+記録ファイル（BT_CAPTURE で記録したもの）を replay バックエンドで再生し、
+AVRCPMonitor → _on_metadata() → _handle_metadata() → SSE キューまでを
+アプリ本体（lifespan）と同じ構成で通す。--capture を省略すると、本番でよく見る
+集中（トラック切り替え直後に Track と Status が数十 ms の間に連続し、同じ内容も混ざる）を
+合成した記録ファイルを作って使う。
+
+重複判定は記録上の時刻で行うので、転送件数・間引き件数は再生速度によらず同じになる。
+--coalesce を付けると BT_COALESCE_DISPLAY=true（ライブ表示をプレイヤーごとに最新のイベントに
+まとめる）で実行する。
+
+使い方:
+    python benchmarks/bench_replay_throughput.py [--capture FILE] [--speed max]
+        [--bursts 500] [--players 4] [--subscribers 1] [--save-capture FILE] [--coalesce]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TITLES = [f"Song title {i}" for i in range(200)]
+ARTISTS = [f"Artist {i}" for i in range(30)]
+
+
+def _player_path(index: int) -> str:
+    return f"/org/bluez/hci0/dev_00_00_00_00_01_{index:02X}/player0"
+
+
+def make_capture(path: Path, bursts: int, players: int, seed: int = 0):
+    """集中したシグナルを合成した記録ファイルを作る。
+
+    1 回の集中は 1 プレイヤーのトラック切り替えで、Track（2〜4 回の同じ内容を含む）と
+    Status の変化が 5〜40ms 間隔で届く。集中どうしの間隔は 0〜3 秒。
+    """
+    from app.services.signal_capture import SignalRecorder
+
+    rng = random.Random(seed)
+    recorder = SignalRecorder(path)
+    now = 1000.0
+    for _ in range(bursts):
+        player = _player_path(rng.randrange(players))
+        song = rng.randrange(len(TITLES))
+        track = {
+            "Title": TITLES[song],
+            "Artist": ARTISTS[song % len(ARTISTS)],
+            "Album": f"Album {song % 17}",
+            "Genre": "Pop",
+            "TrackNumber": song % 12 + 1,
+            "NumberOfTracks": 12,
+            "Duration": 180_000 + song * 250,
+        }
+        for _ in range(rng.randint(2, 4)):
+            recorder.record(now, player, {"Track": track}, [])
+            now += rng.uniform(0.005, 0.04)
+        for status in ("paused", "playing") if rng.random() < 0.3 else ("playing",):
+            recorder.record(now, player, {"Status": status}, [])
+            now += rng.uniform(0.005, 0.04)
+        now += rng.uniform(0, 3.0)
+    recorder.close()
+
+
+async def run(capture: Path, subscribers: int) -> dict:
+    from app import main as app_main
+    from app.services import metrics
+    from app.services.signal_capture import iter_capture
+
+    expected_signals = sum(1 for _ in iter_capture(capture))
+    delivered = [0] * subscribers
+    delivery_latencies: list[float] = []
+
+    async def consume(i: int, subscriber):
+        while True:
+            frame, created_at, _ = await subscriber.queue.get()
+            delivered[i] += 1
+            delivery_latencies.append(time.perf_counter() - created_at)
+
+    async with app_main.lifespan(app_main.app):
+        subs = [app_main.broadcaster.subscribe() for _ in range(subscribers)]
+        consumers = [asyncio.create_task(consume(i, s)) for i, s in enumerate(subs)]
+        started = time.perf_counter()
+        while not app_main._monitor.stats()["replay"]["finished"]:
+            await asyncio.sleep(0.01)
+        # 再生スレッドが投げたコールバックと配信をすべて処理し終えるまで待つ
+        while any(not s.queue.empty() for s in subs):
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        wall = time.perf_counter() - started
+        monitor_stats = app_main._monitor.stats()
+        for task in consumers:
+            task.cancel()
+        dropped = sum(s.dropped for s in subs)
+
+    replay_stats = monitor_stats["replay"]
+    assert replay_stats["signals"] == expected_signals, replay_stats
+    delivery_latencies.sort()
+    return {
+        "signals": replay_stats["signals"],
+        "captured_seconds": replay_stats["captured"],
+        "wall_seconds": wall,
+        "forwarded": monitor_stats["dedup"]["forwarded"],
+        "suppressed": monitor_stats["dedup"]["suppressed"],
+        "delivered": delivered,
+        "dropped": dropped,
+        "wakeups": metrics.METADATA_BATCH_SIZE.count(),
+        "coalesced": int(metrics.METADATA_COALESCED.value()),
+        "latency": app_main.latency_tracer.summary()["stages"],
+        "delivery_p50_ms": delivery_latencies[len(delivery_latencies) // 2] * 1000 if delivery_latencies else None,
+        "delivery_p99_ms": delivery_latencies[int(len(delivery_latencies) * 0.99)] * 1000 if delivery_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capture", type=Path, help="再生する記録ファイル（省略時は合成する）")
+    parser.add_argument("--save-capture", type=Path, help="合成した記録ファイルの保存先")
+    parser.add_argument("--speed", default="max", help="再生速度（1、N 倍速、max）")
+    parser.add_argument("--bursts", type=int, default=500)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=1)
+    parser.add_argument("--coalesce", action="store_true", help="ライブ表示をプレイヤーごとにまとめる")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        capture = args.capture
+        if capture is None:
+            capture = args.save_capture or Path(tmp) / "capture.jsonl.gz"
+            make_capture(capture, args.bursts, args.players)
+
+        os.environ.pop("BT_MOCK", None)
+        os.environ["BT_DBUS_BACKEND"] = "replay"
+        os.environ["BT_REPLAY_FILE"] = str(capture)
+        os.environ["BT_REPLAY_SPEED"] = args.speed
+        os.environ["BT_COALESCE_DISPLAY"] = "true" if args.coalesce else "false"
+        os.environ["BT_DATA_DIR"] = str(Path(tmp) / "data")
+        result = asyncio.run(run(capture, args.subscribers))
+
+    print(f"signals     {result['signals']:>8}  (記録上 {result['captured_seconds']:.1f} 秒)")
+    print(f"wall        {result['wall_seconds']:>8.3f} s  ({result['signals'] / result['wall_seconds']:,.0f} signals/s)")
+    print(f"forwarded   {result['forwarded']:>8}  suppressed {result['suppressed']}")
+    print(f"delivered   {result['delivered']}  dropped {result['dropped']}")
+    print(f"wakeups     {result['wakeups']:>8}  coalesced {result['coalesced']}")
+    for stage, summary in result["latency"].items():
+        if summary["count"]:
+            print(f"  {stage:<9} p50 {summary['p50_ms']:8.3f} ms  p99 {summary['p99_ms']:8.3f} ms  max {summary['max_ms']:8.3f} ms")
+    if result["delivery_p50_ms"] is not None:
+        print(f"  {'delivery':<9} p50 {result['delivery_p50_ms']:8.3f} ms  p99 {result['delivery_p99_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+重いディスク処理中の SSE 配信遅延を測るベンチマーク。
+
+アプリを uvicorn で起動して /stream/metadata を購読し、別スレッドから
+（D-Bus の受信スレッドと同じように）一定間隔でイベントを publish する。
+その間に DATA_DIR へ大量のセッションファイルを置いて /dashboard を要求し、
+インデックスの再構築（全ファイルの読み直し）を起こす。
+publish してからクライアントが受け取るまでの遅延が --max-latency-ms を超えたら終了コード 1。
+
+--blocking を付けると storage.py を経由せずハンドラー内で同期的に処理する（変更前の動作）。
+
+使い方:
+    python benchmarks/bench_sse_latency.py [--sessions 2000] [--tracks 200] [--blocking]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("BT_MOCK", "true")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.chdir(Path(__file__).resolve().parent.parent)
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app import main as app_main  # noqa: E402
+from app.services import database, storage  # noqa: E402
+from app.services.broadcast import encode_event  # noqa: E402
+
+PROBE_EVENT = "latency-probe"
+PROBE_INTERVAL = 0.02
+
+
+def make_corpus(data_dir: Path, n_sessions: int, n_tracks: int):
+    """合成セッションファイルを data_dir に書き出す。"""
+    start = datetime(2025, 1, 1)
+    for i in range(n_sessions):
+        session_start = start + timedelta(minutes=i)
+        header = {
+            "type": "session_header",
+            "content_name": ["Spotify", "YouTube", "radiko"][i % 3],
+            "platform_type": "iPhone",
+            "device": "iPhone 15",
+            "os_version": "iOS 18",
+            "bg_playback": bool(i % 2),
+            "session_start": session_start.isoformat(),
+            "session_end": (session_start + timedelta(minutes=1)).isoformat(),
+            "track_count": n_tracks,
+        }
+        lines = [json.dumps(header)]
+        for seq in range(1, n_tracks + 1):
+            lines.append(json.dumps({
+                "type": "track", "seq": seq, "timestamp": session_start.isoformat(),
+                "title": f"title {seq}", "artist": f"artist {seq % 7}", "album": "",
+                "genre": "", "track_number": seq, "number_of_tracks": n_tracks,
+                "duration_ms": 180000, "status": "playing",
+            }))
+        name = f"{session_start.strftime('%Y%m%d_%H%M%S')}_bench_{i}.jsonl"
+        (data_dir / name).write_text("\n".join(lines) + "\n")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _publisher(loop: asyncio.AbstractEventLoop, stop: threading.Event):
+    """D-Bus の受信スレッドの代わりに、一定間隔でイベントループへイベントを渡す。"""
+    while not stop.is_set():
+        frame = encode_event(PROBE_EVENT, repr(time.perf_counter()))
+        loop.call_soon_threadsafe(app_main.broadcaster.publish, frame)
+        time.sleep(PROBE_INTERVAL)
+
+
+async def _subscribe(base_url: str, latencies: list[float], ready: asyncio.Event):
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        async with client.stream("GET", "/stream/metadata") as response:
+            ready.set()
+            event = ""
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line.split(":", 1)[1].strip()
+                elif line.startswith("data:") and event == PROBE_EVENT:
+                    sent = float(line.split(":", 1)[1])
+                    latencies.append((time.perf_counter() - sent) * 1000)
+
+
+async def run(args) -> int:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(app_main.app, port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # インデックス同期後にファイルを置くので、/dashboard で全ファイルを読み直す
+    await asyncio.to_thread(make_corpus, database.DATA_DIR, args.sessions, args.tracks)
+
+    latencies: list[float] = []
+    ready = asyncio.Event()
+    subscriber = asyncio.create_task(_subscribe(base_url, latencies, ready))
+    await ready.wait()
+
+    stop = threading.Event()
+    publisher = threading.Thread(target=_publisher, args=(asyncio.get_running_loop(), stop), daemon=True)
+    publisher.start()
+    await asyncio.sleep(0.5)
+    baseline = len(latencies)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        start = time.perf_counter()
+        response = await client.get("/dashboard")
+        dashboard_time = time.perf_counter() - start
+    response.raise_for_status()
+    await asyncio.sleep(0.5)
+
+    stop.set()
+    subscriber.cancel()
+    server.should_exit = True
+    await server_task
+
+    during = latencies[baseline:] or [0.0]
+    during.sort()
+    p99 = during[min(len(during) - 1, int(len(during) * 0.99))]
+    print(f"mode       {'blocking' if args.blocking else 'storage (thread pool)'}")
+    print(f"dashboard  {dashboard_time:8.3f} s ({args.sessions:,} sessions x {args.tracks} tracks)")
+    print(f"events     {len(during):,}")
+    print(f"latency    median {statistics.median(during):7.1f} ms  p99 {p99:7.1f} ms  max {during[-1]:7.1f} ms")
+    if during[-1] > args.max_latency_ms:
+        print(f"FAIL: max latency > {args.max_latency_ms} ms")
+        return 1
+    print("OK")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--tracks", type=int, default=200)
+    parser.add_argument("--max-latency-ms", type=float, default=250)
+    parser.add_argument("--blocking", action="store_true", help="ハンドラー内で同期的に処理する（変更前の動作）")
+    args = parser.parse_args()
+
+    if args.blocking:
+        async def run_inline(func, *a, **kw):
+            return func(*a, **kw)
+
+        storage.run = run_inline
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATA_DIR = Path(tmp) / "data"
+        database.DATA_DIR.mkdir()
+        sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
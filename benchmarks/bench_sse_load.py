@@ -0,0 +1,315 @@
+"""
+SSE 配信の負荷試験（1 台で何クライアントまでダッシュボードを配信できるか）。
+
+アプリをモックモードの子プロセスとして起動し、N 個のクライアントで /stream/metadata を
+同時に購読する。全クライアントがつながったら、子プロセス内のスレッドから
+（D-Bus の受信スレッドと同じように）_on_metadata() を --rate 件/秒で --duration 秒呼ぶ。
+
+計測する値:
+- 配信遅延: _on_metadata() を呼んでからクライアントが受け取るまで（p50 / p90 / p99 / 最大）。
+  送信時刻（time.perf_counter()、Linux ではプロセス間で共通の単調時計）をトラック名に入れて送る
+- 取りこぼし: キューが溢れて Broadcaster が捨てた件数（QueueFull）と、クライアント側で届かなかった件数
+- サーバーの CPU: 送信中の CPU 時間（1 コアに対する割合）と、その 1 クライアントあたり
+- サーバーのメモリ: クライアント接続前後の RSS の差（1 クライアントあたり）
+
+--clients にカンマ区切りで複数の値を渡すと、クライアント数ごとにサーバーを起動し直して順に測る。
+クライアントも同じマシンで動くので、CPU が少ない環境では測定値にクライアント側の負荷も含まれる
+（クライアント側の CPU 時間も表示する）。
+
+使い方:
+    python benchmarks/bench_sse_load.py [--clients 1,10,50,100] [--rate 20] [--duration 10]
+        [--players 4] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE_RE = re.compile(r"load-probe (\d+) ([0-9.]+)")
+END_TITLE = "load-end"
+
+# サーバーの待ち時間（秒）
+CONNECT_TIMEOUT = 60.0
+DRAIN_TIMEOUT = 30.0
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    """最近順位法のパーセンタイル。"""
+    index = max(0, min(len(sorted_values) - 1, int(len(sorted_values) * q + 0.999999) - 1))
+    return sorted_values[index]
+
+
+def _rss_mb() -> float:
+    """現在の RSS（MB）。"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+# ── サーバー（子プロセス） ──
+
+
+def _drive(server, app_main, args, result_path: Path):
+    """全クライアントの接続を待ってからメタデータを流し、サーバー側の計測結果を書き出す。"""
+    from app.services.avrcp_monitor import _mock_player_path
+
+    while not server.started or app_main._loop is None:
+        time.sleep(0.01)
+    broadcaster = app_main.broadcaster
+    rss_idle = _rss_mb()
+
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while broadcaster.subscriber_count < args.clients and time.monotonic() < deadline:
+        time.sleep(0.01)
+    connected = broadcaster.subscriber_count
+    time.sleep(0.5)
+    rss_connected = _rss_mb()
+
+    def metadata(title: str, seq: int) -> dict:
+        return {
+            "title": title,
+            "artist": f"Load Artist {seq % 30}",
+            "album": f"Load Album {seq % 17}",
+            "genre": "Pop",
+            "track_number": seq % 12 + 1,
+            "number_of_tracks": 12,
+            "duration_ms": 180_000 + seq % 1000,
+            "status": "playing",
+            "timestamp": datetime.now().isoformat(),
+            "player": _mock_player_path(seq % args.players),
+        }
+
+    published_before = broadcaster.published
+    dropped_before = broadcaster.dropped
+    cpu_started = time.process_time()
+    started = time.monotonic()
+    sent = 0
+    total = int(args.rate * args.duration)
+    for seq in range(total):
+        wait = started + seq / args.rate - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        sent_at = time.perf_counter()
+        app_main._on_metadata(metadata(f"load-probe {seq} {sent_at:.6f}", seq), sent_at)
+        sent += 1
+    elapsed = time.monotonic() - started
+    # 配信し終えるまでの CPU も含める
+    time.sleep(0.5)
+    cpu_seconds = time.process_time() - cpu_started
+    wall = time.monotonic() - started
+
+    result = {
+        "clients_connected": connected,
+        "sent": sent,
+        "send_seconds": elapsed,
+        "published": broadcaster.published - published_before,
+        "dropped": broadcaster.dropped - dropped_before,
+        "max_lag": max((c["max_lag"] for c in broadcaster.stats()["clients"]), default=0),
+        "cpu_seconds": cpu_seconds,
+        "cpu_percent": cpu_seconds / wall * 100,
+        "rss_idle_mb": rss_idle,
+        "rss_connected_mb": rss_connected,
+        "rss_end_mb": _rss_mb(),
+    }
+    result_path.write_text(json.dumps(result))
+
+    app_main._on_metadata(metadata(END_TITLE, total), time.perf_counter())
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    while broadcaster.subscriber_count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    server.should_exit = True
+
+
+def serve(args):
+    import uvicorn
+
+    from app import main as app_main
+
+    server = uvicorn.Server(uvicorn.Config(
+        app_main.app, host="127.0.0.1", port=args.port, log_level="warning",
+    ))
+    threading.Thread(
+        target=_drive, args=(server, app_main, args, Path(args.result)), daemon=True
+    ).start()
+    server.run()
+
+
+# ── クライアント（親プロセス） ──
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _consume(client, latencies: list[float], received: list[int], index: int):
+    """1 クライアント分の購読。終了の合図のイベントが届いたら戻る。"""
+    async with client.stream("GET", "/stream/metadata") as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            match = PROBE_RE.search(line)
+            if match:
+                latencies.append(time.perf_counter() - float(match.group(2)))
+                received[index] += 1
+            elif END_TITLE in line:
+                return
+
+
+async def run_clients(base_url: str, n: int, timeout: float) -> tuple[list[float], list[int]]:
+    import httpx
+
+    latencies: list[float] = []
+    received = [0] * n
+    limits = httpx.Limits(max_connections=n + 1, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        tasks = [
+            asyncio.create_task(_consume(client, latencies, received, i))
+            for i in range(n)
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    return latencies, received
+
+
+def _wait_ready(port: int, proc: subprocess.Popen):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("サーバーの起動に失敗しました")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("サーバーが起動しません")
+
+
+def run_load(n_clients: int, args) -> dict:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = Path(tmp) / "server.json"
+        env = {
+            **os.environ,
+            "BT_MOCK": "true",
+            "BT_DATA_DIR": str(Path(tmp) / "data"),
+        }
+        env.pop("BT_DBUS_BACKEND", None)
+        env.pop("BT_CENTRAL_URL", None)
+        log_path = Path(tmp) / "server.log"
+        log = open(log_path, "wb")
+        proc = subprocess.Popen(
+            [
+                sys.executable, __file__, "--serve",
+                "--port", str(port), "--result", str(result_path),
+                "--clients", str(n_clients), "--rate", str(args.rate),
+                "--duration", str(args.duration), "--players", str(args.players),
+            ],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            _wait_ready(port, proc)
+            cpu_started = time.process_time()
+            latencies, received = asyncio.run(run_clients(
+                f"http://127.0.0.1:{port}", n_clients,
+                CONNECT_TIMEOUT + args.duration + DRAIN_TIMEOUT,
+            ))
+            client_cpu = time.process_time() - cpu_started
+            proc.wait(timeout=DRAIN_TIMEOUT + 10)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            log.close()
+        if not result_path.exists():
+            raise RuntimeError(f"サーバーの計測結果がありません:\n{log_path.read_text(errors='replace')}")
+        server = json.loads(result_path.read_text())
+
+    latencies.sort()
+    missing = sum(server["sent"] - r for r in received)
+    result = {
+        "clients": n_clients,
+        **server,
+        "received": sum(received),
+        "missing": missing,
+        "client_cpu_seconds": client_cpu,
+        "rss_per_client_kb": (server["rss_connected_mb"] - server["rss_idle_mb"]) * 1024 / n_clients,
+        "cpu_percent_per_client": server["cpu_percent"] / n_clients,
+    }
+    if latencies:
+        result["latency_ms"] = {
+            "p50": _percentile(latencies, 0.50) * 1000,
+            "p90": _percentile(latencies, 0.90) * 1000,
+            "p99": _percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", default="1,10,50,100", help="クライアント数（カンマ区切り）")
+    parser.add_argument("--rate", type=float, default=20.0, help="1 秒あたりのメタデータ件数")
+    parser.add_argument("--duration", type=float, default=10.0, help="送信する秒数")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--output", type=Path, help="結果の JSON の保存先")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.path.insert(0, str(ROOT))
+        args.clients = int(args.clients)
+        serve(args)
+        return
+
+    print(f"rate {args.rate:g} events/s x {args.duration:g} s, {args.players} players, cpu_count {os.cpu_count()}")
+    print(
+        f"{'clients':>7} {'sent':>6} {'missing':>8} {'dropped':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        f" {'cpu %':>7} {'cpu %/cl':>9} {'rss KB/cl':>10} {'client cpu':>11}"
+    )
+    results = []
+    for n_clients in (int(n) for n in args.clients.split(",")):
+        result = run_load(n_clients, args)
+        results.append(result)
+        latency = result.get("latency_ms", {})
+        print(
+            f"{n_clients:>7} {result['sent']:>6} {result['missing']:>8} {result['dropped']:>8}"
+            f" {latency.get('p50', float('nan')):8.2f} {latency.get('p99', float('nan')):8.2f}"
+            f" {latency.get('max', float('nan')):8.2f} {result['cpu_percent']:7.1f}"
+            f" {result['cpu_percent_per_client']:9.2f} {result['rss_per_client_kb']:10.1f}"
+            f" {result['client_cpu_seconds']:9.2f} s"
+        )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "cpu_count": os.cpu_count(),
+            "params": {"rate": args.rate, "duration": args.duration, "players": args.players},
+            "results": results,
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"結果を保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+セッションの保存・一覧・CSV 出力・集計のベンチマーク。
+
+corpus.py で合成したコーパス（既定 1,000 / 10,000 セッション）に対して、次の処理の
+実行時間・ピーク RSS・開いたファイル数を測り、結果を JSON に保存する。
+
+- index_build    : インデックスの作り直し（全セッションファイルのヘッダーを読む）
+- list_sessions  : database.list_sessions()（同期済みのインデックスから読む）
+- query_sessions : database.query_sessions()（/sessions の絞り込み・ページ送り）
+- save_session   : database.save_session()（保存後に削除してコーパスを元に戻す）
+- session_csv    : export.iter_session_csv()（/sessions/{filename}/csv の本体）
+- statistics_summary / field_coverage_matrix / device_os_comparison
+                 : analysis.py の 3 関数（それぞれ集計キャッシュを空にして測る）
+
+ケースごとに子プロセスで実行するので、ピーク RSS（ru_maxrss）は他のケースの影響を受けない。
+開いたファイル数は、計測中に発生した open / sqlite3.connect の監査イベントの数
+（1 回あたり）。合成したコーパスは --corpus-dir に残し、同じ条件なら次回も使い回す。
+
+結果の JSON（既定は benchmarks/results/storage-<コミット>.json）を --compare に渡すと、
+前回との実行時間の比を表示する。
+
+使い方:
+    python benchmarks/bench_storage.py [--sizes 1000,10000,100000] [--tracks 20]
+        [--repeat 5] [--cases list_sessions,save_session] [--output FILE] [--compare BASE.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+
+CASES = [
+    "index_build",
+    "list_sessions",
+    "query_sessions",
+    "save_session",
+    "session_csv",
+    "statistics_summary",
+    "field_coverage_matrix",
+    "device_os_comparison",
+]
+
+# save_session / session_csv で 1 回に扱うセッション数
+SAVE_SESSIONS = 50
+CSV_SESSIONS = 50
+
+
+# ── 子プロセス（1 ケースの計測） ──
+
+
+class _OpenCounter:
+    """監査イベントから開いたファイルの数を数える（active の間だけ）。"""
+
+    def __init__(self):
+        self.active = False
+        self.count = 0
+        sys.addaudithook(self._hook)
+
+    def _hook(self, event, args):
+        if self.active and event in ("open", "sqlite3.connect"):
+            self.count += 1
+
+
+def _rss_mb() -> float:
+    # Linux の ru_maxrss は KiB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _case_ops(case: str, repeat: int):
+    """ケースの (準備, 計測する処理, 1 回あたりの操作数) を repeat 回分返す。"""
+    from app.services import analysis, database
+    from app.services.export import iter_session_csv
+    from app.services.session_index import SessionFilter, index_path_for
+
+    if case == "index_build":
+        def prepare():
+            database._index = None
+            database._synced_dir_mtime_ns = None
+            for suffix in ("", "-wal", "-shm"):
+                Path(str(index_path_for(database.DATA_DIR)) + suffix).unlink(missing_ok=True)
+        return [(prepare, lambda: database.sync_index(force=True), 1)] * repeat
+
+    database.sync_index()
+
+    if case == "list_sessions":
+        return [(None, database.list_sessions, 1)] * repeat
+
+    if case == "query_sessions":
+        filters = [
+            SessionFilter(),
+            SessionFilter(content="you"),
+            SessionFilter(device="iPhone", os_version="iOS 18"),
+            SessionFilter(platform_type="web", bg_playback=True),
+            SessionFilter(started_after="2025-03-01T00:00:00", started_before="2025-06-01T00:00:00"),
+        ]
+
+        def query():
+            for session_filter in filters:
+                for page in range(3):
+                    database.query_sessions(session_filter, limit=50, offset=page * 50)
+        return [(None, query, len(filters) * 3)] * repeat
+
+    if case == "save_session":
+        template = database.list_sessions()[0]
+        source = database.get_session_source(template["filename"])
+        tracks = [record for record in source.records() if record.get("type") == "track"]
+        saved: list[str] = []
+
+        def cleanup():
+            for filename in saved:
+                database.delete_session(filename)
+            saved.clear()
+
+        def save():
+            for i in range(SAVE_SESSIONS):
+                session_start = datetime(2030, 1, 1, 0, 0, i)
+                filename = database.generate_filename(
+                    template["content_name"], template["platform_type"], template["device"],
+                    template["os_version"], session_start,
+                )
+                database.save_session(
+                    filename=filename,
+                    content_name=template["content_name"],
+                    platform_type=template["platform_type"],
+                    device=template["device"],
+                    os_version=template["os_version"],
+                    session_start=session_start,
+                    session_end=session_start,
+                    tracks=tracks,
+                )
+                saved.append(filename)
+        return [(cleanup, save, SAVE_SESSIONS)] * repeat + [(cleanup, None, 0)]
+
+    if case == "session_csv":
+        filenames = [session["filename"] for session in database.list_sessions()[:CSV_SESSIONS]]
+
+        def export():
+            for filename in filenames:
+                source = database.get_session_source(filename)
+                for _ in iter_session_csv(source):
+                    pass
+        return [(None, export, len(filenames))] * repeat
+
+    func = {
+        "statistics_summary": analysis.get_statistics_summary,
+        "field_coverage_matrix": analysis.get_field_coverage_matrix,
+        "device_os_comparison": analysis.get_device_os_comparison,
+    }[case]
+
+    def clear_cache():
+        analysis._cache = None
+    return [(clear_cache, func, 1)] * repeat
+
+
+def run_case(case: str, repeat: int) -> dict:
+    counter = _OpenCounter()
+    ops = _case_ops(case, repeat)
+    rss_before = _rss_mb()
+    times = []
+    opened = []
+    per_run = 1
+    for prepare, func, per_run_ops in ops:
+        if prepare is not None:
+            prepare()
+        if func is None:
+            continue
+        per_run = per_run_ops
+        counter.count = 0
+        counter.active = True
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        counter.active = False
+        opened.append(counter.count)
+    return {
+        "ops_per_run": per_run,
+        "wall_s": times,
+        "wall_min_s": min(times),
+        "wall_median_s": statistics.median(times),
+        "files_opened": max(opened),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+# ── 親プロセス ──
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def prepare_corpus(corpus_dir: Path, sessions: int, tracks: int, seed: int) -> Path:
+    """コーパスを用意してデータディレクトリを返す（作成済みなら使い回す）。"""
+    from corpus import make_corpus
+
+    base = corpus_dir / f"s{sessions}-t{tracks}-seed{seed}"
+    data_dir = base / "data"
+    done_marker = base / "complete"
+    if not done_marker.exists():
+        shutil.rmtree(base, ignore_errors=True)
+        started = time.perf_counter()
+        total = make_corpus(data_dir, sessions, tracks, seed=seed)
+        done_marker.write_text(str(total))
+        print(f"コーパスを作成: {sessions} セッション / {total} トラック ({time.perf_counter() - started:.1f} 秒)")
+    return data_dir
+
+
+def spawn_case(case: str, data_dir: Path, repeat: int) -> dict:
+    env = {**os.environ, "BT_DATA_DIR": str(data_dir)}
+    env.pop("BT_COMPRESSION", None)
+    completed = subprocess.run(
+        [sys.executable, __file__, "--case", case, "--repeat", str(repeat)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case} が失敗しました:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, base: dict):
+    """前回の結果との実行時間（中央値）の比を表示する。"""
+    print(f"\n比較: {base.get('commit') or '?'} -> {results.get('commit') or '?'}")
+    for size, cases in results["results"].items():
+        base_cases = base.get("results", {}).get(size, {})
+        for case, result in cases.items():
+            if case not in base_cases:
+                continue
+            before = base_cases[case]["wall_median_s"]
+            after = result["wall_median_s"]
+            ratio = after / before if before else float("inf")
+            mark = "  <-- 遅くなった" if ratio > 1.2 else ""
+            print(f"  {size:>7} {case:<22} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms  x{ratio:5.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000", help="セッション数（カンマ区切り）")
+    parser.add_argument("--tracks", type=int, default=20, help="セッションあたりの平均トラック数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", default=",".join(CASES), help="実行するケース（カンマ区切り）")
+    parser.add_argument("--corpus-dir", type=Path, default=BENCH_DIR / ".corpus")
+    parser.add_argument("--output", type=Path, help="結果の JSON の保存先")
+    parser.add_argument("--compare", type=Path, help="比較する前回の結果の JSON")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        sys.path.insert(0, str(ROOT))
+        print(json.dumps(run_case(args.case, args.repeat)))
+        return
+
+    cases = [case for case in args.cases.split(",") if case]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"不明なケース: {', '.join(sorted(unknown))}")
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    results = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": {"tracks": args.tracks, "seed": args.seed, "repeat": args.repeat,
+                   "save_sessions": SAVE_SESSIONS, "csv_sessions": CSV_SESSIONS},
+        "results": {},
+    }
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        data_dir = prepare_corpus(args.corpus_dir, size, args.tracks, args.seed)
+        print(f"\n{size} セッション")
+        print(f"  {'case':<22} {'median':>12} {'min':>12} {'per op':>12} {'files':>7} {'peak RSS':>10} {'growth':>9}")
+        size_results = results["results"][str(size)] = {}
+        for case in cases:
+            result = size_results[case] = spawn_case(case, data_dir, args.repeat)
+            per_op = result["wall_median_s"] / result["ops_per_run"]
+            print(
+                f"  {case:<22} {result['wall_median_s'] * 1000:9.2f} ms {result['wall_min_s'] * 1000:9.2f} ms"
+                f" {per_op * 1000:9.3f} ms {result['files_opened']:>7} {result['peak_rss_mb']:7.1f} MB"
+                f" {result['peak_rss_mb'] - result['rss_before_mb']:6.1f} MB"
+            )
+
+    output = args.output or BENCH_DIR / "results" / f"storage-{commit or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"\n結果を保存: {output}")
+
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+記録中のセッションがトラック 1 件あたりに使うメモリ・ディスクのベンチマーク。
+
+ラジオアプリのような受信（同じアーティスト・アルバム・再生状態が繰り返し届く）を合成し、
+アプリと同じ経路（/session/start で開始したセッションに main._record_metadata() で記録し、
+/session/stop で保存する）で N 件を記録したときの、次の値をトラック 1 件あたりで表示する。
+
+- Python ヒープの増加量（tracemalloc。記録後に残っている分）
+- RSS の増加量
+- ジャーナル（DATA_DIR/.journal）のサイズ
+- 保存したセッションファイルのサイズ（BT_COMPRESSION の設定に従う）
+
+比較のため、変更前のようにトラックを 11 キーの dict として session.tracks に
+保持した場合の Python ヒープの増加量も測る。
+
+使い方:
+    python benchmarks/bench_track_memory.py [--tracks 100000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+STATUSES = ["playing", "paused", "stopped"]
+
+
+def iter_events(n: int, seed: int = 0):
+    """D-Bus から届くのと同じく、文字列を 1 件ずつ別オブジェクトとして持つメタデータを返す。"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, 0, 0)
+    for i in range(n):
+        song = rng.randrange(300)
+        yield {
+            "timestamp": (start + timedelta(seconds=i * 7, microseconds=rng.randrange(10**6))).isoformat(),
+            "title": "".join(["Song title ", str(song)]),
+            "artist": "".join(["Artist name ", str(song % 40)]),
+            "album": "".join(["Album ", str(song % 25)]),
+            "genre": "".join(["J-", "Pop"]),
+            "track_number": song % 12 + 1,
+            "number_of_tracks": 12,
+            "duration_ms": 180_000 + song * 100,
+            "status": "".join(STATUSES[rng.randrange(3)]),
+            "player": "",
+        }
+
+
+def as_dict(metadata: dict, seq: int) -> dict:
+    """変更前の _handle_metadata() が session.tracks に積んでいたトラックレコード。"""
+    return {
+        "type": "track",
+        "seq": seq,
+        "timestamp": metadata.get("timestamp", datetime.now().isoformat()),
+        "title": metadata.get("title", ""),
+        "artist": metadata.get("artist", ""),
+        "album": metadata.get("album", ""),
+        "genre": metadata.get("genre", ""),
+        "track_number": metadata.get("track_number"),
+        "number_of_tracks": metadata.get("number_of_tracks"),
+        "duration_ms": metadata.get("duration_ms"),
+        "status": metadata.get("status", ""),
+    }
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _heap_growth(record, n: int, seed: int) -> int:
+    """n 件を record に渡した後に残っている Python ヒープの増加量（バイト）。"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for metadata in iter_events(n, seed):
+        record(metadata)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def measure_dict(n: int) -> float:
+    tracks: list[dict] = []
+    used = _heap_growth(lambda metadata: tracks.append(as_dict(metadata, len(tracks) + 1)), n, seed=1)
+    return used / n
+
+
+def measure_pipeline(n: int) -> dict:
+    from fastapi.testclient import TestClient
+
+    from app import main as app_main
+    from app.services import database
+
+    client = TestClient(app_main.app)
+    response = client.post("/session/start", data={
+        "content_name": "radiko", "platform_type": "app", "device": "iPhone", "os_version": "iOS 18",
+    })
+    response.raise_for_status()
+    session = next(iter(app_main.active_sessions.values()))
+
+    # 初回の呼び出しで作られるキャッシュ等を測定から外す
+    for metadata in iter_events(1000, seed=2):
+        app_main._record_metadata(metadata)
+
+    gc.collect()
+    rss_before = _rss_bytes()
+    for metadata in iter_events(n, seed=3):
+        app_main._record_metadata(metadata)
+    gc.collect()
+    rss_growth = _rss_bytes() - rss_before
+
+    heap_growth = _heap_growth(app_main._record_metadata, n, seed=4)
+
+    session.journal.sync()
+    recorded = session.seq
+    journal_bytes = session.journal.body_path.stat().st_size
+
+    client.post("/session/stop", data={"session_id": session.id}).raise_for_status()
+    # DATA_DIR は一時ディレクトリなので、保存されたセッションはこの 1 件だけ
+    saved_bytes = sum((database.DATA_DIR / s["filename"]).stat().st_size for s in database.list_sessions())
+
+    return {
+        "recorded": recorded,
+        "heap_per_track": heap_growth / n,
+        "rss_per_track": rss_growth / n,
+        "journal_per_track": journal_bytes / recorded,
+        "saved_per_track": saved_bytes / recorded,
+        "compression": database.COMPRESSION or "なし",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BT_DATA_DIR"] = str(Path(tmp) / "data")
+        os.environ.pop("BT_CENTRAL_URL", None)
+        sys.path.insert(0, str(ROOT))
+
+        dict_per_track = measure_dict(args.tracks)
+        result = measure_pipeline(args.tracks)
+
+    print(f"{args.tracks} トラック（ラジオ型の受信）、bytes/track")
+    print(f"  変更前: session.tracks に dict で保持  Python ヒープ {dict_per_track:8.1f}")
+    print(f"  現在: ジャーナルに追記                 Python ヒープ {result['heap_per_track']:8.1f}")
+    print(f"                                         RSS           {result['rss_per_track']:8.1f}")
+    print(f"  ジャーナル（ディスク）                               {result['journal_per_track']:8.1f}")
+    print(f"  保存したセッション（圧縮: {result['compression']}）  {result['saved_per_track']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+ベンチマーク用の合成セッションコーパスの生成。
+
+AVRCPMonitor._MOCK_TRACKS のトラックを形（音楽・動画・ポッドキャスト・ラジオ）ごとに
+分け、コンテンツ名・端末・OS・Web/アプリ・バックグラウンド再生の組み合わせを
+割合（--mix）に従って振ったセッションファイルを書き出す。セッションごとの
+トラック数は --tracks を平均にばらつかせる。同じ引数・シードなら同じコーパスになる。
+
+使い方:
+    python benchmarks/corpus.py DATA_DIR [--sessions 10000] [--tracks 20]
+        [--mix music=0.5,video=0.25,podcast=0.1,radio=0.15] [--seed 0]
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.avrcp_monitor import AVRCPMonitor  # noqa: E402
+
+DEFAULT_MIX = {"music": 0.5, "video": 0.25, "podcast": 0.1, "radio": 0.15}
+
+# 形ごとのコンテンツ名（main.CONTENT_OPTIONS から）
+CONTENTS = {
+    "music": ["Spotify", "Apple Music", "YouTube Music", "Amazon Music", "LINE MUSIC", "AWA"],
+    "video": ["YouTube", "Netflix", "Amazon Prime Video", "TVer", "ABEMA", "U-NEXT"],
+    "podcast": ["Apple Podcast", "Voicy"],
+    "radio": ["radiko", "らじる★らじる"],
+}
+
+# 端末 → OS（main.OS_OPTIONS から）
+DEVICES = {
+    "iPhone": ["iOS 18", "iOS 17", "iOS 16"],
+    "Mac": ["macOS Sequoia", "macOS Sonoma", "macOS Ventura"],
+    "Windows": ["Windows 11", "Windows 10"],
+    "Android": ["Android 15", "Android 14", "Android 13", "Android 12"],
+}
+
+
+def track_shapes() -> dict[str, list[dict]]:
+    """モックのトラックを形ごとに分ける。"""
+    shapes: dict[str, list[dict]] = {kind: [] for kind in DEFAULT_MIX}
+    for track in AVRCPMonitor._MOCK_TRACKS:
+        if track.get("genre") == "Podcast":
+            kind = "podcast"
+        elif track.get("duration_ms") is None:
+            kind = "radio"
+        elif track.get("duration_ms") == 0:
+            kind = "video"
+        else:
+            kind = "music"
+        shapes[kind].append(track)
+    return shapes
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """"music=0.5,video=0.5" 形式の割合を読む。"""
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError(f"不明な形です: {kind}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def make_corpus(
+    data_dir: Path,
+    n_sessions: int,
+    mean_tracks: int = 20,
+    mix: dict[str, float] = DEFAULT_MIX,
+    seed: int = 0,
+) -> int:
+    """合成セッションファイルを data_dir に書き出し、書き出したトラック数を返す。"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    shapes = track_shapes()
+    kinds = [kind for kind in mix if shapes.get(kind)]
+    weights = [mix[kind] for kind in kinds]
+    start = datetime(2025, 1, 1, 8, 0, 0)
+    total_tracks = 0
+
+    for i in range(n_sessions):
+        kind = rng.choices(kinds, weights)[0]
+        device = rng.choice(list(DEVICES))
+        session_start = start + timedelta(minutes=37 * i)
+        n_tracks = max(0, int(rng.gauss(mean_tracks, mean_tracks / 3)))
+        header = {
+            "type": "session_header",
+            "content_name": rng.choice(CONTENTS[kind]),
+            "platform_type": rng.choice(["app", "app", "web"]),
+            "device": device,
+            "os_version": rng.choice(DEVICES[device]),
+            "bg_playback": rng.random() < 0.3,
+            "session_start": session_start.isoformat(),
+            "session_end": (session_start + timedelta(seconds=30 * n_tracks + 60)).isoformat(),
+            "track_count": n_tracks,
+        }
+        lines = [json.dumps(header, ensure_ascii=False)]
+        for seq in range(1, n_tracks + 1):
+            track = rng.choice(shapes[kind])
+            lines.append(json.dumps({
+                "type": "track",
+                "seq": seq,
+                "timestamp": (session_start + timedelta(seconds=30 * seq)).isoformat(),
+                "title": track["title"],
+                "artist": track["artist"],
+                "album": track["album"],
+                "genre": track["genre"],
+                "track_number": track["track_number"],
+                "number_of_tracks": track["number_of_tracks"],
+                "duration_ms": track["duration_ms"],
+                "status": "paused" if rng.random() < 0.1 else "playing",
+            }, ensure_ascii=False))
+        filename = "_".join([
+            session_start.strftime("%Y%m%d_%H%M%S"),
+            header["content_name"].replace(" ", "_"),
+            header["platform_type"],
+            device,
+            header["os_version"].replace(" ", "_"),
+        ]) + ".jsonl"
+        (data_dir / filename).write_text("\n".join(lines) + "\n", encoding="utf-8")
+        total_tracks += n_tracks
+    return total_tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--tracks", type=int, default=20, help="セッションあたりの平均トラック数")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    total = make_corpus(args.data_dir, args.sessions, args.tracks, args.mix, args.seed)
+    print(f"{args.sessions} セッション / {total} トラックを書き出しました: {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""AVRCPMonitor のバックエンド選択のテスト。"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services.avrcp_monitor import AVRCPMonitor
+
+dbus_next_aio = pytest.importorskip("dbus_next.aio")
+
+
+@pytest.fixture
+def asyncio_backend(monkeypatch):
+    monkeypatch.delenv("BT_MOCK", raising=False)
+    monkeypatch.delenv("BT_CAPTURE", raising=False)
+    monkeypatch.setenv("BT_DBUS_BACKEND", "asyncio")
+
+
+def test_asyncio_connect_failure_falls_back_to_glib(asyncio_backend, monkeypatch):
+    async def connect(self):
+        raise OSError("system bus が見つかりません")
+
+    glib_started = threading.Event()
+    monkeypatch.setattr(dbus_next_aio.MessageBus, "connect", connect)
+    monkeypatch.setattr(AVRCPMonitor, "_dbus_loop", lambda self: glib_started.set())
+
+    async def run():
+        monitor = AVRCPMonitor(callback=lambda metadata, received_at: None)
+        monitor.start()
+        task = monitor._task
+        assert monitor.runs_on_event_loop
+        await task
+        assert not monitor.runs_on_event_loop
+        assert glib_started.wait(timeout=5)
+        monitor.stop()
+
+    asyncio.run(run())
+
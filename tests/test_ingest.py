@@ -0,0 +1,103 @@
+"""中央ノードの受信（ingest.py）とコレクターの分割送信（uploader.py）のテスト。"""
+
+import hashlib
+from datetime import datetime
+
+import pytest
+
+from app.services import database, ingest
+from app.services.uploader import _iter_chunks
+
+COLLECTOR = "bench-1"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    monkeypatch.setattr(database, "DATA_DIR", data_dir)
+    monkeypatch.setattr(database, "COMPRESSION", None)
+    return data_dir
+
+
+@pytest.fixture
+def session(data_dir):
+    """コレクター側のセッションを 1 件保存し、(ファイル名, JSONL のバイト列) を返す。"""
+    started = datetime(2025, 1, 1, 10, 0, 0)
+    filename = database.generate_filename("Spotify", "app", "iPhone", "iOS 18", started)
+    tracks = [
+        {"type": "track", "seq": seq, "timestamp": started.isoformat(), "title": f"Track {seq}",
+         "artist": "Artist", "album": "Album", "genre": "Pop", "track_number": seq,
+         "number_of_tracks": 3, "duration_ms": 180_000, "status": "playing"}
+        for seq in range(1, 4)
+    ]
+    database.save_session(
+        filename=filename, content_name="Spotify", platform_type="app", device="iPhone",
+        os_version="iOS 18", session_start=started, session_end=started, tracks=tracks,
+    )
+    source = database.get_session_source(filename)
+    return filename, b"".join(source.iter_jsonl())
+
+
+def _plan(filename: str, body: bytes, sha256: str = "") -> dict:
+    entry = {"filename": filename, "size": len(body), "sha256": sha256 or hashlib.sha256(body).hexdigest()}
+    return ingest.plan_batch(COLLECTOR, [entry])[0]
+
+
+def _upload_files(data_dir) -> list[str]:
+    return sorted(path.name for path in (data_dir / ingest.UPLOAD_DIRNAME).iterdir())
+
+
+def test_write_chunk_ingests_when_complete(data_dir, session):
+    filename, body = session
+    plan = _plan(filename, body)
+    assert plan["status"] == "pending" and plan["offset"] == 0
+
+    assert ingest.write_chunk(plan["upload_id"], 0, body[:10]) == {"status": "pending", "offset": 10}
+    assert ingest.write_chunk(plan["upload_id"], 10, body[10:]) == {"status": "done", "offset": len(body)}
+    assert database.find_ingested(COLLECTOR, filename) is not None
+    assert _upload_files(data_dir) == []
+    assert _plan(filename, body)["status"] == "done"
+
+
+def test_plan_batch_ingests_part_left_complete_by_crash(data_dir, session, monkeypatch):
+    """最後のチャンクを書いた後、取り込む前に落ちた受信は次の問い合わせで取り込む。"""
+    filename, body = session
+    plan = _plan(filename, body)
+    with monkeypatch.context() as m:
+        # 取り込みの直前でプロセスが止まった状態を再現する
+        m.setattr(ingest, "_finalize", lambda upload_id, state: None)
+        ingest.write_chunk(plan["upload_id"], 0, body)
+    assert database.find_ingested(COLLECTOR, filename) is None
+    assert _upload_files(data_dir) == [f"{plan['upload_id']}.json", f"{plan['upload_id']}.part"]
+
+    assert _plan(filename, body) == {"filename": filename, "status": "done"}
+    assert database.find_ingested(COLLECTOR, filename)["source_sha256"] == hashlib.sha256(body).hexdigest()
+    assert _upload_files(data_dir) == []
+
+
+def test_plan_batch_restarts_complete_part_with_wrong_digest(data_dir, session):
+    filename, body = session
+    plan = _plan(filename, body)
+    (data_dir / ingest.UPLOAD_DIRNAME / f"{plan['upload_id']}.part").write_bytes(b"x" * len(body))
+
+    plan = _plan(filename, body)
+    assert plan["status"] == "pending" and plan["offset"] == 0
+    assert _upload_files(data_dir) == [f"{plan['upload_id']}.json"]
+    assert database.find_ingested(COLLECTOR, filename) is None
+
+    assert ingest.write_chunk(plan["upload_id"], 0, body)["status"] == "done"
+
+
+def test_empty_chunk_at_end_finalizes(data_dir, session, monkeypatch):
+    """コレクターは受信済みの末尾から空のチャンクを送り、中央ノードはそれで取り込む。"""
+    filename, body = session
+    source = database.get_session_source(filename)
+    assert list(_iter_chunks(source, len(body))) == [b""]
+
+    plan = _plan(filename, body)
+    with monkeypatch.context() as m:
+        m.setattr(ingest, "_finalize", lambda upload_id, state: None)
+        ingest.write_chunk(plan["upload_id"], 0, body)
+    assert ingest.write_chunk(plan["upload_id"], len(body), b"") == {"status": "done", "offset": len(body)}
+    assert database.find_ingested(COLLECTOR, filename) is not None
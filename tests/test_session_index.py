@@ -0,0 +1,55 @@
+"""セッションインデックス（session_index.py）の絞り込みのテスト。"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app.services import database
+from app.services.session_index import SessionFilter, SessionIndex, index_path_for
+
+CONTENTS = ["Äpfel Radio", "ＹｏｕＴｕｂｅ", "Spotify", "STRASSE FM", "Straße FM"]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    monkeypatch.setattr(database, "DATA_DIR", data_dir)
+    monkeypatch.setattr(database, "COMPRESSION", None)
+    for i, content_name in enumerate(CONTENTS):
+        started = datetime(2025, 1, 1 + i, 10, 0, 0)
+        database.save_session(
+            filename=database.generate_filename(content_name, "app", "iPhone", "iOS 18", started),
+            content_name=content_name, platform_type="app", device="iPhone", os_version="iOS 18",
+            session_start=started, session_end=started, tracks=[],
+        )
+    return data_dir
+
+
+def _contents(content: str) -> list[str]:
+    sessions, total = database.query_sessions(SessionFilter(content=content), limit=10)
+    assert total == len(sessions)
+    return sorted(session["content_name"] for session in sessions)
+
+
+def test_content_filter_ignores_case_beyond_ascii(data_dir):
+    assert _contents("äpfel") == ["Äpfel Radio"]
+    assert _contents("ｙｏｕ") == ["ＹｏｕＴｕｂｅ"]
+    assert _contents("spot") == ["Spotify"]
+    assert _contents("straße") == ["STRASSE FM", "Straße FM"]
+
+
+def test_v5_index_is_migrated_without_rebuilding(data_dir, monkeypatch):
+    database.sync_index()
+    path = index_path_for(data_dir)
+    with sqlite3.connect(path) as conn:
+        conn.execute("ALTER TABLE sessions DROP COLUMN content_name_fold")
+        conn.execute("PRAGMA user_version = 5")
+        conn.execute("UPDATE sessions SET header = json_set(header, '$.migrated', 1)")
+
+    monkeypatch.setattr(database, "_index", SessionIndex(data_dir))
+    monkeypatch.setattr(database, "_synced_dir_mtime_ns", None)
+    assert _contents("äpfel") == ["Äpfel Radio"]
+    # 作り直していれば、ヘッダーは実ファイルから読み直されて migrated が無くなる
+    assert all(session.get("migrated") == 1 for session in database.list_sessions())
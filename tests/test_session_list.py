@@ -0,0 +1,60 @@
+"""過去セッション一覧（/sessions・削除・/export）のテスト。"""
+
+import io
+import re
+import zipfile
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services import database
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    monkeypatch.setattr(database, "DATA_DIR", data_dir)
+    monkeypatch.setattr(database, "COMPRESSION", None)
+    monkeypatch.setattr(main, "SESSION_PAGE_SIZE", 2)
+    for i, content_name in enumerate(["Spotify", "Spotify", "Spotify", "YouTube"]):
+        started = datetime(2025, 1, 1 + i, 10, 0, 0)
+        database.save_session(
+            filename=database.generate_filename(content_name, "app", "iPhone", "iOS 18", started),
+            content_name=content_name, platform_type="app", device="iPhone", os_version="iOS 18",
+            session_start=started, session_end=started, tracks=[],
+        )
+    return TestClient(main.app)
+
+
+def _filenames(html: str) -> list[str]:
+    return re.findall(r'hx-delete="/sessions/([^"]+)"', html)
+
+
+def test_delete_keeps_filter_and_page(client):
+    page = client.get("/sessions", params={"content": "spot", "offset": 2}).text
+    assert len(_filenames(page)) == 1
+    remaining = client.get("/sessions", params={"content": "spot"}).text
+
+    # 2 ページ目の唯一の行を消すと、同じ絞り込み条件の 1 ページ目に戻る
+    response = client.delete(f"/sessions/{_filenames(page)[0]}", params={"content": "spot", "offset": 2})
+    assert response.status_code == 200
+    assert _filenames(response.text) == _filenames(remaining)
+    assert 'value="spot"' in response.text
+    assert "YouTube" not in response.text
+
+    # 1 ページ目の行を消しても、絞り込み条件は保たれる
+    response = client.delete(f"/sessions/{_filenames(remaining)[0]}", params={"content": "spot"})
+    assert _filenames(response.text) == _filenames(remaining)[1:]
+    assert 'value="spot"' in response.text
+
+
+def test_export_links_carry_filter(client):
+    page = client.get("/sessions", params={"content": "you"}).text
+    assert 'href="/export?format=zip&amp;content=you"' in page
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get("/export", params={"format": "zip", "content": "you"}).content))
+    assert [name for name in archive.namelist() if "YouTube" not in name] == []
+    assert len(archive.namelist()) == 1